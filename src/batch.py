@@ -0,0 +1,241 @@
+"""
+Batch analysis of many PRs / refs across repositories in one invocation.
+
+Targets are read from a file, one per line, either as JSON objects or in the
+short form ``owner/repo#123`` (a PR) or ``owner/repo@ref`` (a commit/branch):
+
+    {"repo": "acme/infra", "pr": 42, "path": "/work/acme/infra"}
+    acme/infra#43
+    acme/platform@release-1.4
+
+Each target is checked out into its own git worktree and analysed in a worker
+process. Workers share the on-disk caches (memoised helm renders and
+commands, terraform plugins and plans, LLM responses), and every target gets its
+own report plus an entry in an aggregate index.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+_SHORT_TARGET = re.compile(r"^(?P<repo>[\w.-]+/[\w.-]+)(?:#(?P<pr>\d+)|@(?P<ref>\S+))?$")
+
+
+def load_targets(path):
+    """Parse a targets file into a list of dicts with repo, pr, ref and path keys"""
+    targets = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                target = json.loads(line)
+            else:
+                match = _SHORT_TARGET.match(line)
+                if not match:
+                    raise ValueError(f"{path}:{line_number}: cannot parse target '{line}'")
+                target = {key: value for key, value in match.groupdict().items() if value}
+            if "repo" not in target:
+                raise ValueError(f"{path}:{line_number}: target has no 'repo'")
+            targets.append(target)
+    return targets
+
+
+def target_name(target):
+    """Stable, filesystem-safe name for a target's report files"""
+    suffix = f"pr-{target['pr']}" if target.get("pr") else re.sub(r"[^\w.-]", "_", target.get("ref", "HEAD"))
+    return f"{target['repo'].replace('/', '__')}__{suffix}"
+
+
+def _git(args, cwd):
+    from src.utils.process_runner import run_command
+
+    return run_command(["git", *args], cwd=cwd, check=True).stdout
+
+
+def _checkout(target, repo_path, worktree_root):
+    """
+    Create a worktree for the target and return (worktree path, changed files)
+
+    The analysers diff the worktree against HEAD^, so PRs are checked out at
+    the origin's pull/<n>/merge ref: a merge commit whose first parent is the
+    base branch, which makes HEAD^..HEAD every change of the PR rather than
+    its last commit. Other refs are analysed as their last commit.
+
+    Raises:
+        RuntimeError: The PR has no merge ref (it has conflicts or is closed)
+    """
+    if target.get("pr"):
+        ref = f"refs/migraterator/pr-{target['pr']}"
+        try:
+            _git(["fetch", "-q", "origin", f"+pull/{target['pr']}/merge:{ref}"], repo_path)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(
+                f"PR #{target['pr']} has no merge ref (merge conflicts or closed): {e.stderr.strip()}"
+            ) from e
+    else:
+        ref = target.get("ref", "HEAD")
+
+    worktree = os.path.join(worktree_root, uuid.uuid4().hex)
+    _git(["worktree", "add", "-q", "--detach", worktree, ref], repo_path)
+
+    if target.get("pr") and os.environ.get("GITHUB_TOKEN"):
+        from src.utils.github_utils import get_pr_files
+
+        files = get_pr_files(target["repo"], target["pr"], os.environ["GITHUB_TOKEN"])
+    else:
+        files = _git(["diff", "--name-only", "HEAD^", "HEAD"], worktree).split()
+    return worktree, files
+
+
+def _init_worker(settings):
+    """Worker initializer: apply the batch's cache settings to the worker's environment only"""
+    os.environ.update(settings)
+
+
+def analyse_target(target, output_dir, workspace, use_llm):
+    """Worker entry point: analyse one target and write its reports"""
+    from src.main import analyse_repository
+    from src.utils.git_blobs import close_reader
+
+    name = target_name(target)
+    repo_path = target.get("path") or os.path.join(workspace, target["repo"])
+    summary = {"target": target, "name": name, "status": "failed"}
+    start = time.perf_counter()
+    worktree_root = tempfile.mkdtemp(prefix="migraterator-worktree-")
+    worktree = None
+    try:
+        worktree, pr_files = _checkout(target, repo_path, worktree_root)
+        report_markdown, report_generator = analyse_repository(worktree, pr_files, use_llm=use_llm)
+
+        report_path = os.path.join(output_dir, f"{name}.md")
+        with open(report_path, 'w') as f:
+            f.write(report_markdown)
+        json_path = os.path.join(output_dir, f"{name}.json")
+        report_generator.write_artifacts(json_path=json_path)
+
+        assessment = report_generator.risk_assessment or {}
+        summary.update({
+            "status": "done",
+            "overall_risk": assessment.get("overall_risk", "unknown"),
+            "risk_count": sum(len(findings) for findings in assessment.get("findings", {}).values()),
+            "files": len(pr_files),
+            "report": os.path.basename(report_path),
+            "json": os.path.basename(json_path)
+        })
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        if worktree:
+            close_reader(worktree)
+            try:
+                _git(["worktree", "remove", "--force", worktree], repo_path)
+            except Exception:
+                pass
+        shutil.rmtree(worktree_root, ignore_errors=True)
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def run_batch(targets, output_dir, workspace=".", workers=4, per_repo=1, use_llm=None, cache_dir=None):
+    """
+    Analyse every target on a process pool
+
+    Args:
+        targets: Output of load_targets()
+        output_dir: Directory for per-target reports and the aggregate index
+        workspace: Directory holding checkouts as <workspace>/<owner>/<repo>,
+            for targets without an explicit "path"
+        workers: Number of worker processes
+        per_repo: Maximum number of targets of the same repository analysed at once
+        use_llm: Passed to ReportGenerator (None = decide from the environment)
+        cache_dir: Shared cache directory (defaults to MIGRATERATOR_CACHE_DIR or
+            a temporary directory removed afterwards)
+
+    Returns:
+        List of per-target summaries, in the order of targets
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    own_cache = cache_dir is None and not os.environ.get("MIGRATERATOR_CACHE_DIR")
+    cache_dir = cache_dir or os.environ.get("MIGRATERATOR_CACHE_DIR") or tempfile.mkdtemp(prefix="migraterator-cache-")
+
+    # Set in the worker processes only, so this process (e.g. a server or the
+    # next batch) does not keep pointing at a cache directory removed below
+    settings = {
+        "MIGRATERATOR_CACHE_DIR": cache_dir,
+        "TF_PLUGIN_CACHE_DIR": os.environ.get("TF_PLUGIN_CACHE_DIR") or os.path.join(cache_dir, "terraform-plugins"),
+        "MIGRATERATOR_PLAN_CACHE_KEY": os.environ.get("MIGRATERATOR_PLAN_CACHE_KEY") or uuid.uuid4().hex,
+        # Targets already run in parallel; a decode pool per worker would oversubscribe the cores
+        "MIGRATERATOR_DECODE_WORKERS": os.environ.get("MIGRATERATOR_DECODE_WORKERS") or "1"
+    }
+    os.makedirs(settings["TF_PLUGIN_CACHE_DIR"], exist_ok=True)
+
+    pending = deque(enumerate(targets))
+    running = {}
+    in_flight = {}
+    results = [None] * len(targets)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as executor:
+            while pending or running:
+                # Submit every pending target whose repository is below its cap
+                for _ in range(len(pending)):
+                    index, target = pending.popleft()
+                    repo = target["repo"]
+                    if len(running) < workers and in_flight.get(repo, 0) < per_repo:
+                        future = executor.submit(analyse_target, target, output_dir, workspace, use_llm)
+                        running[future] = (index, repo)
+                        in_flight[repo] = in_flight.get(repo, 0) + 1
+                    else:
+                        pending.append((index, target))
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, repo = running.pop(future)
+                    in_flight[repo] -= 1
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        results[index] = {"target": targets[index], "name": target_name(targets[index]),
+                                          "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                    print(f"[{sum(r is not None for r in results)}/{len(targets)}] "
+                          f"{results[index]['name']}: {results[index]['status']}")
+    finally:
+        if own_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    write_index(results, output_dir)
+    return results
+
+
+def write_index(results, output_dir):
+    """Write index.json and index.md summarising every target"""
+    with open(os.path.join(output_dir, "index.json"), 'w') as f:
+        json.dump(results, f, indent=2)
+
+    lines = [
+        "# Migraterator Batch Report",
+        "",
+        "| Target | Status | Overall risk | Risks | Files | Seconds | Report |",
+        "|---|---|---|---|---|---|---|"
+    ]
+    order = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+    for result in sorted(results, key=lambda r: (order.get(r.get("overall_risk"), 4), r["name"])):
+        target = result["target"]
+        label = target["repo"] + (f"#{target['pr']}" if target.get("pr") else f"@{target.get('ref', 'HEAD')}")
+        report = f"[{result['report']}]({result['report']})" if result.get("report") else result.get("error", "")
+        lines.append(
+            f"| {label} | {result['status']} | {result.get('overall_risk', '-')} | {result.get('risk_count', '-')} "
+            f"| {result.get('files', '-')} | {result.get('seconds', '-')} | {report} |"
+        )
+    with open(os.path.join(output_dir, "index.md"), 'w') as f:
+        f.write("\n".join(lines) + "\n")
@@ -0,0 +1,284 @@
+"""
+Generators for synthetic large-PR inputs used by the benchmark suite.
+
+Everything is deterministic for a given size and seed, so timings stay
+comparable between runs and against the stored baselines.
+"""
+import json
+import os
+import random
+import stat
+import subprocess
+
+RESOURCE_TYPES = [
+    "aws_instance", "aws_db_instance", "aws_security_group", "aws_s3_bucket",
+    "aws_iam_role", "aws_lambda_function", "aws_eks_cluster", "aws_route53_record",
+    "google_compute_instance", "azurerm_virtual_machine"
+]
+
+INSTANCE_TYPES = ["t2.micro", "t2.small", "t3.medium", "m5.large", "m5.xlarge"]
+
+KINDS = ["Deployment", "StatefulSet", "Service", "ConfigMap", "Ingress"]
+
+
+def terraform_plan_changes(resource_count, seed=0):
+    """
+    Return parsed `terraform show -json` output with one change per resource and no configuration
+
+    A quarter of the resources are created, half updated and a quarter deleted.
+    """
+    rng = random.Random(seed)
+    resource_changes = []
+    for i in range(resource_count):
+        resource_type = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+        action = rng.choice(["create", "update", "delete", "update"])
+        before = {"instance_type": rng.choice(INSTANCE_TYPES), "tags": {"Name": f"r{i}"}, "id": f"i-{i:08x}"}
+        after = dict(before)
+        if action == "update":
+            after["instance_type"] = rng.choice(INSTANCE_TYPES)
+            after["tags"] = {"Name": f"r{i}", "Environment": "production"}
+        resource_changes.append({
+            "address": f"{resource_type}.resource_{i}",
+            "type": resource_type,
+            "name": f"resource_{i}",
+            "change": {
+                "actions": [action],
+                "before": before if action != "create" else {},
+                "after": after if action != "delete" else {}
+            }
+        })
+    return {"format_version": "1.2", "resource_changes": resource_changes}
+
+
+def terraform_show_json(resource_count, seed=0, module_size=100):
+    """
+    Return parsed `terraform show -json` output for resource_count resources
+
+    Resources are spread over modules of module_size and each references one
+    earlier resource (a random tree), with some cross-module references
+    through module outputs. Roughly 2% of resources are deleted or replaced.
+    """
+    rng = random.Random(seed)
+    module_calls = {}
+    resource_changes = []
+    for m in range(0, resource_count, module_size):
+        name = f"m{m // module_size}"
+        resources = []
+        for i in range(m, min(m + module_size, resource_count)):
+            resource_type = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+            references = []
+            if i > m:
+                parent = rng.randrange(m, i)
+                references = [f"{RESOURCE_TYPES[parent % len(RESOURCE_TYPES)]}.r{parent}.id",
+                              f"{RESOURCE_TYPES[parent % len(RESOURCE_TYPES)]}.r{parent}"]
+            elif m:
+                references = ["var.upstream"]
+            resources.append({
+                "address": f"{resource_type}.r{i}",
+                "type": resource_type,
+                "name": f"r{i}",
+                "expressions": {"tags": {"references": references}} if references else {}
+            })
+            roll = rng.random()
+            actions = ["delete"] if roll < 0.01 else ["delete", "create"] if roll < 0.02 else ["update"] if roll < 0.2 else ["no-op"]
+            before = {"instance_type": rng.choice(INSTANCE_TYPES)}
+            resource_changes.append({
+                "address": f"module.{name}.{resource_type}.r{i}",
+                "module_address": f"module.{name}",
+                "type": resource_type,
+                "name": f"r{i}",
+                "change": {
+                    "actions": actions,
+                    "before": before,
+                    "after": None if actions == ["delete"] else {"instance_type": rng.choice(INSTANCE_TYPES)}
+                }
+            })
+        upstream = f"m{(m // module_size) - 1}"
+        module_calls[name] = {
+            "expressions": {"upstream": {"references": [f"module.{upstream}.out", f"module.{upstream}"]}} if m else {},
+            "module": {"resources": resources}
+        }
+    return {
+        "format_version": "1.2",
+        "resource_changes": resource_changes,
+        "configuration": {"root_module": {"module_calls": module_calls}}
+    }
+
+
+def terraform_new_resource(resource_count):
+    """
+    Return (base main.tf, head main.tf, {sibling path: text}) for a PR adding one resource
+
+    main.tf holds resource_count instances and the head version appends an
+    aws_s3_bucket.new; versions.tf and variables.tf are unchanged siblings.
+    """
+    blocks = [
+        f'resource "{RESOURCE_TYPES[i % len(RESOURCE_TYPES)]}" "r{i}" {{\n'
+        f'  instance_type = var.instance_type\n'
+        f'  tags = {{\n    Name = "r{i}"\n  }}\n}}\n'
+        for i in range(resource_count)
+    ]
+    base = "\n".join(blocks)
+    head = base + '\nresource "aws_s3_bucket" "new" {\n  bucket = "new-bucket"\n}\n'
+    siblings = {
+        "versions.tf": 'terraform {\n  required_version = ">= 1.5"\n  required_providers {\n'
+                       '    aws = {\n      source  = "hashicorp/aws"\n      version = "~> 5.0"\n    }\n  }\n}\n',
+        "variables.tf": 'variable "instance_type" {\n  default = "t3.micro"\n}\n'
+    }
+    return base, head, siblings
+
+
+def _manifest_lines(index, kind, rng):
+    lines = [
+        "apiVersion: apps/v1",
+        f"kind: {kind}",
+        "metadata:",
+        f"  name: app-{index}",
+        "  namespace: default",
+        "spec:",
+        f"  replicas: {rng.randint(1, 5)}",
+        "  template:",
+        "    spec:",
+        "      containers:",
+        f"      - name: app-{index}",
+        f"        image: registry.example.com/app:{rng.randint(1, 999)}",
+        "        env:",
+        "        - name: LOG_LEVEL",
+        f"          value: {rng.choice(['debug', 'info', 'warn'])}",
+        "        volumeMounts:",
+        "        - name: data",
+        "          mountPath: /data",
+    ]
+    if rng.random() < 0.1:
+        lines.append("        securityContext:")
+        lines.append("          privileged: true")
+    return lines
+
+
+def kubectl_diff_output(object_count, seed=0):
+    """Return `kubectl diff` style unified-diff output covering object_count objects"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(object_count):
+        kind = KINDS[i % len(KINDS)]
+        before = _manifest_lines(i, kind, rng)
+        after = _manifest_lines(i, kind, rng)
+        out.append(f"diff -u -N /tmp/LIVE-1/apps.v1.{kind}.default.app-{i} /tmp/MERGED-1/apps.v1.{kind}.default.app-{i}")
+        out.append(f"--- /tmp/LIVE-1/apps.v1.{kind}.default.app-{i}")
+        out.append(f"+++ /tmp/MERGED-1/apps.v1.{kind}.default.app-{i}")
+        out.append(f"@@ -1,{len(before)} +1,{len(after)} @@")
+        for old, new in zip(before, after):
+            if old == new:
+                out.append(" " + old)
+            else:
+                out.append("-" + old)
+                out.append("+" + new)
+        for extra in after[len(before):]:
+            out.append("+" + extra)
+    return "\n".join(out) + "\n"
+
+
+def helm_render(object_count, seed=0):
+    """Return multi-document YAML as produced by `helm template`"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(object_count):
+        kind = KINDS[i % len(KINDS)]
+        docs.append(f"---\n# Source: chart/templates/{kind.lower()}.yaml\n" + "\n".join(_manifest_lines(i, kind, rng)))
+    return "\n".join(docs) + "\n"
+
+
+def cluster_snapshot_repo(path, file_count, objects_per_file, seed=0):
+    """
+    Write manifests and a recorded cluster snapshot for snapshot-mode diffing
+
+    Creates file_count manifests under path/k8s and path/snapshot.json, the
+    `kubectl get -o json` output for the same objects as they are live: with
+    status and server-managed metadata, and with some fields changed.
+
+    Returns (changed file paths relative to path, snapshot path).
+    """
+    import yaml
+
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(path, "k8s"), exist_ok=True)
+    files, live = [], []
+    for f_index in range(file_count):
+        docs = []
+        for o_index in range(objects_per_file):
+            i = f_index * objects_per_file + o_index
+            kind = KINDS[i % len(KINDS)]
+            docs.append("\n".join(_manifest_lines(i, kind, rng)))
+            obj = yaml.safe_load(docs[-1])
+            obj["metadata"].update({"uid": f"{i:032x}", "resourceVersion": str(i), "managedFields": [{"manager": "kubectl"}]})
+            obj["status"] = {"observedGeneration": 1}
+            if i % 3 == 0:
+                obj["spec"]["replicas"] += 1
+            if i % 10 != 9:  # every tenth object is new
+                live.append(obj)
+        name = f"k8s/app-{f_index}.yaml"
+        with open(os.path.join(path, name), "w") as f:
+            f.write("\n---\n".join(docs) + "\n")
+        files.append(name)
+
+    snapshot = os.path.join(path, "snapshot.json")
+    with open(snapshot, "w") as f:
+        json.dump({"apiVersion": "v1", "kind": "List", "items": live}, f)
+    return files, snapshot
+
+
+def git_diff_repo(path, file_count, lines_per_file, seed=0):
+    """
+    Create a git repository at path with two commits touching file_count files
+
+    Returns the list of changed file paths (relative to path), suitable for
+    parse_diffs() when run with path as the working directory.
+    """
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    env = dict(os.environ, GIT_AUTHOR_NAME="bench", GIT_AUTHOR_EMAIL="bench@example.com",
+               GIT_COMMITTER_NAME="bench", GIT_COMMITTER_EMAIL="bench@example.com")
+
+    def git(*args):
+        subprocess.run(["git", *args], cwd=path, env=env, check=True, capture_output=True)
+
+    git("init", "-q")
+    files = [f"terraform/module_{i}/main.tf" for i in range(file_count)]
+    contents = {}
+    for name in files:
+        os.makedirs(os.path.join(path, os.path.dirname(name)), exist_ok=True)
+        lines = [f'resource "aws_instance" "r{j}" {{ instance_type = "{rng.choice(INSTANCE_TYPES)}" }}' for j in range(lines_per_file)]
+        contents[name] = lines
+        with open(os.path.join(path, name), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    git("add", "-A")
+    git("commit", "-q", "-m", "base")
+
+    for name in files:
+        lines = contents[name]
+        for j in range(0, len(lines), 7):
+            lines[j] = lines[j].replace("instance_type", "instance_type  ")
+        with open(os.path.join(path, name), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    git("commit", "-q", "-am", "head")
+    return files
+
+
+def install_fake_tool(bin_dir, name, stdout_path, subcommand, exit_code=0):
+    """
+    Write an executable stub for a CLI tool (terraform, kubectl, helm)
+
+    The stub prints stdout_path and exits with exit_code when invoked with
+    subcommand, and exits 0 silently otherwise (e.g. `terraform init`), so
+    analysers can be timed end-to-end without the real binaries.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    script = os.path.join(bin_dir, name)
+    with open(script, "w") as f:
+        f.write(
+            "#!/bin/sh\n"
+            f'if [ "$1" = "{subcommand}" ]; then cat "{stdout_path}"; exit {exit_code}; fi\n'
+            "exit 0\n"
+        )
+    os.chmod(script, os.stat(script).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return script
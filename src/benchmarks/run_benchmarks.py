@@ -0,0 +1,431 @@
+"""
+Benchmark suite for Migraterator's hot paths.
+
+Times the plan/kubectl/git-diff parsers, the risk assessor and the report
+generator on synthetic large-PR fixtures, and compares the results with the
+stored baselines in baselines.json:
+
+    python -m src.benchmarks.run_benchmarks                # quick sizes
+    python -m src.benchmarks.run_benchmarks --full         # up to 100k resources
+    python -m src.benchmarks.run_benchmarks --update-baselines
+
+No terraform/kubectl/helm binaries, cluster or LLM key are needed: the tools
+are replaced by stub scripts and the LLM by a local stub HTTP server.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from src.benchmarks import fixtures
+from src.benchmarks.stub_server import StubServer
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+QUICK_SIZES = {
+    "plan": [1000, 10000],
+    "plan_graph": [10000],
+    "kubectl": [1000, 10000],
+    "snapshot": [1000],
+    "diff_files": [50],
+    "helm": [1000],
+    "report": [1000, 10000]
+}
+
+FULL_SIZES = {
+    "plan": [1000, 10000, 100000],
+    "plan_graph": [10000, 50000],
+    "kubectl": [1000, 10000, 50000],
+    "snapshot": [1000, 10000],
+    "diff_files": [50, 500],
+    "helm": [1000, 10000],
+    "report": [1000, 10000, 100000]
+}
+
+DIFF_LINES_PER_FILE = 2000
+
+# Processes used by the chunked decoding cases
+DECODE_WORKERS = 2
+
+# Simulated latency of the slow primary LLM endpoint and the tier's SLO
+LLM_SLOW_LATENCY = 1.0
+LLM_SLO_SECONDS = 0.1
+
+# Absolute slowdown always allowed on top of a baseline. Cases that take a few
+# tens of milliseconds swing by more than the relative tolerance on a busy
+# machine, and the baselines are wall times from a single machine.
+MIN_SLACK_SECONDS = 0.03
+
+# Hard wall-time budgets (seconds), enforced regardless of the stored baselines.
+# `migraterator --help` and rule-only runs are invoked from pre-commit hooks.
+BUDGETS = {
+    "cli_startup[--help]": 0.25
+}
+
+# Modules that must not be imported just to parse the command line
+DEFERRED_MODULES = (
+    "requests", "yaml", "src.main", "src.terraform_analyser",
+    "src.kubernetes_analyser", "src.utils.llm_client"
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@contextmanager
+def _chdir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextmanager
+def _env(**values):
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update({key: str(value) for key, value in values.items()})
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def measure(fn, repeat):
+    """Run fn `repeat` times and return the median wall time in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+class BenchmarkSuite:
+    def __init__(self, workdir, sizes, repeat):
+        self.workdir = workdir
+        self.sizes = sizes
+        self.repeat = repeat
+        self.empty_repo = os.path.join(workdir, "empty")
+        os.makedirs(self.empty_repo, exist_ok=True)
+        self.stub_server = None
+        self.slow_stub_server = None
+
+    def close(self):
+        if self.stub_server is not None:
+            self.stub_server.stop()
+        if self.slow_stub_server is not None:
+            self.slow_stub_server.stop()
+
+    def cases(self):
+        """Yield (name, setup) pairs; setup() returns the callable to time"""
+        yield "cli_startup[--help]", self._cli_startup
+        for n in self.sizes["plan"]:
+            yield f"terraform_parse_plan[{n}]", lambda n=n: self._terraform_parse(n)
+        for n in self.sizes["plan_graph"]:
+            yield f"terraform_show_blast_radius[{n}]", lambda n=n: self._terraform_show(n)
+        for n in self.sizes["kubectl"]:
+            yield f"kubectl_parse_diff[{n}]", lambda n=n: self._kubectl_parse(n)
+        n = self.sizes["kubectl"][-1]
+        yield f"kubectl_parse_diff_chunked[{n}x{DECODE_WORKERS}]", lambda: self._kubectl_parse_chunked(n)
+        for n in self.sizes["snapshot"]:
+            yield f"kubectl_snapshot_diff[{n}]", lambda n=n: self._snapshot_diff(n)
+        for n in self.sizes["diff_files"]:
+            yield f"parse_diff[{n}x{DIFF_LINES_PER_FILE}]", lambda n=n: self._parse_diff(n)
+            yield f"git_blob_read[{n}x{DIFF_LINES_PER_FILE}]", lambda n=n: self._blob_read(n)
+            yield f"terraform_static[{n}x{DIFF_LINES_PER_FILE}]", lambda n=n: self._terraform_static(n)
+            yield f"terraform_static_scope[{n}]", lambda n=n: self._terraform_static_scope(n)
+        for n in self.sizes["helm"]:
+            yield f"helm_analysis[{n}]", lambda n=n: self._helm_analysis(n)
+        for n in self.sizes["report"]:
+            yield f"risk_assessment[{n}]", lambda n=n: self._risk_assessment(n)
+            yield f"report_end_to_end[{n}]", lambda n=n: self._report(n)
+        yield f"llm_route_slo_fallback[{LLM_SLOW_LATENCY}s]", self._llm_route
+
+    def _cli_startup(self):
+        check = (
+            "import sys, src.cli; "
+            f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+        )
+        loaded = subprocess.run(
+            [sys.executable, "-c", check], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        if loaded:
+            raise RuntimeError(f"CLI startup imports deferred modules: {loaded}")
+
+        def run():
+            subprocess.run([sys.executable, "-m", "src.cli", "--help"], cwd=REPO_ROOT, capture_output=True, check=True)
+        return run
+
+    def _terraform_parse(self, n):
+        from src.terraform_analyser import TerraformAnalyser
+
+        show_output = json.dumps(fixtures.terraform_plan_changes(n))
+        analyser = TerraformAnalyser(self.empty_repo, [])
+        return lambda: analyser._parse_plan_json(show_output)
+
+    def _terraform_show(self, n):
+        from src.terraform_analyser import TerraformAnalyser
+
+        show_output = json.dumps(fixtures.terraform_show_json(n))
+        analyser = TerraformAnalyser(self.empty_repo, [])
+        return lambda: analyser._parse_plan_json(show_output)
+
+    def _kubectl_parse_chunked(self, n):
+        from src.kubernetes_analyser import KubernetesAnalyser
+        from src.models import to_plain
+
+        diff_output = fixtures.kubectl_diff_output(n)
+        analyser = KubernetesAnalyser(self.empty_repo, [])
+        expected = to_plain(analyser._parse_kubectl_diff(diff_output))
+
+        def run():
+            with _env(MIGRATERATOR_DECODE_WORKERS=str(DECODE_WORKERS), MIGRATERATOR_PARALLEL_DECODE_BYTES="0"):
+                if to_plain(analyser._parse_kubectl_diff(diff_output)) != expected:
+                    raise RuntimeError("Chunked kubectl diff parsing differs from single-process parsing")
+        return run
+
+    def _kubectl_parse(self, n):
+        from src.kubernetes_analyser import KubernetesAnalyser
+
+        diff_output = fixtures.kubectl_diff_output(n)
+        analyser = KubernetesAnalyser(self.empty_repo, [])
+        return lambda: analyser._parse_kubectl_diff(diff_output)
+
+    def _snapshot_diff(self, n):
+        from src.kubernetes_analyser import KubernetesAnalyser
+
+        repo = os.path.join(self.workdir, f"snapshot-{n}")
+        files, snapshot = fixtures.cluster_snapshot_repo(repo, 100, max(1, n // 100))
+
+        def run():
+            with _env(MIGRATERATOR_K8S_SNAPSHOT=snapshot):
+                KubernetesAnalyser(repo, files, helm_charts=[]).run_kubectl_diff()
+        return run
+
+    def _parse_diff(self, n):
+        from src.utils.diff_utils import parse_diffs
+
+        repo = os.path.join(self.workdir, f"git-{n}")
+        files = fixtures.git_diff_repo(repo, n, DIFF_LINES_PER_FILE)
+        git_diff = subprocess.run(["git", "diff", "HEAD^", "--", files[0]], cwd=repo,
+                                  capture_output=True, text=True, check=True).stdout
+        expected = [line[1:] for line in git_diff.splitlines() if line.startswith("+") and not line.startswith("+++")]
+
+        def run():
+            # The analysers diff all changed files in one call
+            with _chdir(repo):
+                diffs = parse_diffs(files)
+            if diffs[files[0]].added_lines != expected:
+                raise RuntimeError("parse_diffs() added lines differ from `git diff`")
+        return run
+
+    def _blob_read(self, n):
+        from src.utils.git_blobs import GitBlobReader
+
+        repo = os.path.join(self.workdir, f"blobs-{n}")
+        files = fixtures.git_diff_repo(repo, n, DIFF_LINES_PER_FILE)
+
+        def run():
+            # A fresh reader each run: process start plus uncached base reads
+            with GitBlobReader(repo) as reader:
+                reader.read_many(files, "HEAD^")
+        return run
+
+    def _terraform_static_scope(self, n):
+        from src.utils.hcl_static import analyse_configuration
+
+        base, head, siblings = fixtures.terraform_new_resource(n)
+
+        def run():
+            # The most common PR: one new resource in main.tf next to versions.tf
+            results = analyse_configuration(["main.tf"], {"main.tf": base}, {"main.tf": head}, siblings)
+            if results["needs_plan"] or results["targets"] != ["aws_s3_bucket.new"]:
+                raise RuntimeError(
+                    f"New resource not scoped to its address: targets={results['targets']}, "
+                    f"needs_plan={results['needs_plan'][:3]}"
+                )
+        return run
+
+    def _terraform_static(self, n):
+        from src.terraform_analyser import TerraformAnalyser
+
+        repo = os.path.join(self.workdir, f"tfstatic-{n}")
+        files = fixtures.git_diff_repo(repo, n, DIFF_LINES_PER_FILE)
+        analyser = TerraformAnalyser(repo, files)
+
+        def run():
+            results = analyser.analyse_static()
+            if results["needs_plan"]:
+                raise RuntimeError(f"Formatting-only edits need a plan: {results['needs_plan'][:3]}")
+        return run
+
+    def _helm_analysis(self, n):
+        from src.kubernetes_analyser import KubernetesAnalyser
+
+        repo = os.path.join(self.workdir, f"helm-{n}")
+        os.makedirs(os.path.join(repo, "chart"), exist_ok=True)
+        with open(os.path.join(repo, "chart", "Chart.yaml"), "w") as f:
+            f.write("apiVersion: v2\nname: chart\nversion: 0.1.0\n")
+        render = os.path.join(self.workdir, f"helm-{n}.yaml")
+        with open(render, "w") as f:
+            f.write(fixtures.helm_render(n))
+        bin_dir = os.path.join(self.workdir, f"bin-helm-{n}")
+        fixtures.install_fake_tool(bin_dir, "helm", render, "template")
+
+        def run():
+            with _env(PATH=bin_dir + os.pathsep + os.environ.get("PATH", "")):
+                KubernetesAnalyser(repo, []).analyse_helm_changes()
+        return run
+
+    def _analyses(self, n):
+        from src.kubernetes_analyser import KubernetesAnalyser
+        from src.terraform_analyser import TerraformAnalyser
+
+        plan_results = TerraformAnalyser(self.empty_repo, [])._parse_plan_json(json.dumps(fixtures.terraform_plan_changes(n)))
+        kubectl = KubernetesAnalyser(self.empty_repo, [])
+        per_file = max(1, n // 100)
+        kubectl_results = {}
+        for i in range(100):
+            output = fixtures.kubectl_diff_output(per_file, seed=i)
+            kubectl_results[f"k8s/app-{i}.yaml"] = {"diff_output": output, "parsed_diff": kubectl._parse_kubectl_diff(output)}
+        terraform_analysis = {"plan_results": plan_results, "file_changes": {"iam/main.tf": {}}}
+        kubernetes_analysis = {"kubectl_results": kubectl_results, "helm_results": {}, "file_changes": {}}
+        return terraform_analysis, kubernetes_analysis
+
+    def _risk_assessment(self, n):
+        from src.risk_assessor import RiskAssessor
+
+        terraform_analysis, kubernetes_analysis = self._analyses(n)
+        return lambda: RiskAssessor(terraform_analysis, kubernetes_analysis).generate_assessment()
+
+    def _report(self, n):
+        from src.report_generator import ReportGenerator
+        from src.risk_assessor import RiskAssessor
+
+        terraform_analysis, kubernetes_analysis = self._analyses(n)
+        json_path = os.path.join(self.workdir, "report.json")
+        sarif_path = os.path.join(self.workdir, "report.sarif")
+
+        if self.stub_server is None:
+            self.stub_server = StubServer().start()
+
+        def run():
+            with _env(
+                LLM_API_KEY="stub", LLM_PROVIDER="openai", LLM_MODEL="stub-model",
+                LLM_API_URL=self.stub_server.url + "/v1/chat/completions"
+            ):
+                assessment = RiskAssessor(terraform_analysis, kubernetes_analysis).generate_assessment()
+                generator = ReportGenerator(terraform_analysis, kubernetes_analysis, assessment)
+                generator.generate_markdown_report()
+                generator.write_artifacts(json_path=json_path, sarif_path=sarif_path)
+        return run
+
+    def _llm_route(self):
+        from src.utils.llm_router import LLMRouter
+
+        if self.stub_server is None:
+            self.stub_server = StubServer().start()
+        if self.slow_stub_server is None:
+            self.slow_stub_server = StubServer(latency=LLM_SLOW_LATENCY).start()
+        with _env(LLM_API_KEY="stub"):
+            router = LLMRouter.from_config({"tiers": [{
+                "name": "default",
+                "slo_seconds": LLM_SLO_SECONDS,
+                "endpoints": [
+                    {"provider": "openai", "model": "slow", "api_url": self.slow_stub_server.url + "/v1/chat/completions"},
+                    {"provider": "gemini", "model": "fast", "api_url": self.stub_server.url + "/v1beta/models"}
+                ]
+            }]})
+
+        # Answered by the fallback shortly after the SLO, not by the slow primary
+        return lambda: router.generate_text("Summarise this change")
+
+    def run(self, pattern="*"):
+        results = {}
+        self.errors = []
+        for name, setup in self.cases():
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            try:
+                fn = setup()
+                results[name] = measure(fn, self.repeat)
+                print(f"{name:<36} {results[name]:>10.4f}s")
+            except Exception as e:
+                self.errors.append(name)
+                print(f"{name:<36} {'ERROR':>11} {type(e).__name__}: {e}")
+        return results
+
+
+def regression_limit(baseline, tolerance):
+    """Slowest time still accepted for a case with this baseline"""
+    return max(baseline * (1 + tolerance), baseline + MIN_SLACK_SECONDS)
+
+
+def compare(results, baselines, tolerance):
+    """Return the list of (name, seconds, limit) that regressed beyond tolerance or budget"""
+    regressions = []
+    for name, seconds in results.items():
+        baseline = baselines.get(name)
+        if baseline is not None and seconds > regression_limit(baseline, tolerance):
+            regressions.append((name, seconds, regression_limit(baseline, tolerance)))
+        elif name in BUDGETS and seconds > BUDGETS[name]:
+            regressions.append((name, seconds, BUDGETS[name]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Migraterator benchmark suite')
+    parser.add_argument('--full', action='store_true', help='Include the largest fixture sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the median is reported')
+    parser.add_argument('--only', default='*', help='Glob selecting which cases to run')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown vs baseline (0.5 = 50%%)')
+    parser.add_argument('--baselines', default=BASELINES_PATH, help='Baselines file')
+    parser.add_argument('--update-baselines', action='store_true', help='Store these results as the new baselines')
+    parser.add_argument('--output', default=None, help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="migraterator-bench-")
+    suite = BenchmarkSuite(workdir, FULL_SIZES if args.full else QUICK_SIZES, args.repeat)
+    try:
+        results = suite.run(args.only)
+    finally:
+        suite.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    if args.update_baselines:
+        baselines.update({name: round(seconds, 6) for name, seconds in results.items()})
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines updated: {args.baselines}")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    for name, seconds, limit in regressions:
+        print(f"REGRESSION {name}: {seconds:.4f}s vs limit {limit:.4f}s")
+    return 1 if regressions or suite.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
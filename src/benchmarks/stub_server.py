@@ -0,0 +1,129 @@
+"""
+Local stand-in for the OpenAI, Gemini and GitHub HTTP APIs.
+
+Point LLM_API_URL / GITHUB_API_URL at a running StubServer to exercise the
+HTTP paths without network access or credentials.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_COMPLETION = (
+    "## Summary\n\nThis PR changes infrastructure resources.\n\n"
+    "## Risks\n\n- Review deletions before applying.\n"
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the body
+    # can wait for the client's delayed ACK (~40 ms per request)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on a slow response (a request timeout)
+            self.close_connection = True
+
+    def do_GET(self):
+        self.server.record(self.command, self.path)
+        match = re.match(r"^/repos/[^/]+/[^/]+/pulls/\d+/files", self.path)
+        if match:
+            files = [{"filename": name} for name in self.server.pr_files]
+            self._send_json(200, files)
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        self.server.record(self.command, self.path)
+        payload = self._read_json()
+        time.sleep(self.server.latency)
+
+        if self.path.endswith("/chat/completions"):
+            prompt = payload.get("messages", [{}])[-1].get("content", "")
+            self._send_json(200, {
+                "model": payload.get("model"),
+                "choices": [{"message": {"role": "assistant", "content": self.server.completion}}],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4,
+                    "completion_tokens": len(self.server.completion) // 4,
+                    "total_tokens": (len(prompt) + len(self.server.completion)) // 4
+                }
+            })
+        elif ":generateContent" in self.path:
+            prompt = payload.get("contents", [{}])[0].get("parts", [{}])[0].get("text", "")
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": self.server.completion}]}}],
+                "usageMetadata": {
+                    "promptTokenCount": len(prompt) // 4,
+                    "candidatesTokenCount": len(self.server.completion) // 4,
+                    "totalTokenCount": (len(prompt) + len(self.server.completion)) // 4
+                }
+            })
+        elif re.match(r"^/repos/[^/]+/[^/]+/issues/\d+/comments", self.path):
+            self._send_json(201, {"id": len(self.server.requests), "body": payload.get("body", "")})
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering like the LLM and GitHub APIs
+
+    Args:
+        latency: Seconds to sleep before answering each POST (simulated LLM latency)
+        pr_files: File names returned for any "list PR files" request
+        completion: Text returned for every LLM request
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, pr_files=(), completion=STUB_COMPLETION, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.pr_files = list(pr_files)
+        self.completion = completion
+        self.requests = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, method, path):
+        with self._lock:
+            self.requests.append((method, path))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
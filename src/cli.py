@@ -2,7 +2,15 @@
 import os
 import sys
 import click
-from src.main import run_migraterator
+from src.utils.instrumentation import tracer
+
+def _report_profile(trace_output):
+    """Write the collected trace and print a per-stage timing summary"""
+    tracer.write(trace_output)
+    click.echo("\nProfile:")
+    click.echo("========")
+    click.echo(tracer.summary())
+    click.echo(f"Trace written to {trace_output} (open in chrome://tracing or Perfetto)")
 
 @click.group()
 def cli():
@@ -18,7 +26,15 @@ def cli():
 @click.option('--llm-provider', default='openai', help='LLM provider to use (openai or gemini)')
 @click.option('--llm-model', default='', help='Model to use for the selected provider')
 @click.option('--output', default='migration_report.md', help='Output file for the report')
-def analyze(repo_path, pr_number, repo_name, github_token, llm_api_key, llm_provider, llm_model, output):
+@click.option('--json-output', default=None, help='Also write the full report as JSON to this file')
+@click.option('--sarif-output', default=None, help='Also write the risks as SARIF to this file')
+@click.option('--no-llm', is_flag=True, help='Only produce the rule-based report, without calling the LLM')
+@click.option('--deadline', type=float, default=None,
+              help='Seconds the analysis may take; stages that do not fit are skipped and a partial report is written')
+@click.option('--profile', is_flag=True, help='Print per-stage timings and write a Chrome trace')
+@click.option('--trace-output', default='migraterator-trace.json', help='Trace file written with --profile')
+def analyze(repo_path, pr_number, repo_name, github_token, llm_api_key, llm_provider, llm_model, output,
+            json_output, sarif_output, no_llm, deadline, profile, trace_output):
     """Analyze infrastructure changes in a PR and generate a migration report."""
     # Set environment variables
     os.environ['GITHUB_WORKSPACE'] = repo_path
@@ -33,10 +49,29 @@ def analyze(repo_path, pr_number, repo_name, github_token, llm_api_key, llm_prov
     
     os.environ['LLM_PROVIDER'] = llm_provider
     os.environ['LLM_MODEL'] = llm_model
+    os.environ['REPORT_PATH'] = output
+    
+    if no_llm:
+        os.environ['MIGRATERATOR_NO_LLM'] = '1'
+    
+    if deadline is not None:
+        os.environ['MIGRATERATOR_DEADLINE'] = str(deadline)
+    
+    if json_output:
+        os.environ['REPORT_JSON_PATH'] = json_output
+    
+    if sarif_output:
+        os.environ['REPORT_SARIF_PATH'] = sarif_output
+    
+    # Imported here so `--help` and other commands don't pay for the analysers
+    from src.main import run_migraterator
     
     # Run the main function
     exit_code = run_migraterator()
     
+    if profile:
+        _report_profile(trace_output)
+    
     # Print success message
     if exit_code == 0:
         click.echo(f"Migration report generated successfully: {output}")
@@ -49,7 +84,10 @@ def analyze(repo_path, pr_number, repo_name, github_token, llm_api_key, llm_prov
 
 @cli.command()
 @click.option('--repo-path', default='.', help='Path to the repository')
-def local(repo_path):
+@click.option('--no-llm', is_flag=True, help='Only produce the rule-based report, without calling the LLM')
+@click.option('--profile', is_flag=True, help='Print per-stage timings and write a Chrome trace')
+@click.option('--trace-output', default='migraterator-trace.json', help='Trace file written with --profile')
+def local(repo_path, no_llm, profile, trace_output):
     """Run a local analysis without GitHub API integration."""
     # Import the local test module
     sys.path.append(os.path.join(os.path.dirname(__file__), 'tests'))
@@ -58,9 +96,66 @@ def local(repo_path):
     # Set environment variables
     os.environ['GITHUB_WORKSPACE'] = repo_path
     
+    if no_llm:
+        os.environ['MIGRATERATOR_NO_LLM'] = '1'
+    
     # Run the local test
-    exit_code = run_local_test()
+    exit_code = run_local_test(['--repo-path', repo_path])
+    
+    if profile:
+        _report_profile(trace_output)
+    
     sys.exit(exit_code)
 
+@cli.command()
+@click.option('--host', default='127.0.0.1', help='Address to listen on')
+@click.option('--port', default=8765, type=int, help='TCP port to listen on')
+@click.option('--socket', 'socket_path', default=None, help='Listen on this Unix socket instead of TCP')
+@click.option('--workers', default=4, type=int, help='Number of jobs analysed concurrently')
+@click.option('--max-queue', default=64, type=int, help='Queued jobs accepted before new ones are rejected')
+@click.option('--cache-dir', default=None, help='Directory for warm terraform/helm/command caches')
+@click.option('--workspace', default='.', help='Directory holding the checkouts jobs may analyse')
+def serve(host, port, socket_path, workers, max_queue, cache_dir, workspace):
+    """Run a long-lived analysis server that accepts jobs over HTTP."""
+    from src.server import DEFAULT_CACHE_DIR, serve as run_server
+    
+    run_server(
+        host=host,
+        port=port,
+        socket_path=socket_path,
+        workers=workers,
+        max_queue=max_queue,
+        cache_dir=cache_dir or DEFAULT_CACHE_DIR,
+        workspace=workspace
+    )
+
+@cli.command()
+@click.option('--targets', required=True, help='File listing targets (owner/repo#PR, owner/repo@ref or JSON lines)')
+@click.option('--output-dir', default='migraterator-reports', help='Directory for per-target reports and the index')
+@click.option('--workspace', default='.', help='Directory holding checkouts as <workspace>/<owner>/<repo>')
+@click.option('--workers', default=4, type=int, help='Number of targets analysed concurrently')
+@click.option('--per-repo', default=1, type=int, help='Maximum concurrent targets per repository')
+@click.option('--cache-dir', default=None, help='Shared cache directory (default: a temporary one)')
+@click.option('--no-llm', is_flag=True, help='Only produce rule-based reports, without calling the LLM')
+def batch(targets, output_dir, workspace, workers, per_repo, cache_dir, no_llm):
+    """Analyze many PRs or refs in one run with shared caches."""
+    from src.batch import load_targets, run_batch
+
+    if no_llm:
+        os.environ['MIGRATERATOR_NO_LLM'] = '1'
+
+    results = run_batch(
+        load_targets(targets),
+        output_dir,
+        workspace=workspace,
+        workers=workers,
+        per_repo=per_repo,
+        cache_dir=cache_dir
+    )
+
+    failed = sum(1 for result in results if result["status"] != "done")
+    click.echo(f"Analysed {len(results) - failed}/{len(results)} targets; index: {os.path.join(output_dir, 'index.md')}")
+    sys.exit(1 if failed else 0)
+
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
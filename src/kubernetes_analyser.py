@@ -1,110 +1,242 @@
 import subprocess
-import yaml
 import os
-from src.utils.diff_utils import parse_diff
+from array import array
+from src.models import KubectlDiff
+from src.utils.diff_utils import BASE_REVISION, parse_diffs
+from src.utils.git_blobs import blob_reader
+from src.utils.parallel_decode import map_chunks
+from src.utils.process_runner import require_complete, run_command
+
+def _classify_diff_lines(diff_output):
+    """
+    Return the (starts, ends) offsets of added, modified and removed line contents in kubectl diff output
+    
+    Module-level so map_chunks() can run it on worker processes.
+    """
+    added, modified, removed = (array("L"), array("L")), (array("L"), array("L")), (array("L"), array("L"))
+    
+    # Simple parsing logic - can be enhanced. Lines are kept as offsets
+    # into diff_output instead of copies of the stripped text.
+    start = 0
+    length = len(diff_output)
+    while start <= length:
+        end = diff_output.find('\n', start)
+        if end == -1:
+            end = length
+        line = diff_output[start:end]
+        stripped = line.strip()
+        if stripped:
+            first = start + len(line) - len(line.lstrip())
+            marker = stripped[0]
+            if marker == '+' and not stripped.startswith('+++'):
+                table = added
+            elif marker == '-' and not stripped.startswith('---'):
+                table = removed
+            elif marker == '~':
+                table = modified
+            else:
+                table = None
+            if table is not None:
+                content = stripped[1:]
+                content_start = first + 1 + len(content) - len(content.lstrip())
+                table[0].append(content_start)
+                table[1].append(content_start + len(content.strip()))
+        start = end + 1
+    
+    return added, modified, removed
+
+def find_helm_charts(repo_path):
+    """Return the chart directories (relative to repo_path) in a repository"""
+    helm_charts = []
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if d != '.git']
+        if 'Chart.yaml' in files:
+            helm_charts.append(os.path.relpath(root, repo_path))
+    return helm_charts
 
 class KubernetesAnalyser:
-    def __init__(self, repo_path, pr_files):
+    def __init__(self, repo_path, pr_files, helm_charts=None):
         self.repo_path = repo_path
+        self.changed_files = list(pr_files)
         self.pr_files = [f for f in pr_files if f.endswith(('.yaml', '.yml'))]
-        self.helm_charts = self._identify_helm_charts()
+        # Callers that keep a repository index (e.g. the server) pass the charts in
+        self.helm_charts = self._identify_helm_charts() if helm_charts is None else helm_charts
+        # Cluster snapshot shared by all files when MIGRATERATOR_K8S_SNAPSHOT is set
+        self.snapshot = None
         
     def _identify_helm_charts(self):
         """Identify Helm charts in the repository"""
-        helm_charts = []
-        for root, dirs, files in os.walk(self.repo_path):
-            if 'Chart.yaml' in files:
-                helm_charts.append(os.path.relpath(root, self.repo_path))
-        return helm_charts
+        return find_helm_charts(self.repo_path)
     
     def run_kubectl_diff(self, namespace="default"):
         """Run kubectl diff on the changed Kubernetes manifests"""
+        # MIGRATERATOR_K8S_SNAPSHOT=live fetches one cluster snapshot for all
+        # files; any other value is the path of a recorded snapshot
+        snapshot_source = os.environ.get("MIGRATERATOR_K8S_SNAPSHOT")
+        if snapshot_source:
+            return self._run_snapshot_diff(snapshot_source, namespace)
+        
         results = {}
         
         for k8s_file in self.pr_files:
             try:
                 # Run kubectl diff
-                result = subprocess.run(
+                result = require_complete(run_command(
                     ["kubectl", "diff", "-f", k8s_file, "-n", namespace],
-                    cwd=self.repo_path,
-                    capture_output=True,
-                    text=True
-                )
-                
-                # kubectl diff returns exit code 1 if there are differences
-                # which would normally raise an exception, so we handle it manually
+                    cwd=self.repo_path
+                ))
+            except (subprocess.SubprocessError, OSError) as e:
                 results[k8s_file] = {
-                    "diff_output": result.stdout,
-                    "parsed_diff": self._parse_kubectl_diff(result.stdout)
+                    "error": str(e),
+                    "stdout": getattr(e, "stdout", ""),
+                    "stderr": getattr(e, "stderr", "")
                 }
-            except subprocess.CalledProcessError as e:
+                continue
+            
+            # kubectl diff exits with 1 when there are differences and with
+            # greater codes when the diff itself failed
+            if result.returncode > 1:
                 results[k8s_file] = {
-                    "error": str(e),
-                    "stdout": e.stdout,
-                    "stderr": e.stderr
+                    "error": f"kubectl diff exited with code {result.returncode}",
+                    "stdout": result.stdout,
+                    "stderr": result.stderr
+                }
+            else:
+                results[k8s_file] = {
+                    "diff_output": result.stdout,
+                    "parsed_diff": self._parse_kubectl_diff(result.stdout)
                 }
         
         return results
     
-    def _parse_kubectl_diff(self, diff_output):
-        """Parse the output from kubectl diff"""
-        changes = {
-            "added": [],
-            "modified": [],
-            "removed": []
-        }
+    def _run_snapshot_diff(self, snapshot_source, namespace="default"):
+        """Diff every changed manifest in-process against a single cluster snapshot"""
+        import yaml
+        from src.utils.cluster_snapshot import ClusterSnapshot, parse_manifests, referenced_kinds
         
-        # Simple parsing logic - can be enhanced
-        for line in diff_output.split('\n'):
-            line = line.strip()
-            if line.startswith('+') and not line.startswith('+++'):
-                changes["added"].append(line[1:].strip())
-            elif line.startswith('-') and not line.startswith('---'):
-                changes["removed"].append(line[1:].strip())
-            elif line.startswith('~'):
-                changes["modified"].append(line[1:].strip())
-                
+        results = {}
+        manifests = {}
+        # Read through the shared blob reader so the file diffs reuse the contents
+        contents = blob_reader(self.repo_path).read_many(self.pr_files)
+        for k8s_file in self.pr_files:
+            if contents[k8s_file] is None:
+                results[k8s_file] = {"error": f"{k8s_file} not found", "stdout": "", "stderr": ""}
+                continue
+            try:
+                manifests[k8s_file] = parse_manifests(contents[k8s_file])
+            except yaml.YAMLError as e:
+                results[k8s_file] = {"error": str(e), "stdout": "", "stderr": ""}
+        
+        if self.snapshot is None:
+            try:
+                if snapshot_source == "live":
+                    kinds = referenced_kinds((obj for objects in manifests.values() for obj in objects), namespace)
+                    self.snapshot = ClusterSnapshot.fetch(kinds)
+                else:
+                    self.snapshot = ClusterSnapshot.load(snapshot_source)
+            except (subprocess.SubprocessError, OSError, ValueError) as e:
+                for k8s_file in manifests:
+                    results[k8s_file] = {
+                        "error": f"Could not load cluster snapshot: {e}",
+                        "stdout": getattr(e, "stdout", ""),
+                        "stderr": getattr(e, "stderr", "")
+                    }
+                return results
+        
+        for k8s_file, objects in manifests.items():
+            diff_output = "".join(self.snapshot.diff(obj, namespace) for obj in objects)
+            results[k8s_file] = {
+                "diff_output": diff_output,
+                "parsed_diff": self._parse_kubectl_diff(diff_output)
+            }
+        
+        return results
+    
+    def _parse_kubectl_diff(self, diff_output):
+        """Parse the output from kubectl diff (on several processes when it is very large)"""
+        changes = KubectlDiff.empty(diff_output)
+        for offset, (added, modified, removed) in map_chunks(_classify_diff_lines, diff_output):
+            changes.added.extend_offsets(*added, shift=offset)
+            changes.modified.extend_offsets(*modified, shift=offset)
+            changes.removed.extend_offsets(*removed, shift=offset)
         return changes
     
-    def analyse_helm_changes(self):
-        """analyse changes in Helm charts"""
+    def _affected_charts(self):
+        """Return the charts containing at least one file changed by the PR"""
+        affected = set()
+        for chart in self.helm_charts:
+            prefix = "" if chart == "." else chart.rstrip("/") + "/"
+            if any(path.startswith(prefix) for path in self.changed_files):
+                affected.add(chart)
+        return affected
+    
+    def analyse_helm_changes(self, base_revision=BASE_REVISION):
+        """
+        analyse changes in Helm charts
+        
+        Every chart is rendered at the checkout; charts touched by the PR are also
+        rendered at base_revision and the two renders are compared object by object.
+        """
+        import yaml
+        from src.utils.cluster_snapshot import diff_objects
+        from src.utils.helm_render import chart_exists, parse_render, render_chart
+        
         results = {}
+        affected = self._affected_charts()
+        base = None
+        if affected:
+            try:
+                base = blob_reader(self.repo_path).resolve(base_revision)
+            except (subprocess.SubprocessError, OSError):
+                base = None
         
         for chart in self.helm_charts:
-            chart_path = os.path.join(self.repo_path, chart)
             try:
-                # Run helm template to see the rendered manifests
-                result = subprocess.run(
-                    ["helm", "template", chart_path],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                
-                # Parse the YAML output
-                templates = []
-                for doc in yaml.safe_load_all(result.stdout):
-                    if doc:  # Skip empty documents
-                        templates.append(doc)
+                # Renders are cached by chart contents and helm version
+                head_objects = parse_render(render_chart(self.repo_path, chart))
                 
                 results[chart] = {
-                    "templates": templates,
-                    "resource_count": len(templates)
+                    "templates": list(head_objects.values()),
+                    "resource_count": len(head_objects)
                 }
-            except (subprocess.CalledProcessError, yaml.YAMLError) as e:
+            except (subprocess.SubprocessError, OSError, yaml.YAMLError) as e:
                 results[chart] = {"error": str(e)}
+                continue
+            
+            if chart in affected and base is not None:
+                # The base render can fail on its own (e.g. a file:// dependency
+                # outside the archived chart); keep the head render then
+                try:
+                    base_objects = {}
+                    if chart_exists(self.repo_path, chart, base):
+                        base_objects = parse_render(render_chart(self.repo_path, chart, revision=base))
+                except (subprocess.SubprocessError, OSError, yaml.YAMLError) as e:
+                    results[chart]["base_error"] = str(e)
+                    continue
+                object_changes, diff_output = diff_objects(base_objects, head_objects)
+                results[chart].update({
+                    "object_changes": object_changes,
+                    "diff_output": diff_output,
+                    "parsed_diff": self._parse_kubectl_diff(diff_output)
+                })
         
         return results
     
+    def analyse_files(self):
+        """Return the analyse_changes() structure with file diffs only, without kubectl or helm"""
+        return {
+            "kubectl_results": {},
+            "helm_results": {},
+            "file_changes": parse_diffs(self.pr_files, self.repo_path)
+        }
+    
     def analyse_changes(self):
         """analyse Kubernetes changes and return structured data"""
         kubectl_results = self.run_kubectl_diff()
         helm_results = self.analyse_helm_changes()
         
         # Add file-level diff analysis
-        file_changes = {}
-        for k8s_file in self.pr_files:
-            file_changes[k8s_file] = parse_diff(k8s_file)
+        file_changes = parse_diffs(self.pr_files, self.repo_path)
         
         return {
             "kubectl_results": kubectl_results,
@@ -1,11 +1,122 @@
 import os
 import json
 import sys
-from src.terraform_analyser import TerraformAnalyser
-from src.kubernetes_analyser import KubernetesAnalyser
 from src.risk_assessor import RiskAssessor
 from src.report_generator import ReportGenerator
-from src.utils.github_utils import get_pr_files
+from src.utils.instrumentation import tracer
+
+# Seconds kept free under a deadline for writing the final report
+REPORT_RESERVE_SECONDS = 2.0
+
+def analyse_repository(repo_path, pr_files, use_llm=None, helm_charts=None, deadline=None, flush=None):
+    """
+    Run the analysers, risk assessment and report generation for a set of changed files
+    
+    Stages are run by a StageScheduler: file diffs, static Terraform analysis
+    and a rule-based risk assessment come first, then terraform plan, kubectl
+    and Helm, then the LLM summary. Under a deadline, stages that would not
+    fit are skipped or stopped, and the report lists them.
+    
+    Args:
+        repo_path: Path to the checked out repository
+        pr_files: Changed file paths, relative to repo_path
+        use_llm: Passed to ReportGenerator (None = decide from the environment)
+        helm_charts: Chart directories, if already known (skips the repository walk)
+        deadline: Seconds the whole analysis may take (defaults to MIGRATERATOR_DEADLINE; None = no limit)
+        flush: Called with (report markdown, ReportGenerator) whenever a more
+            complete rule-based report is available, so one exists if the job is killed
+        
+    Returns:
+        Tuple of (report markdown, ReportGenerator holding the results)
+    """
+    from src.scheduler import StageScheduler
+    
+    if deadline is None and os.environ.get("MIGRATERATOR_DEADLINE"):
+        deadline = float(os.environ["MIGRATERATOR_DEADLINE"])
+    scheduler = StageScheduler(deadline, reserve=REPORT_RESERVE_SECONDS if deadline is not None else 0.0)
+    
+    # Check if there are Terraform files in the PR
+    if any(f.endswith('.tf') for f in pr_files):
+        from src.terraform_analyser import TerraformAnalyser
+        terraform_analyser = TerraformAnalyser(repo_path, pr_files)
+        scheduler.add("terraform diff", lambda results: terraform_analyser.analyse_files(), default_estimate=0.5)
+        scheduler.add(
+            "terraform plan",
+            lambda results: dict(
+                results["terraform diff"],
+                plan_results=terraform_analyser.plan_results(results["terraform diff"]["plan_results"])
+            ),
+            after=["terraform diff"],
+            when=lambda results: "terraform diff" in results and terraform_analyser.plan_needed(
+                results["terraform diff"]["plan_results"]
+            ),
+            default_estimate=300.0
+        )
+    
+    # Check if there are Kubernetes files in the PR
+    if any(f.endswith(('.yaml', '.yml')) for f in pr_files):
+        from src.kubernetes_analyser import KubernetesAnalyser
+        kubernetes_analyser = KubernetesAnalyser(repo_path, pr_files, helm_charts=helm_charts)
+        scheduler.add("kubernetes diff", lambda results: kubernetes_analyser.analyse_files(), default_estimate=0.5)
+        scheduler.add(
+            "kubernetes analysis",
+            lambda results: kubernetes_analyser.analyse_changes(),
+            after=["kubernetes diff"],
+            default_estimate=60.0
+        )
+    
+    def analyses(results):
+        # The most complete result of each analyser that finished
+        return (
+            results.get("terraform plan", results.get("terraform diff")),
+            results.get("kubernetes analysis", results.get("kubernetes diff"))
+        )
+    
+    def assess(results):
+        return RiskAssessor(*analyses(results)).generate_assessment()
+    
+    def report_generator(results, risk_assessment):
+        return ReportGenerator(*analyses(results), risk_assessment, use_llm=use_llm,
+                               incomplete_stages=scheduler.incomplete())
+    
+    def flush_rule_based(risk_assessment):
+        if flush is not None:
+            generator = report_generator(scheduler.results, risk_assessment)
+            flush(generator.generate_rule_based_report(), generator)
+    
+    diff_stages = [stage.name for stage in scheduler.stages]
+    expensive_stages = [name for name in ("terraform plan", "kubernetes analysis") if name in diff_stages]
+    scheduler.add("risk assessment", assess, after=[name for name in diff_stages if name.endswith(" diff")],
+                  on_done=flush_rule_based, default_estimate=0.1)
+    scheduler.add(
+        "full risk assessment",
+        assess,
+        after=["risk assessment"] + expensive_stages,
+        when=lambda results: any(name in results for name in expensive_stages),
+        on_done=flush_rule_based,
+        default_estimate=0.1
+    )
+    scheduler.add(
+        "llm summary",
+        lambda results: report_generator(
+            results, results.get("full risk assessment", results.get("risk assessment"))
+        ).generate_llm_enhanced_summary(),
+        after=["full risk assessment"],
+        when=lambda results: report_generator(results, None).use_llm,
+        default_estimate=30.0
+    )
+    
+    results = scheduler.run()
+    
+    risk_assessment = results.get("full risk assessment", results.get("risk assessment"))
+    if risk_assessment is None:
+        # Rule-based and fast; always part of the final report
+        risk_assessment = assess(results)
+    generator = report_generator(results, risk_assessment)
+    # Without an LLM summary (not wanted, failed or out of time) the rule-based report is used
+    report_markdown = results.get("llm summary") or generator.generate_rule_based_report()
+    
+    return report_markdown, generator
 
 def run_migraterator():
     # Get environment variables
@@ -17,44 +128,29 @@ def run_migraterator():
         print("Missing required environment variables")
         sys.exit(1)
     
+    # Deferred: pulls in the HTTP stack
+    from src.utils.github_utils import get_pr_files
+    
     # Get the list of files changed in the PR
-    pr_files = get_pr_files(repo_name, pr_number, github_token)
+    with tracer.span("fetch PR files"):
+        pr_files = get_pr_files(repo_name, pr_number, github_token)
     
-    # Initialize analysers
     repo_path = os.environ.get("GITHUB_WORKSPACE", ".")
     
-    terraform_analyser = None
-    kubernetes_analyser = None
+    # Save the report to a file (will be used by the GitHub Action to comment on
+    # the PR); partial reports are written as soon as they exist
+    def write_report(report_markdown, report_generator=None):
+        with open(os.environ.get("REPORT_PATH", "migration_report.md"), 'w') as f:
+            f.write(report_markdown)
     
-    # Check if there are Terraform files in the PR
-    if any(f.endswith('.tf') for f in pr_files):
-        print("analysing Terraform changes...")
-        terraform_analyser = TerraformAnalyser(repo_path, pr_files)
-        terraform_analysis = terraform_analyser.analyse_changes()
-    else:
-        terraform_analysis = None
+    report_markdown, report_generator = analyse_repository(repo_path, pr_files, flush=write_report)
+    write_report(report_markdown)
     
-    # Check if there are Kubernetes files in the PR
-    if any(f.endswith(('.yaml', '.yml')) for f in pr_files):
-        print("analysing Kubernetes changes...")
-        kubernetes_analyser = KubernetesAnalyser(repo_path, pr_files)
-        kubernetes_analysis = kubernetes_analyser.analyse_changes()
-    else:
-        kubernetes_analysis = None
-    
-    # Perform risk assessment
-    print("Performing risk assessment...")
-    risk_assessor = RiskAssessor(terraform_analysis, kubernetes_analysis)
-    risk_assessment = risk_assessor.generate_assessment()
-    
-    # Generate report
-    print("Generating migration report...")
-    report_generator = ReportGenerator(terraform_analysis, kubernetes_analysis, risk_assessment)
-    report_markdown = report_generator.generate_markdown_report()
-    
-    # Save the report to a file (will be used by the GitHub Action to comment on the PR)
-    with open('migration_report.md', 'w') as f:
-        f.write(report_markdown)
+    # Machine-readable artifacts reuse the results computed above
+    report_generator.write_artifacts(
+        json_path=os.environ.get("REPORT_JSON_PATH"),
+        sarif_path=os.environ.get("REPORT_SARIF_PATH")
+    )
     
     print("Migration report generated successfully")
     return 0
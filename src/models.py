@@ -0,0 +1,255 @@
+"""
+Compact records shared by the analysers, the risk assessor and the report generator.
+
+Every record is a slotted dataclass that also behaves like a read-only dict
+(``record.get("type")``, ``record["name"]``, ``"details" in record``) so code
+written against the old plain-dict results keeps working. Diff lines are not
+copied into per-line strings: a ``LineTable`` keeps one shared text buffer and
+two offset arrays, and slices the buffer only when a line is actually read.
+"""
+from array import array
+from dataclasses import dataclass, field, fields
+
+
+class LineTable:
+    """A sequence of lines stored as (start, end) offsets into one shared buffer"""
+
+    __slots__ = ("buffer", "_starts", "_ends")
+
+    def __init__(self, buffer=""):
+        self.buffer = buffer
+        self._starts = array("L")
+        self._ends = array("L")
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Build a table (and its buffer) from an iterable of strings"""
+        lines = [line.rstrip("\n") for line in lines]
+        table = cls("\n".join(lines))
+        offset = 0
+        for line in lines:
+            table.append(offset, offset + len(line))
+            offset += len(line) + 1
+        return table
+
+    def append(self, start, end):
+        self._starts.append(start)
+        self._ends.append(end)
+
+    def extend_offsets(self, starts, ends, shift=0):
+        """Append offset pairs, moving each one by ``shift`` characters"""
+        if shift:
+            starts = [start + shift for start in starts]
+            ends = [end + shift for end in ends]
+        self._starts.extend(starts)
+        self._ends.extend(ends)
+
+    def span(self, index):
+        return self._starts[index], self._ends[index]
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.buffer[self._starts[index]:self._ends[index]]
+
+    def __iter__(self):
+        buffer = self.buffer
+        for start, end in zip(self._starts, self._ends):
+            yield buffer[start:end]
+
+    def __eq__(self, other):
+        if isinstance(other, (LineTable, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LineTable({len(self)} lines)"
+
+
+_VIEW_KEYS = {}
+
+
+class DictView:
+    """Read-only mapping interface for slotted records, for backward compatibility"""
+
+    __slots__ = ()
+
+    def _view_keys(self):
+        keys = _VIEW_KEYS.get(type(self))
+        if keys is None:
+            keys = tuple(f.name for f in fields(self) if not f.name.startswith("_"))
+            _VIEW_KEYS[type(self)] = keys
+        return keys
+
+    def keys(self):
+        # Unset (None) fields are treated as missing keys, like the old dicts
+        return [key for key in self._view_keys() if getattr(self, key) is not None]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def values(self):
+        return [getattr(self, key) for key in self.keys()]
+
+    def get(self, key, default=None):
+        if key not in self._view_keys():
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def to_dict(self):
+        """Return a plain-dict copy of the record (recursively)"""
+        return {key: to_plain(value) for key, value in self.items()}
+
+
+def to_plain(value):
+    """Convert records, line tables and containers of them into plain JSON-able data"""
+    if isinstance(value, DictView):
+        return value.to_dict()
+    if isinstance(value, LineTable):
+        return list(value)
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+@dataclass(slots=True)
+class ResourceChange(DictView):
+    """A single resource entry from a terraform plan"""
+
+    type: str
+    name: str
+    details: dict = field(default_factory=dict)
+    address: str = None
+
+
+@dataclass(slots=True)
+class DiffHunk(DictView):
+    """One ``@@`` hunk of a diff; its lines live in the owning FileDiff's line table"""
+
+    header: str
+    _table: LineTable
+    _first: int
+    _last: int
+
+    @property
+    def lines(self):
+        return self._table[self._first:self._last]
+
+    def _view_keys(self):
+        return ("header", "lines")
+
+
+@dataclass(slots=True)
+class FileDiff(DictView):
+    """
+    Parsed git diff of one file.
+
+    Every hunk line is stored once in ``lines``; added and removed lines are
+    index arrays into it rather than second copies of the text.
+    """
+
+    lines: LineTable
+    hunks: list = field(default_factory=list)
+    _added: array = field(default_factory=lambda: array("L"))
+    _removed: array = field(default_factory=lambda: array("L"))
+    is_new_file: bool = None
+
+    @property
+    def added_lines(self):
+        return [self.lines[i][1:] for i in self._added]
+
+    @property
+    def removed_lines(self):
+        return [self.lines[i][1:] for i in self._removed]
+
+    @property
+    def changed_blocks(self):
+        return self.hunks
+
+    def _view_keys(self):
+        return ("added_lines", "removed_lines", "changed_blocks", "is_new_file")
+
+    @classmethod
+    def parse(cls, diff_output):
+        """Parse unified diff text into a FileDiff without copying line text"""
+        table = LineTable(diff_output)
+        diff = cls(table)
+        header = None
+        first = 0
+        start = 0
+        length = len(diff_output)
+
+        while start <= length:
+            end = diff_output.find("\n", start)
+            if end == -1:
+                end = length
+            if diff_output.startswith("@@", start):
+                if header is not None:
+                    diff.hunks.append(DiffHunk(header, table, first, len(table)))
+                header = diff_output[start:end]
+                first = len(table)
+            elif header is not None:
+                index = len(table)
+                table.append(start, end)
+                if diff_output.startswith("+", start) and not diff_output.startswith("+++", start):
+                    diff._added.append(index)
+                elif diff_output.startswith("-", start) and not diff_output.startswith("---", start):
+                    diff._removed.append(index)
+            start = end + 1
+
+        # Add the last block if it exists
+        if header is not None:
+            diff.hunks.append(DiffHunk(header, table, first, len(table)))
+
+        return diff
+
+
+@dataclass(slots=True)
+class KubectlDiff(DictView):
+    """Added, modified and removed lines from ``kubectl diff``, as offsets into its output"""
+
+    added: LineTable
+    modified: LineTable
+    removed: LineTable
+
+    @classmethod
+    def empty(cls, buffer=""):
+        return cls(LineTable(buffer), LineTable(buffer), LineTable(buffer))
+
+
+# Risk severities from lowest to highest; shared by the assessor and the LLM router
+SEVERITY_RANK = {"critical": 3, "high": 2, "medium": 1, "low": 0}
+
+
+@dataclass(slots=True)
+class Risk(DictView):
+    """A single finding produced by the risk assessor"""
+
+    severity: str
+    description: str
+    mitigation: str = None
+    recommendation: str = None
+    rule: str = None
+    resource_type: str = None
+    address: str = None
+    # Repository path of the file the finding came from, when there is one
+    file: str = None
+    # Findings this record stands for once aggregated, and their ranking weight
+    count: int = 1
+    score: float = 1
+    samples: list = None
@@ -1,11 +1,60 @@
-from src.utils.llm_client import LLMClient
+import json
+import os
+from src.models import to_plain
+from src.utils.report_builder import DEFAULT_REPORT_BUDGET, ReportBuilder, build_sarif_report
+
+# Budget priorities for report sections (lower survives truncation first)
+SECTION_PRIORITIES = {
+    "Incomplete Analysis": 0,
+    "Risk Assessment": 0,
+    "Rollback Strategies": 1,
+    "Terraform Changes": 2,
+    "Kubernetes Changes": 2
+}
+
+# Upper bound on the technical summary embedded in the LLM prompt
+PROMPT_SUMMARY_BUDGET = 48000
 
 class ReportGenerator:
-    def __init__(self, terraform_analysis=None, kubernetes_analysis=None, risk_assessment=None):
+    def __init__(self, terraform_analysis=None, kubernetes_analysis=None, risk_assessment=None,
+                 use_llm=None, llm_client=None, incomplete_stages=None):
+        """
+        Args:
+            terraform_analysis: Output of TerraformAnalyser.analyse_changes()
+            kubernetes_analysis: Output of KubernetesAnalyser.analyse_changes()
+            risk_assessment: Output of RiskAssessor.generate_assessment()
+            use_llm: Whether to ask the LLM for an enhanced report; defaults to
+                True when LLM_API_KEY or MIGRATERATOR_LLM_ROUTES is set and
+                MIGRATERATOR_NO_LLM is not
+            llm_client: Client (or LLMRouter) to use instead of one built from the environment
+            incomplete_stages: StageScheduler.incomplete() entries for a partial report
+        """
         self.terraform_analysis = terraform_analysis
         self.kubernetes_analysis = kubernetes_analysis
         self.risk_assessment = risk_assessment
-        self.llm_client = LLMClient()
+        if use_llm is None:
+            use_llm = llm_client is not None or (
+                bool(os.environ.get("LLM_API_KEY") or os.environ.get("MIGRATERATOR_LLM_ROUTES"))
+                and not os.environ.get("MIGRATERATOR_NO_LLM")
+            )
+        self.use_llm = use_llm
+        self._llm_client = llm_client
+        self.incomplete_stages = incomplete_stages or []
+    
+    @property
+    def llm_client(self):
+        """The LLM client, created on first use; the shared router when MIGRATERATOR_LLM_ROUTES is set"""
+        if self._llm_client is None:
+            from src.utils.llm_router import shared_router
+            self._llm_client = shared_router()
+        if self._llm_client is None:
+            from src.utils.llm_client import LLMClient
+            self._llm_client = LLMClient()
+        return self._llm_client
+    
+    @llm_client.setter
+    def llm_client(self, client):
+        self._llm_client = client
     
     def generate_summary(self):
         """Generate a human-readable summary of the changes"""
@@ -13,6 +62,9 @@ class ReportGenerator:
             "title": "Infrastructure Change Analysis",
             "sections": []
         }
+        
+        if self.incomplete_stages:
+            summary["sections"].append(self._incomplete_section())
 
         if self.terraform_analysis:
             plan_results = self.terraform_analysis.get("plan_results", {})
@@ -24,11 +76,13 @@ class ReportGenerator:
             
             create_count = len(plan_results.get("create", []))
             update_count = len(plan_results.get("update", []))
+            replace_count = len(plan_results.get("replace", []))
             delete_count = len(plan_results.get("delete", []))
             
-            if create_count + update_count + delete_count > 0:
+            if create_count + update_count + replace_count + delete_count > 0:
                 terraform_summary["content"].append(
-                    f"This PR will create {create_count}, update {update_count}, and delete {delete_count} resources."
+                    f"This PR will create {create_count}, update {update_count}, replace {replace_count}, "
+                    f"and delete {delete_count} resources."
                 )
             
                 if create_count > 0:
@@ -49,15 +103,72 @@ class ReportGenerator:
                             f"- {resource.get('type')}.{resource.get('name')}{details_str}"
                         )
                 
+                if replace_count > 0:
+                    terraform_summary["content"].append("**Resources to be replaced:**")
+                    for resource in plan_results.get("replace", []):
+                        terraform_summary["content"].append(
+                            f"- {resource.get('address') or resource.get('type') + '.' + resource.get('name')}"
+                        )
+                
                 if delete_count > 0:
                     terraform_summary["content"].append("**Resources to be deleted:**")
                     for resource in plan_results.get("delete", []):
                         terraform_summary["content"].append(
                             f"- {resource.get('type')}.{resource.get('name')}"
                         )
+                
+                blast_radius = plan_results.get("blast_radius", {})
+                if blast_radius:
+                    terraform_summary["content"].append("**Blast radius of deletions and replacements:**")
+                    for address, radius in blast_radius.items():
+                        if "within" in radius:
+                            terraform_summary["content"].append(f"- {address}: within the blast radius of {radius['within']}")
+                        else:
+                            shared = radius.get("shared_with", [])
+                            also = f", some shared with {', '.join(shared)}" if shared else ""
+                            terraform_summary["content"].append(
+                                f"- {address}: {radius['resources']} dependent resources ({radius['instances']} instances){also}"
+                            )
+                    total = plan_results.get("blast_radius_total")
+                    if total and len(blast_radius) > 1:
+                        terraform_summary["content"].append(
+                            f"- In total: {total['resources']} distinct dependent resources ({total['instances']} instances)"
+                        )
             else:
                 terraform_summary["content"].append("No Terraform resource changes detected.")
             
+            outputs = plan_results.get("outputs", {})
+            for state in ("added", "modified", "removed"):
+                if outputs.get(state):
+                    terraform_summary["content"].append(f"Outputs {state}: {', '.join(outputs[state])}")
+            
+            if plan_results.get("mode") == "static":
+                terraform_summary["content"].append(
+                    "_Derived statically from the changed `.tf` files; `terraform plan` was not run._"
+                )
+                if plan_results.get("plan_error"):
+                    terraform_summary["content"].append(
+                        f"_`terraform plan` was needed to confirm {len(plan_results.get('needs_plan', []))} "
+                        f"changes but failed: {plan_results['plan_error']}_"
+                    )
+            elif plan_results.get("plan_reasons"):
+                rules = sorted({reason["rule"] for reason in plan_results["plan_reasons"]})
+                terraform_summary["content"].append(f"_`terraform plan` was run to confirm: {', '.join(rules)}._")
+            
+            scope = plan_results.get("scope", {})
+            targets = scope.get("targets", [])
+            if targets:
+                shown = ", ".join(f"`{address}`" for address in targets[:10])
+                more = f" and {len(targets) - 10} more" if len(targets) > 10 else ""
+                terraform_summary["content"].append(
+                    f"_Scoped plan: limited with `-target` to {shown}{more} (the changed blocks and their "
+                    f"direct dependents); changes to other resources are not shown._"
+                )
+            if scope.get("refresh") is False:
+                terraform_summary["content"].append(
+                    "_Planned without refreshing state (`-refresh=false`); drift since the last apply is not shown._"
+                )
+            
             summary["sections"].append(terraform_summary)
         
         if self.kubernetes_analysis:
@@ -91,10 +202,23 @@ class ReportGenerator:
                         kubernetes_summary["content"].append(
                             f"- {chart_path}: Error analysing chart - {result['error']}"
                         )
+                    elif "object_changes" in result:
+                        object_changes = result["object_changes"]
+                        kubernetes_summary["content"].append(
+                            f"- {chart_path}: {len(object_changes['added'])} objects added, "
+                            f"{len(object_changes['modified'])} modified, {len(object_changes['removed'])} removed"
+                        )
+                        for action in ("removed", "modified", "added"):
+                            for label in object_changes[action]:
+                                kubernetes_summary["content"].append(f"  - {action}: {label}")
                     else:
                         kubernetes_summary["content"].append(
                             f"- {chart_path}: {result.get('resource_count', 0)} resources in template"
                         )
+                    if "base_error" in result:
+                        kubernetes_summary["content"].append(
+                            f"  - Could not render the base version for comparison - {result['base_error']}"
+                        )
             
             summary["sections"].append(kubernetes_summary)
             
@@ -107,38 +231,23 @@ class ReportGenerator:
             overall_risk = self.risk_assessment.get("overall_risk", "unknown")
             risk_summary["content"].append(f"**Overall Risk Level: {overall_risk.upper()}**")
             
-            downtime_risks = self.risk_assessment.get("downtime_risks", [])
-            if downtime_risks:
-                risk_summary["content"].append("**Potential Downtime Risks:**")
-                for risk in downtime_risks:
-                    risk_summary["content"].append(
-                        f"- [{risk.get('severity', 'unknown').upper()}] {risk.get('description')}"
-                    )
-                    risk_summary["content"].append(
-                        f"  - Mitigation: {risk.get('mitigation', 'No mitigation provided')}"
-                    )
-            
-            cost_impacts = self.risk_assessment.get("cost_impacts", [])
-            if cost_impacts:
-                risk_summary["content"].append("**Potential Cost Impacts:**")
-                for impact in cost_impacts:
-                    risk_summary["content"].append(
-                        f"- [{impact.get('severity', 'unknown').upper()}] {impact.get('description')}"
-                    )
-                    risk_summary["content"].append(
-                        f"  - Recommendation: {impact.get('recommendation', 'No recommendation provided')}"
-                    )
-            
-            security_risks = self.risk_assessment.get("security_risks", [])
-            if security_risks:
-                risk_summary["content"].append("**Potential Security Risks:**")
-                for risk in security_risks:
-                    risk_summary["content"].append(
-                        f"- [{risk.get('severity', 'unknown').upper()}] {risk.get('description')}"
-                    )
-                    risk_summary["content"].append(
-                        f"  - Recommendation: {risk.get('recommendation', 'No recommendation provided')}"
-                    )
+            for key, heading, advice_key, advice_label in (
+                ("downtime_risks", "Potential Downtime Risks", "mitigation", "Mitigation"),
+                ("cost_impacts", "Potential Cost Impacts", "recommendation", "Recommendation"),
+                ("security_risks", "Potential Security Risks", "recommendation", "Recommendation")
+            ):
+                risks = self.risk_assessment.get(key, [])
+                if risks:
+                    risk_summary["content"].append(f"**{heading}:**")
+                    risk_summary["content"].extend(self._risk_lines(risks, advice_key, advice_label))
+                    
+                    aggregation = self.risk_assessment.get("aggregation", {}).get(key, {})
+                    hidden_groups = aggregation.get("groups", 0) - aggregation.get("shown_groups", 0)
+                    if hidden_groups > 0:
+                        hidden_findings = aggregation.get("findings", 0) - aggregation.get("shown_findings", 0)
+                        risk_summary["content"].append(
+                            f"_{hidden_groups} lower-ranked risk groups ({hidden_findings} findings) not shown._"
+                        )
             
             summary["sections"].append(risk_summary)
 
@@ -157,15 +266,35 @@ class ReportGenerator:
         
         return summary
     
+    def _incomplete_section(self):
+        """Section listing the stages a partial report is missing"""
+        content = ["This report is partial; these analysis stages were skipped, timed out or failed:"]
+        for stage in self.incomplete_stages:
+            content.append(f"- {stage['stage']}: {stage['status']} ({stage['reason']})")
+        return {"title": "Incomplete Analysis", "content": content}
+    
+    def _risk_lines(self, risks, advice_key, advice_label):
+        """Markdown list lines for (possibly aggregated) risks"""
+        lines = []
+        for risk in risks:
+            count = risk.get("count", 1)
+            lines.append(f"- [{risk.get('severity', 'unknown').upper()}] {risk.get('description')}")
+            if count > 1 and risk.get("samples"):
+                more = ", …" if count > len(risk["samples"]) else ""
+                lines.append(f"  - Examples: {', '.join(risk['samples'])}{more}")
+            lines.append(f"  - {advice_label}: {risk.get(advice_key, f'No {advice_label.lower()} provided')}")
+        return lines
+    
+    def _build_markdown(self, summary, budget=DEFAULT_REPORT_BUDGET):
+        """Render a generate_summary() result as size-bounded markdown"""
+        builder = ReportBuilder(summary["title"], budget=budget)
+        builder.add_summary(summary, SECTION_PRIORITIES)
+        return builder.build()
+    
     def generate_llm_enhanced_summary(self):
         """Generate an LLM-enhanced summary of the changes"""
         standard_summary = self.generate_summary()
-        summary_text = f"# {standard_summary['title']}\n\n"
-        
-        for section in standard_summary["sections"]:
-            summary_text += f"## {section['title']}\n\n"
-            for content in section["content"]:
-                summary_text += f"{content}\n\n"
+        summary_text = self._build_markdown(standard_summary, budget=PROMPT_SUMMARY_BUDGET)
         
         prompt = f"""
         You are an expert DevOps engineer reviewing infrastructure changes in a pull request.
@@ -182,24 +311,67 @@ class ReportGenerator:
         Format your response in Markdown.
         """
         
-        enhanced_summary = self.llm_client.generate_text(prompt)
+        from src.utils.llm_router import LLMRouter
+        
+        client = self.llm_client
+        if isinstance(client, LLMRouter):
+            # Routed by prompt size and overall risk
+            risk_level = (self.risk_assessment or {}).get("overall_risk")
+            enhanced_summary = client.generate_text(prompt, risk_level=risk_level)
+        else:
+            enhanced_summary = client.generate_text(prompt)
         
-        return enhanced_summary
+        # The LLM answer is posted as-is, as long as it fits in a PR comment
+        builder = ReportBuilder(None)
+        builder.add_text(enhanced_summary)
+        if self.incomplete_stages:
+            builder.add_summary({"sections": [self._incomplete_section()]}, SECTION_PRIORITIES)
+        return builder.build()
+    
+    def generate_rule_based_report(self):
+        """Generate the markdown report from the analysis alone, without the LLM"""
+        return self._build_markdown(self.generate_summary())
     
     def generate_markdown_report(self):
         """Generate a markdown report for the PR comment"""
+        if not self.use_llm:
+            return self.generate_rule_based_report()
+        
         try:
             return self.generate_llm_enhanced_summary()
         except Exception as e:
             # fall back to standard summary if LLM fails
             print(f"Error generating LLM summary: {e}")
-            standard_summary = self.generate_summary()
-            
-            markdown = f"# {standard_summary['title']}\n\n"
-            
-            for section in standard_summary["sections"]:
-                markdown += f"## {section['title']}\n\n"
-                for content in section["content"]:
-                    markdown += f"{content}\n\n"
-            
-            return markdown 
\ No newline at end of file
+            return self.generate_rule_based_report()
+    
+    def _full_assessment(self):
+        """The risk assessment with every finding per category instead of the top-K groups"""
+        if not self.risk_assessment:
+            return self.risk_assessment
+        assessment = dict(self.risk_assessment)
+        assessment.update(assessment.pop("findings", {}))
+        return assessment
+    
+    def generate_json_report(self):
+        """Return the full, untruncated analysis and assessment (every finding) as plain data"""
+        return {
+            "title": "Infrastructure Change Analysis",
+            "overall_risk": (self.risk_assessment or {}).get("overall_risk", "unknown"),
+            "terraform_analysis": to_plain(self.terraform_analysis),
+            "kubernetes_analysis": to_plain(self.kubernetes_analysis),
+            "risk_assessment": to_plain(self._full_assessment()),
+            "incomplete_stages": list(self.incomplete_stages)
+        }
+    
+    def generate_sarif_report(self):
+        """Return every finding of the risk assessment as a SARIF 2.1.0 log"""
+        return build_sarif_report(self._full_assessment())
+    
+    def write_artifacts(self, json_path=None, sarif_path=None):
+        """Write the JSON and/or SARIF reports from the already computed results"""
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(self.generate_json_report(), f, indent=2, default=str)
+        if sarif_path:
+            with open(sarif_path, 'w') as f:
+                json.dump(self.generate_sarif_report(), f, indent=2)
@@ -1,8 +1,127 @@
+import heapq
+import os
+from src.models import SEVERITY_RANK, Risk
+from src.utils.plan_graph import resource_address
+
+# Rule sets are built once at import time and shared by every assessment
+# (a long-running server reuses them across jobs)
+
+# Examples of critical resources that might cause downtime when deleted
+DOWNTIME_CRITICAL_TYPES = frozenset([
+    "aws_instance", "aws_db_instance", "aws_eks_cluster",
+    "aws_lambda_function", "aws_api_gateway_rest_api",
+    "google_compute_instance", "google_sql_database_instance",
+    "azurerm_virtual_machine", "azurerm_sql_server"
+])
+
+# Examples of potentially costly resources
+COSTLY_RESOURCE_TYPES = frozenset([
+    "aws_instance", "aws_db_instance", "aws_eks_cluster",
+    "aws_elasticache_cluster", "aws_redshift_cluster",
+    "google_compute_instance", "google_sql_database_instance",
+    "azurerm_virtual_machine", "azurerm_sql_server"
+])
+
+# Blast radius (dependent resources) at which a deletion/replacement is high severity
+BLAST_RADIUS_HIGH = 10
+
+# Aggregated risk groups kept per category (MIGRATERATOR_TOP_K overrides)
+DEFAULT_TOP_K = 20
+
+# Sample addresses kept per aggregated group
+MAX_SAMPLES = 5
+
+# Descriptions of aggregated groups with more than one finding
+GROUP_DESCRIPTIONS = {
+    "tf-delete-critical": "Deletion of {count} {resource_type} resources may cause service downtime",
+    "tf-replace-critical": "Replacement of {count} {resource_type} resources destroys and recreates them and may cause service downtime",
+    "tf-blast-radius": "Removing {count} {resource_type} resources affects {score} dependent resources in total",
+    "tf-instance-type-restart": "Changing the instance type of {count} {resource_type} resources requires instance restarts",
+    "tf-costly-create": "Creation of {count} {resource_type} resources will increase cloud costs",
+    "tf-instance-upsize": "Upgrading the instance type of {count} {resource_type} resources will increase costs",
+    "tf-security-group": "Changes to {count} security groups may impact network security",
+    "tf-iam-change": "Changes to IAM policies in {count} files may impact security",
+    "k8s-volume-removed": "Removal of volume mounts in {count} places may cause data loss or application failure",
+    "k8s-env-removed": "Removal of environment variables in {count} places may cause application configuration issues",
+    "k8s-privileged": "Containers running in privileged mode in {count} places pose a security risk",
+    "k8s-host-network": "Containers using the host network in {count} places pose a security risk"
+}
+
+def aggregate_risks(risks, top_k=DEFAULT_TOP_K):
+    """
+    Group risks by (rule, resource type, severity) and keep the top_k groups
+    
+    Each group is a single Risk with the number of findings it stands for and
+    a few sample addresses. Groups are ranked by severity, then by score
+    (summed over the group; one per finding unless a rule weights it).
+    
+    Args:
+        risks: Risk records from one assessment category
+        top_k: Maximum number of groups returned
+        
+    Returns:
+        (top groups, highest first; total number of groups)
+    """
+    groups = {}
+    for risk in risks:
+        key = (risk.rule or risk.description, risk.resource_type, risk.severity)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = Risk(
+                severity=risk.severity,
+                description=risk.description,
+                mitigation=risk.mitigation,
+                recommendation=risk.recommendation,
+                rule=risk.rule,
+                resource_type=risk.resource_type,
+                address=risk.address,
+                file=risk.file,
+                count=risk.count,
+                score=risk.score,
+                samples=[risk.address] if risk.address else []
+            )
+            continue
+        group.count += risk.count
+        if group.file != risk.file:
+            group.file = None
+        group.score += risk.score
+        if risk.address and len(group.samples) < MAX_SAMPLES and risk.address not in group.samples:
+            group.samples.append(risk.address)
+    
+    for group in groups.values():
+        if group.count > 1 and group.rule in GROUP_DESCRIPTIONS:
+            group.description = GROUP_DESCRIPTIONS[group.rule].format(
+                count=group.count,
+                resource_type=group.resource_type or "",
+                score=group.score
+            )
+            group.address = None
+    
+    top = heapq.nlargest(top_k, groups.values(), key=lambda r: (SEVERITY_RANK.get(r.severity, 0), r.score))
+    return top, len(groups)
+
 class RiskAssessor:
     def __init__(self, terraform_analysis=None, kubernetes_analysis=None):
         self.terraform_analysis = terraform_analysis
         self.kubernetes_analysis = kubernetes_analysis
         
+    def _manifest_diffs(self):
+        """Yield (location, file, parsed_diff) for kubectl diffs and Helm render diffs"""
+        for file_path, result in self.kubernetes_analysis.get("kubectl_results", {}).items():
+            yield file_path, file_path, result.get("parsed_diff", {})
+        for chart_path, result in self.kubernetes_analysis.get("helm_results", {}).items():
+            if "parsed_diff" in result:
+                yield f"Helm chart {chart_path}", os.path.normpath(os.path.join(chart_path, "Chart.yaml")), result["parsed_diff"]
+    
+    def _locate(self, findings):
+        """Point Terraform findings without a file at the file declaring their resource"""
+        if not self.terraform_analysis:
+            return
+        files = self.terraform_analysis.get("plan_results", {}).get("files", {})
+        for finding in findings:
+            if finding.file is None and finding.address:
+                finding.file = files.get(resource_address(finding.address))
+    
     def assess_downtime_risks(self):
         """Assess potential downtime risks from the changes"""
         risks = []
@@ -15,18 +134,51 @@ class RiskAssessor:
             for deletion in plan_results.get("delete", []):
                 resource_type = deletion.get("type", "")
                 
-                # Examples of critical resources that might cause downtime
-                if resource_type in [
-                    "aws_instance", "aws_db_instance", "aws_eks_cluster",
-                    "aws_lambda_function", "aws_api_gateway_rest_api",
-                    "google_compute_instance", "google_sql_database_instance",
-                    "azurerm_virtual_machine", "azurerm_sql_server"
-                ]:
-                    risks.append({
-                        "severity": "high",
-                        "description": f"Deletion of {resource_type} '{deletion.get('name')}' may cause service downtime",
-                        "mitigation": "Consider blue-green deployment or scheduled maintenance window"
-                    })
+                if resource_type in DOWNTIME_CRITICAL_TYPES:
+                    risks.append(Risk(
+                        severity="high",
+                        description=f"Deletion of {resource_type} '{deletion.get('name')}' may cause service downtime",
+                        rule="tf-delete-critical",
+                        resource_type=resource_type,
+                        address=deletion.get("address") or f"{resource_type}.{deletion.get('name')}",
+                        mitigation="Consider blue-green deployment or scheduled maintenance window"
+                    ))
+            
+            # Replacements destroy the existing resource before (or while) creating the new one
+            for replacement in plan_results.get("replace", []):
+                resource_type = replacement.get("type", "")
+                
+                if resource_type in DOWNTIME_CRITICAL_TYPES:
+                    changed = ", ".join(sorted(replacement.get("details", {}))) or "forced attributes"
+                    risks.append(Risk(
+                        severity="high",
+                        description=f"Replacement of {resource_type} '{replacement.get('name')}' (changing {changed}) destroys and recreates it and may cause service downtime",
+                        rule="tf-replace-critical",
+                        resource_type=resource_type,
+                        address=replacement.get("address") or f"{resource_type}.{replacement.get('name')}",
+                        mitigation="Use create_before_destroy or a maintenance window, and check whether the change can be made in place"
+                    ))
+            
+            # Resources that depend on deleted or replaced resources
+            for address, radius in plan_results.get("blast_radius", {}).items():
+                # Each removal reports its own full reach; sources inside
+                # another's radius ("within") and leaves have nothing to add
+                count = radius.get("resources", 0)
+                if count == 0:
+                    continue
+                examples = ", ".join(radius.get("dependents", [])[:5])
+                more = f" and {count - 5} more" if count > 5 else ""
+                shared = radius.get("shared_with", [])
+                also = f" (some also affected by removing {', '.join(shared)})" if shared else ""
+                risks.append(Risk(
+                    severity="high" if count >= BLAST_RADIUS_HIGH else "medium",
+                    description=f"Removing {address} affects {count} dependent resources{also} ({radius.get('instances', count)} instances): {examples}{more}",
+                    rule="tf-blast-radius",
+                    resource_type=resource_address(address).split(".")[-2],
+                    address=address,
+                    score=count,
+                    mitigation="Check that the dependent resources tolerate the removal or are updated in the same apply"
+                ))
             
             # Check for updates to critical resources
             for update in plan_results.get("update", []):
@@ -35,33 +187,38 @@ class RiskAssessor:
                 
                 # Check for specific risky changes
                 if resource_type == "aws_instance" and "instance_type" in details:
-                    risks.append({
-                        "severity": "medium",
-                        "description": f"Changing instance type from {details['instance_type']['before']} to {details['instance_type']['after']} requires instance restart",
-                        "mitigation": "Ensure you have multiple instances or a maintenance window"
-                    })
+                    risks.append(Risk(
+                        severity="medium",
+                        description=f"Changing instance type from {details['instance_type']['before']} to {details['instance_type']['after']} requires instance restart",
+                        rule="tf-instance-type-restart",
+                        resource_type=resource_type,
+                        address=update.get("address") or f"{resource_type}.{update.get('name')}",
+                        mitigation="Ensure you have multiple instances or a maintenance window"
+                    ))
         
         # Check Kubernetes changes for downtime risks
         if self.kubernetes_analysis:
-            kubectl_results = self.kubernetes_analysis.get("kubectl_results", {})
-            
-            for file_path, result in kubectl_results.items():
-                parsed_diff = result.get("parsed_diff", {})
-                
+            for file_path, source_file, parsed_diff in self._manifest_diffs():
                 # Check for removal of volumes or environment variables
                 for removed in parsed_diff.get("removed", []):
                     if "volumeMounts:" in removed or "volumes:" in removed:
-                        risks.append({
-                            "severity": "high",
-                            "description": f"Removal of volume mounts in {file_path} may cause data loss or application failure",
-                            "mitigation": "Ensure data is backed up and application can handle volume changes"
-                        })
+                        risks.append(Risk(
+                            severity="high",
+                            description=f"Removal of volume mounts in {file_path} may cause data loss or application failure",
+                            rule="k8s-volume-removed",
+                            address=file_path,
+                            file=source_file,
+                            mitigation="Ensure data is backed up and application can handle volume changes"
+                        ))
                     elif "env:" in removed:
-                        risks.append({
-                            "severity": "medium",
-                            "description": f"Removal of environment variables in {file_path} may cause application configuration issues",
-                            "mitigation": "Verify application can handle missing environment variables"
-                        })
+                        risks.append(Risk(
+                            severity="medium",
+                            description=f"Removal of environment variables in {file_path} may cause application configuration issues",
+                            rule="k8s-env-removed",
+                            address=file_path,
+                            file=source_file,
+                            mitigation="Verify application can handle missing environment variables"
+                        ))
         
         return risks
     
@@ -77,18 +234,15 @@ class RiskAssessor:
             for creation in plan_results.get("create", []):
                 resource_type = creation.get("type", "")
                 
-                # Examples of potentially costly resources
-                if resource_type in [
-                    "aws_instance", "aws_db_instance", "aws_eks_cluster",
-                    "aws_elasticache_cluster", "aws_redshift_cluster",
-                    "google_compute_instance", "google_sql_database_instance",
-                    "azurerm_virtual_machine", "azurerm_sql_server"
-                ]:
-                    impacts.append({
-                        "severity": "medium",
-                        "description": f"Creation of {resource_type} '{creation.get('name')}' will increase cloud costs",
-                        "recommendation": "Verify the resource size and configuration are appropriate for your needs"
-                    })
+                if resource_type in COSTLY_RESOURCE_TYPES:
+                    impacts.append(Risk(
+                        severity="medium",
+                        description=f"Creation of {resource_type} '{creation.get('name')}' will increase cloud costs",
+                        rule="tf-costly-create",
+                        resource_type=resource_type,
+                        address=creation.get("address") or f"{resource_type}.{creation.get('name')}",
+                        recommendation="Verify the resource size and configuration are appropriate for your needs"
+                    ))
             
             # Check for updates that might increase costs
             for update in plan_results.get("update", []):
@@ -97,8 +251,9 @@ class RiskAssessor:
                 
                 # Check for specific changes that might increase costs
                 if resource_type == "aws_instance" and "instance_type" in details:
-                    before = details["instance_type"]["before"]
-                    after = details["instance_type"]["after"]
+                    # Static analysis leaves a side empty when the attribute was added or removed
+                    before = details["instance_type"]["before"] or ""
+                    after = details["instance_type"]["after"] or ""
                     
                     # Simple heuristic - check if the instance type is getting larger
                     # This could be improved with actual pricing data
@@ -107,11 +262,14 @@ class RiskAssessor:
                        (before.endswith(".small") and after.endswith(".medium")) or \
                        (before.endswith(".medium") and after.endswith(".large")) or \
                        (before.endswith(".large") and after.endswith(".xlarge")):
-                        impacts.append({
-                            "severity": "medium",
-                            "description": f"Upgrading instance type from {before} to {after} will increase costs",
-                            "recommendation": "Verify the larger instance type is necessary for your workload"
-                        })
+                        impacts.append(Risk(
+                            severity="medium",
+                            description=f"Upgrading instance type from {before} to {after} will increase costs",
+                            rule="tf-instance-upsize",
+                            resource_type=resource_type,
+                            address=update.get("address") or f"{resource_type}.{update.get('name')}",
+                            recommendation="Verify the larger instance type is necessary for your workload"
+                        ))
         
         return impacts
     
@@ -129,42 +287,50 @@ class RiskAssessor:
                 resource_type = update.get("type", "")
                 
                 if resource_type == "aws_security_group" or resource_type == "aws_security_group_rule":
-                    risks.append({
-                        "severity": "high",
-                        "description": f"Changes to security group '{update.get('name')}' may impact network security",
-                        "recommendation": "Verify that no unnecessary ports are being opened"
-                    })
+                    risks.append(Risk(
+                        severity="high",
+                        description=f"Changes to security group '{update.get('name')}' may impact network security",
+                        rule="tf-security-group",
+                        resource_type=resource_type,
+                        address=update.get("address") or f"{resource_type}.{update.get('name')}",
+                        recommendation="Verify that no unnecessary ports are being opened"
+                    ))
             
             # Check for IAM policy changes
             for file_path, changes in file_changes.items():
                 if "iam" in file_path.lower():
-                    risks.append({
-                        "severity": "high",
-                        "description": f"Changes to IAM policies in {file_path} may impact security",
-                        "recommendation": "Review IAM changes carefully to ensure principle of least privilege"
-                    })
+                    risks.append(Risk(
+                        severity="high",
+                        description=f"Changes to IAM policies in {file_path} may impact security",
+                        rule="tf-iam-change",
+                        address=file_path,
+                        file=file_path,
+                        recommendation="Review IAM changes carefully to ensure principle of least privilege"
+                    ))
         
         # Check Kubernetes changes for security risks
         if self.kubernetes_analysis:
-            kubectl_results = self.kubernetes_analysis.get("kubectl_results", {})
-            
-            for file_path, result in kubectl_results.items():
-                parsed_diff = result.get("parsed_diff", {})
-                
+            for file_path, source_file, parsed_diff in self._manifest_diffs():
                 # Check for security-related changes
                 for added in parsed_diff.get("added", []):
                     if "privileged: true" in added:
-                        risks.append({
-                            "severity": "critical",
-                            "description": f"Container running in privileged mode in {file_path} poses security risk",
-                            "recommendation": "Avoid privileged containers unless absolutely necessary"
-                        })
+                        risks.append(Risk(
+                            severity="critical",
+                            description=f"Container running in privileged mode in {file_path} poses security risk",
+                            rule="k8s-privileged",
+                            address=file_path,
+                            file=source_file,
+                            recommendation="Avoid privileged containers unless absolutely necessary"
+                        ))
                     elif "hostNetwork: true" in added:
-                        risks.append({
-                            "severity": "high",
-                            "description": f"Container using host network in {file_path} poses security risk",
-                            "recommendation": "Avoid host network unless absolutely necessary"
-                        })
+                        risks.append(Risk(
+                            severity="high",
+                            description=f"Container using host network in {file_path} poses security risk",
+                            rule="k8s-host-network",
+                            address=file_path,
+                            file=source_file,
+                            recommendation="Avoid host network unless absolutely necessary"
+                        ))
         
         return risks
     
@@ -207,34 +373,48 @@ class RiskAssessor:
         
         return strategies
     
-    def generate_assessment(self):
-        """Generate a comprehensive risk assessment"""
-        assessment = {
-            "downtime_risks": self.assess_downtime_risks(),
-            "cost_impacts": self.assess_cost_impacts(),
-            "security_risks": self.assess_security_risks(),
-            "rollback_strategies": self.suggest_rollback_strategy()
-        }
+    def generate_assessment(self, top_k=None):
+        """
+        Generate a comprehensive risk assessment
+        
+        Findings are aggregated per rule, resource type and severity, and only
+        the top_k groups of each category are listed under the category, so
+        the Markdown report and the LLM prompt stay small however large the
+        PR is. Every individual finding is kept under "findings" for the
+        JSON and SARIF artifacts.
+        """
+        if top_k is None:
+            top_k = int(os.environ.get("MIGRATERATOR_TOP_K", DEFAULT_TOP_K))
+        
+        assessment = {}
+        aggregation = {}
+        all_findings = {}
+        highest = 0
+        for category, findings in (
+            ("downtime_risks", self.assess_downtime_risks()),
+            ("cost_impacts", self.assess_cost_impacts()),
+            ("security_risks", self.assess_security_risks())
+        ):
+            self._locate(findings)
+            groups, group_count = aggregate_risks(findings, top_k)
+            assessment[category] = groups
+            all_findings[category] = findings
+            aggregation[category] = {
+                "findings": len(findings),
+                "groups": group_count,
+                "shown_groups": len(groups),
+                "shown_findings": sum(group.count for group in groups)
+            }
+            # Overall risk only counts downtime and security findings; the
+            # highest-ranked group carries the category's highest severity
+            if groups and category != "cost_impacts":
+                highest = max(highest, SEVERITY_RANK.get(groups[0].severity, 0))
+        
+        assessment["rollback_strategies"] = self.suggest_rollback_strategy()
+        assessment["aggregation"] = aggregation
+        assessment["findings"] = all_findings
         
         # Calculate overall risk level
-        risk_levels = {
-            "critical": 0,
-            "high": 0,
-            "medium": 0,
-            "low": 0
-        }
-        
-        for risk in assessment["downtime_risks"] + assessment["security_risks"]:
-            severity = risk.get("severity", "low")
-            risk_levels[severity] += 1
-        
-        if risk_levels["critical"] > 0:
-            assessment["overall_risk"] = "critical"
-        elif risk_levels["high"] > 0:
-            assessment["overall_risk"] = "high"
-        elif risk_levels["medium"] > 0:
-            assessment["overall_risk"] = "medium"
-        else:
-            assessment["overall_risk"] = "low"
-        
-        return assessment 
\ No newline at end of file
+        assessment["overall_risk"] = {rank: level for level, rank in SEVERITY_RANK.items()}[highest]
+        
+        return assessment
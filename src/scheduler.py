@@ -0,0 +1,231 @@
+"""
+Deadline-aware scheduling of the analysis stages.
+
+Stages run one at a time, cheapest first among those whose predecessors have
+resolved. Each stage's cost is estimated from an exponentially weighted moving
+average of its previous durations (kept in MIGRATERATOR_CACHE_DIR between
+runs). Under a deadline, a stage whose estimate does not fit in the time left
+is skipped, and a running stage is abandoned when the time runs out; external
+commands it started are killed at the same moment. Each skip shrinks the
+skipped stage's estimate, so a stage whose estimate came from one slow run is
+tried again after a few skips instead of never again. Stages that were skipped,
+timed out or failed are listed by incomplete() so the report can say what is
+missing.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from src.utils.instrumentation import tracer
+from src.utils.process_runner import deadline as command_deadline
+
+# Weight of the newest duration in a stage's moving average
+EWMA_ALPHA = 0.3
+
+# Factor applied to a stage's estimate each time it is skipped for not fitting
+SKIP_DECAY = 0.7
+
+TIMINGS_FILE = "stage_timings.json"
+
+# Wait after a stage times out, so the commands it started are killed before we go on
+CANCEL_GRACE_SECONDS = 1.0
+
+
+class StageTimings:
+    """
+    Moving averages of stage durations, optionally persisted as JSON
+
+    Args:
+        path: JSON file to load from and save to (None keeps the timings in memory)
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.averages = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.averages = {name: float(seconds) for name, seconds in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                self.averages = {}
+
+    @classmethod
+    def from_env(cls):
+        """Timings stored in MIGRATERATOR_STAGE_TIMINGS, or under MIGRATERATOR_CACHE_DIR"""
+        path = os.environ.get("MIGRATERATOR_STAGE_TIMINGS")
+        if not path and os.environ.get("MIGRATERATOR_CACHE_DIR"):
+            path = os.path.join(os.environ["MIGRATERATOR_CACHE_DIR"], TIMINGS_FILE)
+        return cls(path)
+
+    def estimate(self, name):
+        """Return the expected duration of a stage in seconds, or None if it never ran"""
+        return self.averages.get(name)
+
+    def record(self, name, seconds):
+        previous = self.averages.get(name)
+        self.averages[name] = seconds if previous is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * previous
+
+    def decay(self, name):
+        """Shrink the estimate of a stage that was skipped, so it is eventually measured again"""
+        if name in self.averages:
+            self.averages[name] *= SKIP_DECAY
+
+    def save(self):
+        if not self.path:
+            return
+        # A unique temporary file per write: concurrent jobs share the timings file
+        tmp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.averages, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save stage timings: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+class Stage:
+    """One unit of work: fn(results) returns the stage's result"""
+
+    __slots__ = ("name", "fn", "after", "when", "on_done", "default_estimate")
+
+    def __init__(self, name, fn, after=(), when=None, on_done=None, default_estimate=1.0):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.when = when
+        self.on_done = on_done
+        self.default_estimate = default_estimate
+
+
+class StageScheduler:
+    """
+    Runs stages cheapest first within an overall deadline
+
+    Args:
+        deadline: Seconds from now by which every stage must have finished (None = no limit)
+        timings: StageTimings to estimate from and update (defaults to StageTimings.from_env())
+        reserve: Seconds kept free at the end, e.g. for writing the report
+    """
+
+    def __init__(self, deadline=None, timings=None, reserve=0.0):
+        self.started = time.monotonic()
+        self.deadline = None if deadline is None else self.started + deadline
+        self.timings = timings if timings is not None else StageTimings.from_env()
+        self.reserve = reserve
+        self.stages = []
+        self.results = {}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, after=(), when=None, on_done=None, default_estimate=1.0):
+        """
+        Add a stage
+
+        Args:
+            name: Stage name, also the key of its result in `results`
+            fn: Callable taking the results so far and returning this stage's result
+            after: Stages that must have resolved (in any way) before this one starts
+            when: Predicate on the results deciding whether the stage is needed at all
+            on_done: Called on the scheduling thread with the result once the stage finished in time
+            default_estimate: Cost used for ordering until the stage has timings
+        """
+        self.stages.append(Stage(name, fn, after, when, on_done, default_estimate))
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without one"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def incomplete(self):
+        """Return [{"stage", "status", "reason"}] for stages that were skipped, timed out or failed"""
+        with self._lock:
+            return [
+                {"stage": name, "status": outcome["status"], "reason": outcome["reason"]}
+                for name, outcome in self.outcomes.items()
+                if outcome["status"] in ("skipped", "timed out", "failed")
+            ]
+
+    def _resolve(self, stage, status, reason=None, seconds=None):
+        with self._lock:
+            self.outcomes[stage.name] = {"status": status, "reason": reason, "seconds": seconds}
+        if status in ("skipped", "timed out", "failed"):
+            print(f"Stage {stage.name} {status}: {reason}")
+
+    def _estimate(self, stage):
+        estimate = self.timings.estimate(stage.name)
+        return stage.default_estimate if estimate is None else estimate
+
+    def run(self):
+        """Run every stage that is needed and fits; return the results of those that finished"""
+        pending = list(self.stages)
+        while pending:
+            ready = [stage for stage in pending if all(name in self.outcomes for name in stage.after)]
+            if not ready:
+                # Waiting on stages that were never added
+                for stage in pending:
+                    self._resolve(stage, "skipped", "depends on a stage that does not exist")
+                break
+            stage = min(ready, key=lambda s: (self._estimate(s), pending.index(s)))
+            pending.remove(stage)
+            self._run_stage(stage)
+        self.timings.save()
+        return self.results
+
+    def _run_stage(self, stage):
+        if stage.when is not None and not stage.when(self.results):
+            self._resolve(stage, "not needed")
+            return
+
+        estimate = self.timings.estimate(stage.name)
+        budget = self.remaining()
+        if budget is not None:
+            budget -= self.reserve
+            if budget <= 0:
+                self._resolve(stage, "skipped", "deadline reached")
+                return
+            # Stages without timings get a chance; they are cut off at the deadline
+            if estimate is not None and estimate > budget:
+                self.timings.decay(stage.name)
+                self._resolve(stage, "skipped", f"estimated {estimate:.1f}s, {budget:.1f}s left")
+                return
+
+        outcome = {}
+        start = time.monotonic()
+        stage_deadline = None if budget is None else start + budget
+
+        def target():
+            with command_deadline(stage_deadline), tracer.span(stage.name, estimate=estimate, budget=budget):
+                try:
+                    outcome["result"] = stage.fn(self.results)
+                except Exception as e:
+                    outcome["error"] = e
+
+        print(f"{stage.name}...")
+        # Daemon thread: a stage that overruns is abandoned, not waited for. HTTP
+        # connections are pooled process-wide, so a new thread per stage reuses them
+        thread = threading.Thread(target=target, name=f"stage {stage.name}", daemon=True)
+        thread.start()
+        thread.join(budget)
+        elapsed = time.monotonic() - start
+
+        if thread.is_alive() or (stage_deadline is not None and time.monotonic() >= stage_deadline):
+            thread.join(CANCEL_GRACE_SECONDS)
+            # It took at least this long; never lower the estimate on a timeout
+            self.timings.record(stage.name, max(elapsed, estimate or 0.0))
+            self._resolve(stage, "timed out", f"stopped after {elapsed:.1f}s", elapsed)
+        elif "error" in outcome:
+            self._resolve(stage, "failed", str(outcome["error"]), elapsed)
+        else:
+            self.timings.record(stage.name, elapsed)
+            self.results[stage.name] = outcome["result"]
+            self._resolve(stage, "done", seconds=elapsed)
+            if stage.on_done is not None:
+                stage.on_done(outcome["result"])
@@ -0,0 +1,355 @@
+"""
+Long-running analysis server.
+
+Keeps one warm process around so that each PR analysis does not pay for a new
+interpreter, fresh `terraform init` provider downloads, Helm renders, HTTP
+connections and rule-set setup. Jobs are submitted over HTTP (TCP or a Unix
+socket) and run on a bounded worker pool:
+
+    POST /jobs            {"repo_path": "...", "pr_files": [...]}      -> 202 {"id": ...}
+    POST /jobs?wait=1     same, but answers when the job has finished
+    GET  /jobs/<id>       job status and, once done, the Markdown, JSON and SARIF reports
+    GET  /health          worker/queue statistics and LLM tier metrics
+
+The server runs terraform, helm and kubectl in the requested checkout, so
+`repo_path` must lie inside the workspace given at start-up. Jobs for the
+same checkout run one at a time, since they share its working tree and
+`.terraform` directory. PR files are fetched with the server's own
+GITHUB_TOKEN; requests may not carry credentials. Reports are returned in the
+job result; the server never writes files a client names.
+"""
+import json
+import os
+import socketserver
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.utils.instrumentation import tracer
+from src.utils.process_runner import run_command
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "migraterator")
+
+# Finished jobs kept around for GET /jobs/<id>
+MAX_FINISHED_JOBS = 1000
+
+
+class RepositoryIndex:
+    """Helm chart locations per repository, reused while the checkout's HEAD is unchanged"""
+
+    def __init__(self):
+        self._charts = {}
+        self._lock = threading.Lock()
+
+    def helm_charts(self, repo_path):
+        repo_path = os.path.abspath(repo_path)
+        try:
+            head = run_command(["git", "rev-parse", "HEAD"], cwd=repo_path, check=True).stdout.strip()
+        except Exception:
+            head = None
+
+        with self._lock:
+            cached = self._charts.get(repo_path)
+            if head is not None and cached is not None and cached[0] == head:
+                return cached[1]
+
+        from src.kubernetes_analyser import find_helm_charts
+
+        charts = find_helm_charts(repo_path)
+
+        with self._lock:
+            self._charts[repo_path] = (head, charts)
+        return charts
+
+
+class Job:
+    __slots__ = ("id", "request", "status", "submitted", "started", "finished", "result", "error", "done")
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class AnalysisService:
+    """
+    Runs analysis jobs on a bounded thread pool with warm, process-wide caches
+
+    Args:
+        workers: Number of jobs analysed concurrently
+        max_queue: Jobs accepted beyond the running ones before new ones are rejected
+        cache_dir: Directory for the terraform plugin cache, Helm cache and memoised commands
+        workspace: Directory holding the checkouts jobs may analyse
+    """
+
+    def __init__(self, workers=4, max_queue=64, cache_dir=DEFAULT_CACHE_DIR, workspace="."):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache_dir = cache_dir
+        self.workspace = os.path.realpath(workspace)
+        self.index = RepositoryIndex()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="migraterator-job")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+        self._configure_caches()
+        self._warm_up()
+
+    def _configure_caches(self):
+        """Point terraform, helm and the command memoiser at persistent cache directories"""
+        defaults = {
+            "TF_PLUGIN_CACHE_DIR": os.path.join(self.cache_dir, "terraform-plugins"),
+            "HELM_CACHE_HOME": os.path.join(self.cache_dir, "helm"),
+            "MIGRATERATOR_CACHE_DIR": self.cache_dir
+        }
+        for name, path in defaults.items():
+            path = os.environ.setdefault(name, path)
+            os.makedirs(path, exist_ok=True)
+
+    def _warm_up(self):
+        """Import the analysis pipeline once, up front, instead of in the first job"""
+        import src.kubernetes_analyser  # noqa: F401
+        import src.main  # noqa: F401
+        import src.terraform_analyser  # noqa: F401
+        import src.utils.github_utils  # noqa: F401
+        import src.utils.llm_client  # noqa: F401
+        import src.utils.llm_router  # noqa: F401
+
+    def repo_path(self, request):
+        """
+        Return the real path of the request's checkout (relative to the workspace)
+
+        Raises:
+            ValueError: The path lies outside the workspace
+        """
+        repo_path = os.path.realpath(os.path.join(self.workspace, request.get("repo_path") or "."))
+        if repo_path != self.workspace and not repo_path.startswith(self.workspace + os.sep):
+            raise ValueError(f"repo_path must be inside the workspace {self.workspace}")
+        return repo_path
+
+    def submit(self, request):
+        """
+        Queue a job; returns the Job, or None when the queue is full
+
+        Raises:
+            ValueError: The request names a checkout outside the workspace
+        """
+        request = dict(request, repo_path=self.repo_path(request))
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                return None
+            self._pending += 1
+            job = Job(request)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _repo_lock(self, repo_path):
+        """Lock serialising the jobs of one checkout"""
+        with self._lock:
+            return self._repo_locks.setdefault(repo_path, threading.Lock())
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            stats = {"workers": self.workers, "pending": self._pending, "jobs": counts}
+        from src.utils.llm_router import shared_router
+        router = shared_router()
+        if router is not None:
+            stats["llm_tiers"] = router.metrics()
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done.is_set()]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _run(self, job):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.result = self._analyse(job.request)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+            job.done.set()
+
+    def _analyse(self, request):
+        from src.main import analyse_repository
+
+        repo_path = self.repo_path(request)
+        pr_files = request.get("pr_files")
+        if pr_files is None:
+            from src.utils.github_utils import get_pr_files
+
+            with tracer.span("fetch PR files"):
+                pr_files = get_pr_files(request["repo_name"], request["pr_number"], os.environ.get("GITHUB_TOKEN"))
+
+        # terraform init/plan, helm and kubectl share the checkout's working
+        # tree and .terraform directory, so its jobs must not overlap
+        with self._repo_lock(repo_path):
+            with tracer.span("job", category="stage", repo_path=repo_path, files=len(pr_files)):
+                report_markdown, report_generator = analyse_repository(
+                    repo_path,
+                    pr_files,
+                    use_llm=request.get("use_llm"),
+                    helm_charts=self.index.helm_charts(repo_path)
+                )
+
+        return {
+            "overall_risk": (report_generator.risk_assessment or {}).get("overall_risk", "unknown"),
+            "report": report_markdown,
+            "json": report_generator.generate_json_report(),
+            "sarif": report_generator.generate_sarif_report()
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the body
+    # can wait for the client's delayed ACK (~40 ms per request)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path == "/health":
+            self._send_json(200, service.stats())
+        elif url.path.startswith("/jobs/"):
+            job = service.get(url.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        if "github_token" in request:
+            self._send_json(400, {"error": "credentials are not accepted in requests; set GITHUB_TOKEN for the server"})
+            return
+        if request.get("pr_files") is None and not (request.get("repo_name") and request.get("pr_number")):
+            self._send_json(400, {"error": "either pr_files or repo_name and pr_number are required"})
+            return
+
+        try:
+            job = self.server.service.submit(request)
+        except ValueError as e:
+            self._send_json(403, {"error": str(e)})
+            return
+        if job is None:
+            self._send_json(503, {"error": "job queue is full"})
+            return
+
+        if parse_qs(url.query).get("wait", ["0"])[0] not in ("0", ""):
+            job.done.wait()
+            self._send_json(200, job.to_dict())
+        else:
+            self._send_json(202, job.to_dict())
+
+
+class _UnixHandler(_Handler):
+    # TCP_NODELAY does not apply to Unix sockets
+    disable_nagle_algorithm = False
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service, host="127.0.0.1", port=8765, socket_path=None):
+    """Create (but do not start) an HTTP server for the service on TCP or a Unix socket"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _UnixHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(host="127.0.0.1", port=8765, socket_path=None, workers=4, max_queue=64, cache_dir=DEFAULT_CACHE_DIR,
+          workspace="."):
+    """Run the analysis server until interrupted"""
+    service = AnalysisService(workers=workers, max_queue=max_queue, cache_dir=cache_dir, workspace=workspace)
+    server = create_server(service, host, port, socket_path)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    print(f"Migraterator server listening on {where} with {workers} workers, serving checkouts in {service.workspace}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -1,76 +1,234 @@
 import json
+import os
 import subprocess
-from src.utils.diff_utils import parse_diff
+from src.models import ResourceChange
+from src.utils.diff_utils import BASE_REVISION, parse_diffs
+from src.utils.git_blobs import blob_reader
+from src.utils.hcl_static import analyse_configuration, empty_results
+from src.utils.instrumentation import tracer
+from src.utils.plan_graph import PlanGraph
+from src.utils.process_runner import lookup_memo, require_complete, run_command
+
+# Files that determine the outcome of `terraform plan` for a given state
+PLAN_INPUT_SUFFIXES = ('.tf', '.tf.json', '.tfvars', '.tfvars.json', '.terraform.lock.hcl')
+
+# Saved plan, relative to the configuration directory (next to terraform's own files)
+PLAN_FILE = os.path.join(".terraform", "migraterator.tfplan")
+
+# MIGRATERATOR_TF_MODE: "auto" runs the static analysis and only plans when a
+# change needs confirming, "static" never plans, "plan" always plans
+TF_MODES = ("auto", "static", "plan")
+
+# MIGRATERATOR_TF_PLAN_SCOPE: "targeted" plans only the changed blocks and their
+# direct dependents (-target) when they map to addresses, "full" plans everything
+TF_PLAN_SCOPES = ("targeted", "full")
+
+def _plan_action(actions):
+    """Map a plan's action list to create/update/replace/delete (or no-op/read)"""
+    if "delete" in actions and "create" in actions:
+        return "replace"
+    return actions[0] if actions else "no-op"
+
+def _changed_attributes(before, after):
+    """Return {attribute: {"before", "after"}} for attributes present on both sides that differ"""
+    before = before or {}
+    after = after or {}
+    return {
+        key: {"before": before[key], "after": after[key]}
+        for key in before.keys() & after.keys()
+        if before[key] != after[key]
+    }
+
+def _setting(name, default, choices):
+    value = os.environ.get(name, default)
+    if value not in choices:
+        raise ValueError(f"Unsupported {name}: {value}")
+    return value
 
 class TerraformAnalyser:
     def __init__(self, repo_path, pr_files):
         self.repo_path = repo_path
+        self.changed_files = list(pr_files)
         self.pr_files = [f for f in pr_files if f.endswith('.tf')]
+    
+    def analyse_static(self):
+        """
+        Derive resource changes from the base and head `.tf` files, without terraform
         
-    def run_terraform_plan(self):
-        """Run terraform plan and capture the output"""
-        try:
-            subprocess.run(["terraform", "init"], cwd=self.repo_path, check=True)
-            result = subprocess.run(
-                ["terraform", "plan", "-json"],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True,
-                check=True
+        Returns plan_results-shaped changes with "mode": "static" and the
+        changes that need `terraform plan` to confirm under "needs_plan".
+        """
+        with tracer.span("terraform static analysis", files=len(self.pr_files)):
+            reader = blob_reader(self.repo_path)
+            siblings = []
+            for directory in sorted({os.path.dirname(f) for f in self.pr_files}):
+                try:
+                    names = sorted(os.listdir(os.path.join(self.repo_path, directory)))
+                except OSError:
+                    continue
+                siblings.extend(
+                    path for path in (os.path.join(directory, name) for name in names if name.endswith('.tf'))
+                    if path not in self.pr_files
+                )
+            try:
+                base = reader.read_many(self.pr_files, BASE_REVISION)
+                head = reader.read_many(self.pr_files)
+                sibling_texts = reader.read_many(siblings)
+            except (subprocess.SubprocessError, OSError) as e:
+                results = empty_results()
+                results["needs_plan"].append({"rule": "parse-error", "target": ".", "reason": str(e)})
+                return results
+            
+            results = analyse_configuration(
+                self.pr_files, base, head,
+                {path: text for path, text in sibling_texts.items() if text is not None}
             )
+            for path in self.changed_files:
+                if path.endswith(PLAN_INPUT_SUFFIXES) and not path.endswith('.tf'):
+                    results["needs_plan"].append({"rule": "non-hcl-input", "target": path, "reason": "file changed"})
+                    results["targets"] = None
+            return results
+    
+    def plan_needed(self, static):
+        """Whether plan_results() runs `terraform plan` for these analyse_static() results"""
+        mode = _setting("MIGRATERATOR_TF_MODE", "auto", TF_MODES)
+        return mode == "plan" or (mode == "auto" and bool(static["needs_plan"]))
+    
+    def plan_results(self, static=None):
+        """
+        Return the changes from static analysis, `terraform plan`, or both
+        
+        MIGRATERATOR_TF_MODE decides whether to plan, MIGRATERATOR_TF_PLAN_SCOPE
+        whether the plan is scoped to the changed addresses, and
+        MIGRATERATOR_TF_NO_REFRESH skips the state refresh. Plan results carry
+        "scope": {"targets", "refresh"}, with no targets for a full plan.
+        
+        Args:
+            static: analyse_static() results, if already computed
+        """
+        mode = _setting("MIGRATERATOR_TF_MODE", "auto", TF_MODES)
+        scope = _setting("MIGRATERATOR_TF_PLAN_SCOPE", "targeted", TF_PLAN_SCOPES)
+        refresh = not os.environ.get("MIGRATERATOR_TF_NO_REFRESH")
+        
+        if static is None and (mode != "plan" or scope == "targeted"):
+            static = self.analyse_static()
+        if mode != "plan" and not self.plan_needed(static):
+            return static
+        
+        # Fall back to a full plan when the changes do not map to addresses
+        targets = static["targets"] if static is not None and scope == "targeted" else None
+        results = self.run_terraform_plan(targets=targets, refresh=refresh)
+        if "error" in results and mode == "auto":
+            # Keep the unconfirmed static changes rather than reporting nothing
+            return dict(static, plan_error=results["error"])
+        results["mode"] = "plan"
+        results["scope"] = {"targets": targets or [], "refresh": refresh}
+        # Plans have no source positions; the static pass knows the declaring files
+        results["files"] = static["files"] if static is not None else {}
+        if mode == "auto":
+            results["plan_reasons"] = static["needs_plan"]
+        return results
+    
+    def run_terraform_plan(self, targets=None, refresh=True):
+        """
+        Run terraform plan, save it and load the full plan with `terraform show -json`
+        
+        Args:
+            targets: Addresses to limit the plan to (-target); None plans everything
+            refresh: False skips refreshing state from the providers (-refresh=false)
+        """
+        show_args = ["terraform", "show", "-json", PLAN_FILE]
+        plan_options = [f"-target={address}" for address in targets or ()]
+        if not refresh:
+            plan_options.append("-refresh=false")
+        # Batch runs set a cache key so identical configurations are only
+        # planned once per run (state is assumed stable within the run)
+        plan_cache_key = os.environ.get("MIGRATERATOR_PLAN_CACHE_KEY")
+        if plan_cache_key and plan_options:
+            plan_cache_key = " ".join([plan_cache_key] + plan_options)
+        memo = {
+            "memoize": bool(plan_cache_key),
+            "input_paths": self._configuration_files() if plan_cache_key else (),
+            "extra_key": plan_cache_key
+        }
+        try:
+            result = lookup_memo(show_args, self.repo_path, memo["input_paths"], plan_cache_key) if plan_cache_key else None
+            if result is None:
+                run_command(["terraform", "init", "-input=false"], cwd=self.repo_path, check=True)
+                run_command(
+                    ["terraform", "plan", "-input=false", f"-out={PLAN_FILE}"] + plan_options,
+                    cwd=self.repo_path,
+                    check=True
+                )
+                result = run_command(show_args, cwd=self.repo_path, check=True, **memo)
             
-            return self._parse_plan_output(result.stdout)
-        except subprocess.CalledProcessError as e:
-            return {"error": str(e), "stdout": e.stdout, "stderr": e.stderr}
+            return self._parse_plan_json(require_complete(result).stdout)
+        except subprocess.SubprocessError as e:
+            # Not every SubprocessError carries output (and TimeoutExpired's may be None)
+            return {"error": str(e), "stdout": getattr(e, "stdout", None) or "",
+                    "stderr": getattr(e, "stderr", None) or ""}
+        except (OSError, ValueError) as e:
+            return {"error": str(e), "stdout": "", "stderr": ""}
     
-    def _parse_plan_output(self, plan_output):
-        """Parse the JSON output from terraform plan"""
+    def _configuration_files(self):
+        """Return the configuration files under repo_path, relative to it"""
+        files = []
+        for root, dirs, names in os.walk(self.repo_path):
+            dirs[:] = [d for d in dirs if d not in ('.git', '.terraform')]
+            for name in names:
+                if name.endswith(PLAN_INPUT_SUFFIXES):
+                    files.append(os.path.relpath(os.path.join(root, name), self.repo_path))
+        return files
+    
+    def _parse_plan_json(self, show_output):
+        """
+        Parse `terraform show -json` output of a saved plan
+        
+        Besides the changes per action, returns the blast radius of every
+        deleted or replaced resource: the resources that transitively depend on it.
+        """
+        plan = json.loads(show_output)
         changes = {
             "create": [],
             "update": [],
+            "replace": [],
             "delete": []
         }
         
-        # Split the output by newlines and parse each line as JSON
-        for line in plan_output.strip().split('\n'):
-            try:
-                plan_item = json.loads(line)
-                if "change" in plan_item:
-                    action = plan_item["change"]["actions"][0]
-                    if action in ["create", "update", "delete"]:
-                        resource_type = plan_item.get("type", "unknown")
-                        resource_name = plan_item.get("name", "unknown")
-                        
-                        # Extract the changes for updates
-                        change_details = {}
-                        if action == "update" and "change" in plan_item:
-                            before = plan_item["change"].get("before", {})
-                            after = plan_item["change"].get("after", {})
-                            
-                            # Compare before and after to find what changed
-                            for key in set(list(before.keys()) + list(after.keys())):
-                                if key in before and key in after and before[key] != after[key]:
-                                    change_details[key] = {
-                                        "before": before[key],
-                                        "after": after[key]
-                                    }
-                        
-                        changes[action].append({
-                            "type": resource_type,
-                            "name": resource_name,
-                            "details": change_details
-                        })
-            except json.JSONDecodeError:
+        for resource_change in plan.get("resource_changes", []):
+            change = resource_change.get("change", {})
+            action = _plan_action(change.get("actions", []))
+            if action not in changes:
                 continue
+            
+            change_details = {}
+            if action in ("update", "replace"):
+                change_details = _changed_attributes(change.get("before"), change.get("after"))
+            
+            changes[action].append(ResourceChange(
+                resource_change.get("type", "unknown"),
+                resource_change.get("name", "unknown"),
+                change_details,
+                address=resource_change.get("address")
+            ))
+        
+        removed = [change.address for change in changes["delete"] + changes["replace"] if change.address]
+        if removed:
+            changes["blast_radius"], changes["blast_radius_total"] = PlanGraph.from_plan(plan).blast_radius(removed)
         
         return changes
     
+    def analyse_files(self):
+        """Return the analyse_changes() structure from static analysis and file diffs only, without terraform"""
+        return {
+            "plan_results": self.analyse_static(),
+            "file_changes": parse_diffs(self.pr_files, self.repo_path)
+        }
+    
     def analyse_changes(self):
         """analyse terraform changes and return structured data"""
-        plan_results = self.run_terraform_plan()
-        file_changes = {}
-        for tf_file in self.pr_files:
-            file_changes[tf_file] = parse_diff(tf_file)
+        plan_results = self.plan_results()
+        file_changes = parse_diffs(self.pr_files, self.repo_path)
         
         return {
             "plan_results": plan_results,
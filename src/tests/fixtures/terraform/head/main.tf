@@ -0,0 +1,21 @@
+# Web tier
+resource "aws_instance" "web" {
+  ami = "ami-0c55b159cbfafe1f0"
+  instance_type = "t3.medium"
+  subnet_id = aws_subnet.main.id
+
+  tags = { Name = "web" }
+}
+
+resource "aws_subnet" "main" {
+  vpc_id     = aws_vpc.main.id
+  cidr_block = "10.0.1.0/24"
+}
+
+resource "aws_vpc" "main" {
+  cidr_block = "10.0.0.0/16"
+}
+
+resource "aws_s3_bucket" "logs" {
+  bucket = "web-logs-${aws_vpc.main.id}"
+}
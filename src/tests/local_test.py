@@ -10,20 +10,24 @@ from terraform_analyser import TerraformAnalyser
 from kubernetes_analyser import KubernetesAnalyser
 from risk_assessor import RiskAssessor
 from report_generator import ReportGenerator
+from src.utils.instrumentation import tracer
 
 def find_files(repo_path, extensions):
     """Find files with specific extensions in the repository."""
     files = []
     for ext in extensions:
         for file_path in Path(repo_path).glob(f'**/*{ext}'):
-            files.append(str(file_path))
+            # Analysers resolve paths relative to the repository
+            files.append(os.path.relpath(file_path, repo_path))
     return files
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Analyze infrastructure changes locally')
     parser.add_argument('--repo-path', default='.', help='Path to the repository')
     parser.add_argument('--output', default='migration_report.md', help='Output file for the report')
-    args = parser.parse_args()
+    parser.add_argument('--json-output', default=None, help='Also write the full report as JSON to this file')
+    parser.add_argument('--sarif-output', default=None, help='Also write the risks as SARIF to this file')
+    args = parser.parse_args(argv)
     
     repo_path = args.repo_path
     
@@ -35,25 +39,31 @@ def main():
     
     if tf_files:
         print(f"Found {len(tf_files)} Terraform files. Analyzing...")
-        terraform_analyser = TerraformAnalyser(repo_path, tf_files)
-        terraform_analysis = terraform_analyser.analyse_changes()
+        with tracer.span("terraform analysis"):
+            terraform_analyser = TerraformAnalyser(repo_path, tf_files)
+            terraform_analysis = terraform_analyser.analyse_changes()
     
     if k8s_files:
         print(f"Found {len(k8s_files)} Kubernetes files. Analyzing...")
-        kubernetes_analyser = KubernetesAnalyser(repo_path, k8s_files)
-        kubernetes_analysis = kubernetes_analyser.analyse_changes()
+        with tracer.span("kubernetes analysis"):
+            kubernetes_analyser = KubernetesAnalyser(repo_path, k8s_files)
+            kubernetes_analysis = kubernetes_analyser.analyse_changes()
     
     print("Performing risk assessment...")
-    risk_assessor = RiskAssessor(terraform_analysis, kubernetes_analysis)
-    risk_assessment = risk_assessor.generate_assessment()
+    with tracer.span("risk assessment"):
+        risk_assessor = RiskAssessor(terraform_analysis, kubernetes_analysis)
+        risk_assessment = risk_assessor.generate_assessment()
     
     print("Generating migration report...")
-    report_generator = ReportGenerator(terraform_analysis, kubernetes_analysis, risk_assessment)
-    report_markdown = report_generator.generate_markdown_report()
+    with tracer.span("report generation"):
+        report_generator = ReportGenerator(terraform_analysis, kubernetes_analysis, risk_assessment)
+        report_markdown = report_generator.generate_markdown_report()
     
     with open(args.output, 'w') as f:
         f.write(report_markdown)
     
+    report_generator.write_artifacts(json_path=args.json_output, sarif_path=args.sarif_output)
+    
     print(f"Migration report generated successfully: {args.output}")
     return 0
 
@@ -0,0 +1,55 @@
+import os
+
+from src.utils.cluster_snapshot import ClusterSnapshot, merge, object_key, parse_manifests
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "kubernetes")
+
+
+def _manifests():
+    with open(os.path.join(FIXTURES, "web.yaml")) as f:
+        return parse_manifests(f.read())
+
+
+def test_diff_shows_only_the_manifest_change():
+    snapshot = ClusterSnapshot.load(os.path.join(FIXTURES, "snapshot.json"))
+    deployment, issuer = _manifests()
+
+    diff = snapshot.diff(deployment)
+    changed = [line for line in diff.splitlines()[3:] if line[:1] in "+-" and not line.startswith("@@")]
+    # Server defaults (imagePullPolicy, protocol, status, metadata) are not removals
+    assert changed == ["-        image: nginx:1.25", "+        image: nginx:1.27"]
+    assert snapshot.diff(issuer) == ""
+
+
+def test_snapshot_learns_cluster_scoped_kinds():
+    snapshot = ClusterSnapshot.load(os.path.join(FIXTURES, "snapshot.json"))
+    _, issuer = _manifests()
+    assert "ClusterIssuer" in snapshot.cluster_scoped
+    assert object_key(issuer, "default", snapshot.cluster_scoped) == ("ClusterIssuer", None, "letsencrypt")
+
+
+def test_merge_lists_by_merge_key():
+    live = {"containers": [
+        {"name": "web", "image": "nginx:1.25", "imagePullPolicy": "IfNotPresent"},
+        {"name": "sidecar", "image": "envoy"}
+    ]}
+    desired = {"containers": [{"name": "sidecar", "image": "envoy"}, {"name": "web", "image": "nginx:1.27"}]}
+
+    merged = merge(live, desired)
+    # Manifest order, live fields kept per item, and no merge across different names
+    assert merged["containers"] == [
+        {"name": "sidecar", "image": "envoy"},
+        {"name": "web", "image": "nginx:1.27", "imagePullPolicy": "IfNotPresent"}
+    ]
+
+
+def test_merge_replaces_lists_without_merge_key():
+    assert merge({"args": ["--a", "--b"]}, {"args": ["--c"]}) == {"args": ["--c"]}
+
+
+def test_new_object_diffs_as_added():
+    snapshot = ClusterSnapshot([])
+    deployment, _ = _manifests()
+    diff = snapshot.diff(deployment)
+    assert "+kind: Deployment" in diff.splitlines()
+    assert not any(line.startswith("-") and not line.startswith("---") for line in diff.splitlines())
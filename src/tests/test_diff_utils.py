@@ -0,0 +1,71 @@
+import os
+import subprocess
+
+import pytest
+
+from src.utils.diff_utils import parse_diffs
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "test", "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test", "GIT_COMMITTER_EMAIL": "test@example.com"
+}
+
+
+def _commit(repo, files):
+    for path, text in files.items():
+        full_path = os.path.join(repo, path)
+        if text is None:
+            os.remove(full_path)
+            continue
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", newline="") as f:
+            f.write(text)
+    env = dict(os.environ, **GIT_ENV)
+    subprocess.run(["git", "add", "-A"], cwd=repo, env=env, check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "change"], cwd=repo, env=env, check=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    return str(tmp_path)
+
+
+def test_modified_file(repo):
+    base = "".join(f"line {i}\n" for i in range(20))
+    _commit(repo, {"main.tf": base})
+    _commit(repo, {"main.tf": base.replace("line 3\n", "line three\n").replace("line 15\n", "")})
+
+    diff = parse_diffs(["main.tf"], repo)["main.tf"]
+    assert diff.added_lines == ["line three"]
+    assert diff.removed_lines == ["line 3", "line 15"]
+    # The hunks are git's own
+    git_diff = subprocess.run(["git", "diff", "HEAD^", "--", "main.tf"], cwd=repo,
+                              capture_output=True, text=True, check=True).stdout
+    assert [hunk.header for hunk in diff.hunks] == [line for line in git_diff.splitlines() if line.startswith("@@")]
+    assert not diff.is_new_file
+
+
+def test_only_newlines_break_lines(repo):
+    _commit(repo, {"config.yaml": "a: 1\fb\nc: 2\n"})
+    _commit(repo, {"config.yaml": "a: 1\fb\nc: 3 d\x1ee\n"})
+
+    diff = parse_diffs(["config.yaml"], repo)["config.yaml"]
+    assert diff.removed_lines == ["c: 2"]
+    assert diff.added_lines == ["c: 3 d\x1ee"]
+
+
+def test_new_deleted_and_unchanged_files(repo):
+    _commit(repo, {"old.tf": "a\nb\n", "same.tf": "x\n"})
+    _commit(repo, {"old.tf": None, "new.tf": "c\n"})
+
+    diffs = parse_diffs(["new.tf", "old.tf", "same.tf"], repo)
+    assert diffs["new.tf"].is_new_file
+    assert diffs["new.tf"].added_lines == ["c"]
+    assert diffs["old.tf"].removed_lines == ["a", "b"]
+    assert diffs["same.tf"].hunks == []
+
+
+def test_unreadable_repository(tmp_path):
+    diffs = parse_diffs(["main.tf"], str(tmp_path))
+    assert "error" in diffs["main.tf"]
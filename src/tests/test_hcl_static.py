@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from src.utils.hcl_static import HCLSyntaxError, analyse_configuration, parse_hcl, tokenize
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "terraform")
+
+
+def _read(side):
+    with open(os.path.join(FIXTURES, side, "main.tf")) as f:
+        return f.read()
+
+
+def test_tokenize_drops_comments_and_keeps_templates_whole():
+    tokens = tokenize('# note\nname = "web-${var.env == "prod" ? "}" : "x"}" // trailing\n')
+    assert ("string", '"web-${var.env == "prod" ? "}" : "x"}"') in tokens
+    assert all(kind != "comment" for kind, _ in tokens)
+
+
+def test_tokenize_reads_heredoc_as_one_string():
+    tokens = tokenize('policy = <<-EOT\n  {"a": "}"}\n  EOT\nnext = 1\n')
+    strings = [value for kind, value in tokens if kind == "string"]
+    assert len(strings) == 1 and strings[0].startswith("<<-EOT")
+    assert ("word", "next") in tokens
+
+
+def test_parse_hcl_ignores_formatting():
+    compact = parse_hcl('resource "aws_instance" "web" {\n  tags = { Name = "web", Env = "prod" }\n}\n')
+    spread = parse_hcl('resource "aws_instance" "web" {\n  tags = {\n    Name = "web"\n    Env  = "prod"\n  }\n}\n')
+    assert compact[0].labels == ("aws_instance", "web")
+    assert compact[0].canonical() == spread[0].canonical()
+
+
+def test_parse_hcl_nested_blocks():
+    blocks = parse_hcl('resource "aws_instance" "web" {\n  lifecycle {\n    create_before_destroy = true\n  }\n}\n')
+    assert blocks[0].blocks[0].type == "lifecycle"
+    assert blocks[0].blocks[0].attributes == {"create_before_destroy": "true"}
+
+
+def test_parse_hcl_rejects_unbalanced_braces():
+    with pytest.raises(HCLSyntaxError):
+        parse_hcl('resource "aws_instance" "web" {\n  ami = "x"\n')
+
+
+def test_analyse_configuration():
+    results = analyse_configuration(["main.tf"], {"main.tf": _read("base")}, {"main.tf": _read("head")})
+
+    assert [change.address for change in results["create"]] == ["aws_s3_bucket.logs"]
+    assert [change.address for change in results["delete"]] == ["aws_eip.legacy"]
+    # The reformatted tags map is not a change
+    [update] = results["update"]
+    assert update.address == "aws_instance.web"
+    assert update.details == {"instance_type": {"before": "t2.micro", "after": "t3.medium"}}
+
+    rules = {(entry["rule"], entry["target"]) for entry in results["needs_plan"]}
+    assert rules == {("resource-deleted", "aws_eip.legacy"), ("attribute-may-replace", "aws_instance.web")}
+    assert results["targets"] == ["aws_eip.legacy", "aws_instance.web", "aws_s3_bucket.logs"]
+    assert results["files"]["aws_eip.legacy"] == "main.tf"
+
+
+def test_analyse_configuration_follows_variable_defaults():
+    base = 'variable "size" {\n  default = "t2.micro"\n}\n'
+    head = 'variable "size" {\n  default = "t3.large"\n}\n'
+    sibling = 'resource "aws_instance" "web" {\n  instance_type = var.size\n}\n'
+    results = analyse_configuration(["variables.tf"], {"variables.tf": base}, {"variables.tf": head},
+                                    {"main.tf": sibling})
+
+    [update] = results["update"]
+    assert update.address == "aws_instance.web"
+    assert "aws_instance.web" in results["targets"]
+
+
+def test_analyse_configuration_reports_parse_errors():
+    results = analyse_configuration(["main.tf"], {"main.tf": ""}, {"main.tf": 'resource "a" "b" {\n'})
+    assert [entry["rule"] for entry in results["needs_plan"]] == ["parse-error"]
+    assert results["targets"] is None
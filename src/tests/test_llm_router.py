@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from src.utils.llm_router import Endpoint, LLMRouter, Tier
+
+
+class FakeClient:
+    """Stands in for LLMClient: answers after `delay`, or raises `error`"""
+
+    def __init__(self, model, answer=None, error=None, delay=0.0):
+        self.provider = "fake"
+        self.model = model
+        self.answer = answer if answer is not None else f"answer from {model}"
+        self.error = error
+        self.delay = delay
+        self.timeout = 5.0
+        self.calls = 0
+        self.timeouts = []
+        self._released = threading.Event()
+
+    def generate_text(self, prompt, max_tokens=1500, usage=None, timeout=None):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.delay:
+            self._released.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        if usage is not None:
+            usage.update(prompt_tokens=10, completion_tokens=5)
+        return self.answer
+
+    def release(self):
+        self._released.set()
+
+
+def test_failed_primary_falls_back_at_once():
+    primary = FakeClient("primary", error=RuntimeError("503"))
+    fallback = FakeClient("fallback")
+    tier = Tier("default", [Endpoint(primary), Endpoint(fallback)], slo_seconds=30)
+
+    assert tier.generate_text("prompt") == "answer from fallback"
+    metrics = tier.metrics.to_dict()
+    assert metrics["fallbacks"] == 1
+    assert metrics["wins"] == {"fake:fallback": 1}
+
+
+def test_slow_primary_falls_back_after_slo():
+    primary = FakeClient("primary", delay=5.0)
+    fallback = FakeClient("fallback")
+    tier = Tier("default", [Endpoint(primary), Endpoint(fallback)], slo_seconds=0.05)
+    try:
+        assert tier.generate_text("prompt") == "answer from fallback"
+    finally:
+        primary.release()
+    # Requests time out after the SLO times the number of endpoints
+    assert fallback.timeouts == [pytest.approx(0.1)]
+
+
+def test_every_endpoint_failing_raises_the_last_error():
+    tier = Tier("default", [Endpoint(FakeClient("a", error=RuntimeError("first"))),
+                            Endpoint(FakeClient("b", error=RuntimeError("second")))])
+    with pytest.raises(RuntimeError, match="second"):
+        tier.generate_text("prompt")
+    assert tier.metrics.to_dict()["failures"] == 1
+
+
+def test_hung_endpoints_time_out(monkeypatch):
+    monkeypatch.setattr("src.utils.llm_router.TIMEOUT_GRACE_SECONDS", 0.0)
+    hung = FakeClient("hung", delay=5.0)
+    tier = Tier("default", [Endpoint(hung)], timeout_seconds=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            tier.generate_text("prompt")
+    finally:
+        hung.release()
+
+
+def test_router_selects_tier_by_size_and_risk():
+    small = Tier("small", [Endpoint(FakeClient("small"))], max_prompt_chars=100, max_risk="medium")
+    large = Tier("large", [Endpoint(FakeClient("large"))])
+    router = LLMRouter([small, large])
+
+    assert router.generate_text("short", risk_level="low") == "answer from small"
+    assert router.generate_text("short", risk_level="critical") == "answer from large"
+    assert router.generate_text("x" * 101, risk_level="low") == "answer from large"
@@ -0,0 +1,86 @@
+from src.utils.plan_graph import PlanGraph
+
+
+def _resource(address, *references):
+    resource_type, name = address.split(".")
+    return {
+        "address": address,
+        "type": resource_type,
+        "name": name,
+        "expressions": {"ref": {"references": list(references)}} if references else {}
+    }
+
+
+# aws_vpc.main <- aws_subnet.a <- aws_instance.a, aws_subnet.b <- aws_instance.b;
+# aws_security_group.web <- both instances
+PLAN = {
+    "configuration": {"root_module": {"resources": [
+        _resource("aws_vpc.main"),
+        _resource("aws_subnet.a", "aws_vpc.main.id", "aws_vpc.main"),
+        _resource("aws_subnet.b", "aws_vpc.main.id", "aws_vpc.main"),
+        _resource("aws_security_group.web"),
+        _resource("aws_instance.a", "aws_subnet.a.id", "aws_security_group.web.id"),
+        _resource("aws_instance.b", "aws_subnet.b.id", "aws_security_group.web.id"),
+    ]}},
+    "resource_changes": [
+        {"address": "aws_instance.b[0]"},
+        {"address": "aws_instance.b[1]"},
+    ]
+}
+
+
+def test_dependents():
+    graph = PlanGraph.from_plan(PLAN)
+    assert set(graph.dependents("aws_subnet.a")) == {"aws_instance.a"}
+    assert set(graph.dependents("aws_vpc.main")) == {"aws_subnet.a", "aws_subnet.b", "aws_instance.a", "aws_instance.b"}
+
+
+def test_blast_radius_reports_each_root_in_full():
+    graph = PlanGraph.from_plan(PLAN)
+    radius, total = graph.blast_radius(["aws_subnet.b", "aws_security_group.web"])
+
+    # Both reach aws_instance.b; neither loses it to the other
+    assert radius["aws_subnet.b"]["resources"] == 1
+    assert radius["aws_subnet.b"]["instances"] == 2
+    assert radius["aws_security_group.web"]["resources"] == 2
+    assert set(radius["aws_security_group.web"]["dependents"]) == {"aws_instance.a", "aws_instance.b"}
+    assert radius["aws_subnet.b"]["shared_with"] == ["aws_security_group.web"]
+    assert radius["aws_security_group.web"]["shared_with"] == ["aws_subnet.b"]
+    # The union counts aws_instance.b once
+    assert total == {"resources": 2, "instances": 3}
+
+
+def test_blast_radius_does_not_depend_on_order():
+    graph = PlanGraph.from_plan(PLAN)
+    forward, forward_total = graph.blast_radius(["aws_subnet.b", "aws_security_group.web"])
+    backward, backward_total = graph.blast_radius(["aws_security_group.web", "aws_subnet.b"])
+    for address in forward:
+        assert forward[address]["resources"] == backward[address]["resources"]
+        assert forward[address]["shared_with"] == backward[address]["shared_with"]
+    assert forward_total == backward_total
+
+
+def test_blast_radius_marks_roots_inside_another_radius():
+    graph = PlanGraph.from_plan(PLAN)
+    radius, total = graph.blast_radius(["aws_subnet.a", "aws_vpc.main"])
+    assert radius["aws_subnet.a"] == {"within": "aws_vpc.main"}
+    assert radius["aws_vpc.main"]["resources"] == 4
+    assert total["resources"] == 4
+
+
+def test_blast_radius_of_a_leaf():
+    graph = PlanGraph.from_plan(PLAN)
+    radius, total = graph.blast_radius(["aws_instance.a"])
+    assert radius["aws_instance.a"]["resources"] == 0
+    assert total == {"resources": 0, "instances": 0}
+
+
+def test_assessor_reports_every_root_with_dependents():
+    from src.risk_assessor import RiskAssessor
+
+    radius, total = PlanGraph.from_plan(PLAN).blast_radius(["aws_subnet.b", "aws_security_group.web"])
+    plan_results = {"blast_radius": radius, "blast_radius_total": total}
+    risks = RiskAssessor({"plan_results": plan_results}).assess_downtime_risks()
+    assert sorted(risk.address for risk in risks if risk.rule == "tf-blast-radius") == [
+        "aws_security_group.web", "aws_subnet.b"
+    ]
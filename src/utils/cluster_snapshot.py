@@ -0,0 +1,262 @@
+"""
+Local diffing of Kubernetes manifests against a snapshot of the live cluster.
+
+Instead of one `kubectl diff` (a server-side dry run) per changed file, the
+live objects for every kind referenced by the changed manifests are fetched
+with one `kubectl get -o json` per namespace. Each manifest is then diffed
+in-process against the snapshot, producing `kubectl diff`-style output.
+
+A snapshot can be saved to and loaded from a JSON file in the `kind: List`
+format printed by `kubectl get -o json`, so recorded snapshots work as test
+fixtures without a cluster.
+"""
+import copy
+import difflib
+import json
+import subprocess
+
+from src.utils.process_runner import require_complete, run_command
+
+# Built-in kinds without a namespace; their objects are keyed with namespace None.
+# Other cluster-scoped kinds (CRDs) are learned from discovery or the snapshot.
+CLUSTER_SCOPED_KINDS = frozenset({
+    "Namespace", "Node", "PersistentVolume", "StorageClass", "ClusterRole", "ClusterRoleBinding",
+    "CustomResourceDefinition", "PriorityClass", "IngressClass", "MutatingWebhookConfiguration",
+    "ValidatingWebhookConfiguration", "APIService", "RuntimeClass", "CSIDriver"
+})
+
+# Fields set by the API server that never appear in a manifest
+_SERVER_METADATA = ("managedFields", "resourceVersion", "uid", "creationTimestamp", "generation", "selfLink")
+_LAST_APPLIED = "kubectl.kubernetes.io/last-applied-configuration"
+
+# Fields identifying the items of a list, as in strategic merge patches
+# (containers/env/volumes by name, volumeMounts by mountPath, ports by port)
+LIST_MERGE_KEYS = ("name", "mountPath", "containerPort", "port")
+
+
+def object_key(obj, default_namespace="default", cluster_scoped=CLUSTER_SCOPED_KINDS):
+    """Return the (kind, namespace, name) identity of a Kubernetes object"""
+    kind = obj.get("kind")
+    metadata = obj.get("metadata") or {}
+    namespace = None if kind in cluster_scoped else (metadata.get("namespace") or default_namespace)
+    return kind, namespace, metadata.get("name")
+
+
+def discover_cluster_scoped_kinds():
+    """Return the cluster-scoped kinds the cluster serves (`kubectl api-resources`), or an empty set"""
+    try:
+        output = run_command(["kubectl", "api-resources", "--namespaced=false", "--no-headers"], check=True).stdout
+    except (subprocess.SubprocessError, OSError):
+        return frozenset()
+    # KIND is the last column; SHORTNAMES may be empty
+    return frozenset(line.split()[-1] for line in output.splitlines() if line.strip())
+
+
+def parse_manifests(text):
+    """Return the objects in (multi-document) YAML manifest text, expanding `kind: List`"""
+    import yaml
+
+    # The libyaml loader is several times faster when available
+    docs = [doc for doc in yaml.load_all(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+            if isinstance(doc, dict)]
+    objects = []
+    for doc in docs:
+        if doc.get("kind") == "List":
+            objects.extend(item for item in doc.get("items") or [] if item)
+        else:
+            objects.append(doc)
+    return objects
+
+
+def load_manifests(path):
+    """Return the objects in a (multi-document) YAML manifest file, expanding `kind: List`"""
+    with open(path) as f:
+        return parse_manifests(f.read())
+
+
+def normalize(obj):
+    """Return a copy of a live object without status and server-managed metadata"""
+    obj = copy.deepcopy(obj)
+    obj.pop("status", None)
+    metadata = obj.get("metadata") or {}
+    for field in _SERVER_METADATA:
+        metadata.pop(field, None)
+    annotations = metadata.get("annotations")
+    if annotations:
+        annotations.pop(_LAST_APPLIED, None)
+        if not annotations:
+            metadata.pop("annotations")
+    return obj
+
+
+def _list_merge_key(live, desired):
+    """Return the field identifying the items of both lists, or None if they are not lists of such items"""
+    if not isinstance(live, list) or not isinstance(desired, list) or not desired:
+        return None
+    items = live + desired
+    if not all(isinstance(item, dict) for item in items):
+        return None
+    for key in LIST_MERGE_KEYS:
+        if all(key in item for item in items) and len({repr(item[key]) for item in desired}) == len(desired):
+            return key
+    return None
+
+
+def merge(live, desired):
+    """
+    Apply a manifest on top of a live object
+
+    Mappings are merged recursively. Lists of named items (containers, env,
+    ports, volumes, ...) are merged item by item on their merge key, in the
+    manifest's order; other lists and values are replaced. This approximates
+    `kubectl apply` closely enough to keep server defaults out of the diff.
+    """
+    merge_key = _list_merge_key(live, desired)
+    if merge_key is not None:
+        live_items = {repr(item[merge_key]): item for item in live}
+        return [merge(live_items.get(repr(item[merge_key])), item) for item in desired]
+    if not isinstance(live, dict) or not isinstance(desired, dict):
+        return copy.deepcopy(desired)
+    merged = dict(live)
+    for key, value in desired.items():
+        merged[key] = merge(live.get(key), value) if key in live else copy.deepcopy(value)
+    return merged
+
+
+class ClusterSnapshot:
+    """
+    Live objects of a cluster, keyed by (kind, namespace, name)
+
+    Args:
+        objects: Iterable of Kubernetes objects as returned by `kubectl get -o json`
+        cluster_scoped: Kinds known to be cluster-scoped besides the built-in ones;
+            kinds of live objects without a namespace are added
+    """
+
+    def __init__(self, objects=(), cluster_scoped=()):
+        self.objects = {}
+        self.cluster_scoped = set(CLUSTER_SCOPED_KINDS) | set(cluster_scoped)
+        for obj in objects:
+            if obj.get("kind") and not (obj.get("metadata") or {}).get("namespace"):
+                self.cluster_scoped.add(obj["kind"])
+            self.objects[object_key(obj, default_namespace=None)] = obj
+
+    def __len__(self):
+        return len(self.objects)
+
+    def get(self, kind, namespace, name):
+        return self.objects.get((kind, namespace, name))
+
+    @classmethod
+    def fetch(cls, kinds_by_namespace):
+        """
+        Fetch the live objects with one `kubectl get` per namespace
+
+        Kinds that discovery reports as cluster-scoped are fetched without a namespace.
+
+        Args:
+            kinds_by_namespace: Mapping of namespace (None for cluster-scoped kinds) to kinds
+
+        Raises:
+            subprocess.SubprocessError, OSError: kubectl failed
+        """
+        cluster_scoped = discover_cluster_scoped_kinds()
+        grouped = {}
+        for namespace, kinds in kinds_by_namespace.items():
+            for kind in kinds:
+                grouped.setdefault(None if kind in cluster_scoped else namespace, set()).add(kind)
+
+        objects = []
+        for namespace, kinds in sorted(grouped.items(), key=lambda item: item[0] or ""):
+            args = ["kubectl", "get", ",".join(sorted(kinds)), "-o", "json", "--ignore-not-found"]
+            if namespace is not None:
+                args += ["-n", namespace]
+            output = require_complete(run_command(args, check=True)).stdout
+            if output.strip():
+                objects.extend(json.loads(output).get("items", []))
+        return cls(objects, cluster_scoped)
+
+    @classmethod
+    def load(cls, path):
+        """Load a snapshot saved by save() or recorded with `kubectl get -o json`"""
+        with open(path) as f:
+            return cls(json.load(f).get("items", []))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({"apiVersion": "v1", "kind": "List", "items": list(self.objects.values())}, f)
+
+    def diff(self, desired, default_namespace="default"):
+        """
+        Return `kubectl diff`-style unified diff output for one desired object
+
+        Returns an empty string when the object would not change.
+        """
+        kind, namespace, name = object_key(desired, default_namespace, self.cluster_scoped)
+        live = self.get(kind, namespace, name)
+        live = normalize(live) if live is not None else None
+        merged = merge(live, desired) if live is not None else desired
+        return object_diff(live, merged, default_namespace)
+
+
+def object_diff(before, after, default_namespace="default"):
+    """
+    Return `kubectl diff`-style unified diff output between two versions of an object
+
+    Either side may be None (object created or deleted). Returns an empty
+    string when both are equal.
+    """
+    import yaml
+
+    if before == after:
+        return ""
+    obj = after if after is not None else before
+    kind, namespace, name = object_key(obj, default_namespace)
+    api_version = (obj.get("apiVersion") or "v1").replace("/", ".")
+    label = f"{api_version}.{kind}.{namespace or ''}.{name}"
+
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    before_lines = yaml.dump(before, Dumper=dumper, sort_keys=True).splitlines() if before is not None else []
+    after_lines = yaml.dump(after, Dumper=dumper, sort_keys=True).splitlines() if after is not None else []
+    header = f"diff -u -N /tmp/LIVE/{label} /tmp/MERGED/{label}\n"
+    body = difflib.unified_diff(before_lines, after_lines, f"/tmp/LIVE/{label}", f"/tmp/MERGED/{label}", lineterm="")
+    return header + "\n".join(body) + "\n"
+
+
+def diff_objects(base_objects, head_objects, default_namespace="default"):
+    """
+    Compare two sets of objects keyed by (kind, namespace, name), object by object
+
+    Returns:
+        (object changes {"added": [...], "modified": [...], "removed": [...]} of
+        "Kind/namespace/name" labels, `kubectl diff`-style unified diff text)
+    """
+    changes = {"added": [], "modified": [], "removed": []}
+    chunks = []
+    for key in sorted(base_objects.keys() | head_objects.keys(), key=lambda k: tuple(str(part) for part in k)):
+        before = base_objects.get(key)
+        after = head_objects.get(key)
+        chunk = object_diff(before, after, default_namespace)
+        if not chunk:
+            continue
+        kind, namespace, name = key
+        label = "/".join(str(part) for part in (kind, namespace, name) if part is not None)
+        if before is None:
+            changes["added"].append(label)
+        elif after is None:
+            changes["removed"].append(label)
+        else:
+            changes["modified"].append(label)
+        chunks.append(chunk)
+    return changes, "".join(chunks)
+
+
+def referenced_kinds(manifests, default_namespace="default"):
+    """Return {namespace: {kinds}} for every object in an iterable of manifests"""
+    kinds = {}
+    for obj in manifests:
+        kind, namespace, _ = object_key(obj, default_namespace)
+        if kind:
+            kinds.setdefault(namespace, set()).add(kind)
+    return kinds
+
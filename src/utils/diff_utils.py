@@ -1,74 +1,130 @@
-import subprocess
 import os
+import subprocess
+import tempfile
+from src.models import FileDiff
+from src.utils.git_blobs import blob_reader
+from src.utils.process_runner import require_complete, run_command
+
+BASE_REVISION = "HEAD^"
+CONTEXT_LINES = 3
 
-def parse_diff(file_path):
+def _lines(text):
     """
-    Parse the git diff for a specific file
-    
+    Split text into lines at "\n" only, as git does
+
+    str.splitlines() also breaks at \r, \x0c, \x1c-\x1e, \x85 and \u2028,
+    which would shift line numbers and split lines git keeps whole.
+    """
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+def _git_diff(pairs):
+    """
+    Return the unified diff hunks (no file headers) of (base, head) text pairs
+
+    All pairs are written to a scratch directory and compared by a single
+    `git diff --no-index`, so the diffs are git's own and no process is
+    started per file.
+
+    Returns:
+        List of hunk text per pair ("" when the texts are the same)
+
+    Raises:
+        subprocess.CalledProcessError: git failed
+        OutputTruncated: The combined diff went past the output capture limit
+    """
+    hunks = [""] * len(pairs)
+    with tempfile.TemporaryDirectory(prefix="migraterator-diff-") as scratch:
+        for side in ("a", "b"):
+            os.mkdir(os.path.join(scratch, side))
+        for index, texts in enumerate(pairs):
+            for side, text in zip(("a", "b"), texts):
+                with open(os.path.join(scratch, side, str(index)), "w", encoding="utf-8", newline="") as f:
+                    f.write(text)
+        args = ["git", "diff", "--no-index", "--no-color", "--no-ext-diff", "--no-renames",
+                f"-U{CONTEXT_LINES}", "--src-prefix=a/", "--dst-prefix=b/", "a", "b"]
+        result = require_complete(run_command(args, cwd=scratch))
+    # Exit code 1 means the inputs differ
+    if result.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(result.returncode, args, result.stdout, result.stderr)
+
+    output = result.stdout
+    start = output.find("diff --git ")
+    while start != -1:
+        end = output.find("\ndiff --git ", start)
+        section = output[start:end if end != -1 else len(output)]
+        # "diff --git a/a/<index> b/b/<index>"
+        index = int(section[:section.find("\n")].rsplit("/", 1)[1])
+        first_hunk = section.find("\n@@")
+        if first_hunk != -1:
+            hunks[index] = section[first_hunk + 1:]
+        start = end + 1 if end != -1 else -1
+    return hunks
+
+def _new_file_diff(head):
+    lines = _lines(head)
+    header = "@@ -0,0 +1,{} @@".format(len(lines))
+    diff = FileDiff.parse("\n".join([header] + ['+' + line.rstrip() for line in lines]))
+    diff.is_new_file = True
+    return diff
+
+def parse_diffs(file_paths, repo_path=None, base_revision=BASE_REVISION):
+    """
+    Parse the diffs of many files against the base revision
+
+    Base versions are read over the repository's shared `git cat-file --batch`
+    process, each working-tree file is read once, and the changed pairs are
+    diffed by one `git diff --no-index`, so no process is started per file.
+
     Args:
-        file_path: Path to the file to analyse
-        
+        file_paths: Paths to the files to analyse
+        repo_path: Repository the paths are relative to (defaults to the current directory)
+        base_revision: Revision to diff the working tree against
+
     Returns:
-        Dictionary with parsed diff information
+        {path: FileDiff (readable as a dict)}, or {path: error dict} for every
+        path if the repository could not be read or diffed; files with no
+        base version have is_new_file set
     """
+    reader = blob_reader(repo_path)
     try:
-        result = subprocess.run(
-            ["git", "diff", "HEAD^", "--", file_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        diff_output = result.stdout
-        
-        # Parse the diff output
-        changes = {
-            "added_lines": [],
-            "removed_lines": [],
-            "changed_blocks": []
-        }
-        
-        current_block = None
-        
-        for line in diff_output.split('\n'):
-            if line.startswith('@@'):
-                # This is a diff hunk header
-                if current_block:
-                    changes["changed_blocks"].append(current_block)
-                current_block = {
-                    "header": line,
-                    "lines": []
-                }
-            elif current_block is not None:
-                current_block["lines"].append(line)
-                
-                if line.startswith('+') and not line.startswith('+++'):
-                    changes["added_lines"].append(line[1:])
-                elif line.startswith('-') and not line.startswith('---'):
-                    changes["removed_lines"].append(line[1:])
-        
-        # Add the last block if it exists
-        if current_block:
-            changes["changed_blocks"].append(current_block)
-            
-        return changes
-    except subprocess.CalledProcessError as e:
-        # File might be new or there might be no changes
-        if "fatal: bad object" in e.stderr:
-            # This might be a new file
-            if os.path.exists(file_path):
-                return {
-                    "added_lines": open(file_path, 'r').readlines(),
-                    "removed_lines": [],
-                    "changed_blocks": [{
-                        "header": "@@ -0,0 +1,{} @@".format(len(open(file_path, 'r').readlines())),
-                        "lines": ['+' + line.rstrip() for line in open(file_path, 'r').readlines()]
-                    }],
-                    "is_new_file": True
-                }
-        
-        return {
+        # Without a base commit (e.g. a single-commit repository) every file is new
+        base = reader.read_many(file_paths, base_revision)
+        head = reader.read_many(file_paths)
+        diffs = {}
+        changed = []
+        for file_path in file_paths:
+            if base[file_path] is None:
+                diffs[file_path] = _new_file_diff(head[file_path]) if head[file_path] is not None else FileDiff.parse("")
+            elif base[file_path] == head[file_path]:
+                diffs[file_path] = FileDiff.parse("")
+            else:
+                changed.append(file_path)
+        if changed:
+            hunks = _git_diff([(base[file_path], head[file_path] or "") for file_path in changed])
+            for file_path, text in zip(changed, hunks):
+                diffs[file_path] = FileDiff.parse(text)
+    except (subprocess.SubprocessError, OSError) as e:
+        error = {
             "error": str(e),
-            "stdout": e.stdout,
-            "stderr": e.stderr
-        } 
\ No newline at end of file
+            "stdout": getattr(e, "stdout", ""),
+            "stderr": getattr(e, "stderr", "")
+        }
+        return {file_path: dict(error) for file_path in file_paths}
+
+    return {file_path: diffs[file_path] for file_path in file_paths}
+
+def parse_diff(file_path, repo_path=None):
+    """
+    Parse the git diff for a specific file
+
+    Args:
+        file_path: Path to the file to analyse
+        repo_path: Repository the path is relative to (defaults to the current directory)
+
+    Returns:
+        FileDiff with parsed diff information (readable as a dict)
+    """
+    return parse_diffs([file_path], repo_path)[file_path]
@@ -0,0 +1,278 @@
+"""
+File contents at git revisions, read through one long-lived `git cat-file --batch`.
+
+Each repository gets a single `git cat-file --batch` process for the life of
+the run. Requests (`<commit>:<path>`) are written to its stdin and the blobs
+read back from its stdout, so reading the base version of a thousand files
+costs one process instead of a thousand. Decoded contents are kept in an LRU
+cache bounded by MIGRATERATOR_BLOB_CACHE_BYTES, keyed by the resolved commit
+(or, for the working tree, the file's mtime and size), so diff parsing,
+manifest diffs and Helm render keys all share the same reads.
+"""
+import atexit
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict
+
+from src.utils.instrumentation import tracer
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Repositories with an open reader; the least recently used one is closed beyond this
+MAX_READERS = 8
+
+# Requests are written in chunks that fit in the pipe buffer, so writing never
+# blocks while git waits for us to drain its stdout
+_REQUEST_CHUNK = 32 * 1024
+
+_OBJECT_ID = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+
+
+def _object_name(commit, path):
+    # "./" makes the path relative to the reader's directory, like `git diff -- <path>`
+    return f"{commit}:./{path}"
+
+
+class GitBlobReader:
+    """
+    Reads files at any revision of one repository over a persistent `git cat-file --batch`
+
+    Args:
+        repo_path: Repository (or worktree) to read from
+        cache_bytes: Size bound of the decoded-contents cache (defaults to
+            MIGRATERATOR_BLOB_CACHE_BYTES)
+    """
+
+    def __init__(self, repo_path=".", cache_bytes=None):
+        self.repo_path = os.path.abspath(repo_path)
+        if cache_bytes is None:
+            cache_bytes = int(os.environ.get("MIGRATERATOR_BLOB_CACHE_BYTES", DEFAULT_CACHE_BYTES))
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._process = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the git process; the reader restarts it if used again"""
+        with self._lock:
+            self._stop()
+
+    def _start(self):
+        args = ["git", "cat-file", "--batch"]
+        with tracer.span("git cat-file", category="subprocess", argv=args, persistent=True):
+            self._process = subprocess.Popen(
+                args,
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+    def _stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        stderr = process.stderr.read().decode("utf-8", errors="replace")
+        process.stdout.close()
+        process.stderr.close()
+        return process.returncode, stderr
+
+    def _failure(self):
+        returncode, stderr = self._stop() or (None, "")
+        return subprocess.CalledProcessError(returncode or 1, ["git", "cat-file", "--batch"], "", stderr)
+
+    def _exchange(self, requests):
+        """Send object names and return [(object id, type, bytes) or None] in order; call with the lock held"""
+        if self._process is None or self._process.poll() is not None:
+            self._stop()
+            self._start()
+        stdin, stdout = self._process.stdin, self._process.stdout
+
+        responses = []
+        pending = 0
+        while pending < len(requests):
+            chunk, size = [], 0
+            while pending < len(requests) and (not chunk or size < _REQUEST_CHUNK):
+                line = requests[pending].encode() + b"\n"
+                chunk.append(line)
+                size += len(line)
+                pending += 1
+            try:
+                stdin.write(b"".join(chunk))
+                stdin.flush()
+                for _ in chunk:
+                    header = stdout.readline()
+                    if not header:
+                        raise self._failure()
+                    # "<name> missing" / "<name> ambiguous"; names may contain spaces
+                    if header.endswith((b" missing\n", b" ambiguous\n")):
+                        responses.append(None)
+                        continue
+                    object_id, object_type, length = header.split()
+                    data = stdout.read(int(length))
+                    stdout.read(1)
+                    responses.append((object_id.decode(), object_type.decode(), data))
+            except (BrokenPipeError, ValueError):
+                raise self._failure()
+        return responses
+
+    def _cache_get(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return True, self._cache[key]
+        return False, None
+
+    def _cache_put(self, key, text):
+        if key in self._cache:
+            return
+        self._cache[key] = text
+        self._cached_bytes += len(text or "")
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted or "")
+
+    def resolve(self, revision):
+        """
+        Return the commit id a revision points to, or None if it does not resolve
+
+        Raises:
+            subprocess.CalledProcessError: The git process failed (e.g. not a repository)
+            OSError: git could not be started
+        """
+        if _OBJECT_ID.match(revision):
+            return revision
+        with self._lock:
+            response = self._exchange([f"{revision}^{{commit}}"])[0]
+        return response[0] if response else None
+
+    def object_id(self, path, revision):
+        """Return the id of the blob or tree at path in revision, or None if it does not exist"""
+        commit = self.resolve(revision)
+        if commit is None:
+            return None
+        with self._lock:
+            response = self._exchange([_object_name(commit, path)])[0]
+        return response[0] if response else None
+
+    def read_many(self, paths, revision=None):
+        """
+        Return {path: text or None} for many files, fetched over the one pipe
+
+        Args:
+            paths: File paths relative to the reader's directory
+            revision: Revision to read at; None reads the working tree
+
+        Returns:
+            Decoded contents per path, None where the file does not exist
+
+        Raises:
+            subprocess.CalledProcessError: The git process failed (e.g. not a repository)
+            OSError: git could not be started
+        """
+        if revision is None:
+            return {path: self._read_worktree(path) for path in paths}
+
+        commit = self.resolve(revision)
+        if commit is None:
+            return {path: None for path in paths}
+
+        contents = {}
+        with self._lock:
+            missing = []
+            for path in paths:
+                found, text = self._cache_get((commit, path))
+                if found:
+                    contents[path] = text
+                elif path not in contents:
+                    missing.append(path)
+                    contents[path] = None
+            if missing:
+                with tracer.span("git cat-file", category="subprocess", revision=commit, objects=len(missing)):
+                    responses = self._exchange([_object_name(commit, path) for path in missing])
+                for path, response in zip(missing, responses):
+                    text = None
+                    if response and response[1] == "blob":
+                        text = response[2].decode("utf-8", errors="replace")
+                    self._cache_put((commit, path), text)
+                    contents[path] = text
+        return contents
+
+    def read(self, path, revision=None):
+        """Return the text of one file at a revision (None = the working tree), or None if missing"""
+        return self.read_many([path], revision)[path]
+
+    def _read_worktree(self, path):
+        full_path = os.path.join(self.repo_path, path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        key = (None, path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            found, text = self._cache_get(key)
+        if found:
+            return text
+        try:
+            with open(full_path, "rb") as f:
+                text = f.read().decode("utf-8", errors="replace")
+        except (IsADirectoryError, FileNotFoundError):
+            return None
+        with self._lock:
+            self._cache_put(key, text)
+        return text
+
+
+_readers = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def blob_reader(repo_path=None):
+    """Return the shared GitBlobReader for a repository (default: the current directory)"""
+    key = os.path.realpath(repo_path or ".")
+    with _readers_lock:
+        reader = _readers.pop(key, None)
+        if reader is None:
+            reader = GitBlobReader(key)
+        _readers[key] = reader
+        evicted = []
+        while len(_readers) > MAX_READERS:
+            evicted.append(_readers.popitem(last=False)[1])
+    for old in evicted:
+        old.close()
+    return reader
+
+
+def close_reader(repo_path):
+    """Stop the shared reader of a repository, e.g. before its worktree is removed"""
+    with _readers_lock:
+        reader = _readers.pop(os.path.realpath(repo_path), None)
+    if reader is not None:
+        reader.close()
+
+
+@atexit.register
+def close_readers():
+    """Stop every shared reader's git process"""
+    with _readers_lock:
+        readers = list(_readers.values())
+        _readers.clear()
+    for reader in readers:
+        reader.close()
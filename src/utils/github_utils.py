@@ -1,5 +1,10 @@
-import requests
 import os
+from src.utils.http_session import get_session
+from src.utils.instrumentation import tracer
+
+# GITHUB_API_URL is set by GitHub Actions (and points at GHES there); it can
+# also be pointed at a local stub server
+DEFAULT_GITHUB_API_URL = "https://api.github.com"
 
 def get_pr_files(repo_name, pr_number, github_token):
     """
@@ -13,13 +18,16 @@ def get_pr_files(repo_name, pr_number, github_token):
     Returns:
         List of file paths changed in the PR
     """
-    url = f"https://api.github.com/repos/{repo_name}/pulls/{pr_number}/files"
+    url = f"{os.environ.get('GITHUB_API_URL', DEFAULT_GITHUB_API_URL)}/repos/{repo_name}/pulls/{pr_number}/files"
     headers = {
         "Authorization": f"token {github_token}",
         "Accept": "application/vnd.github.v3+json"
     }
     
-    response = requests.get(url, headers=headers)
+    with tracer.span("GET pulls/files", category="http") as span:
+        response = get_session().get(url, headers=headers)
+        span.args["status"] = response.status_code
+        span.args["bytes_read"] = len(response.content)
     response.raise_for_status()
     
     files_data = response.json()
@@ -42,7 +50,7 @@ def post_pr_comment(repo_name, pr_number, github_token, comment_body):
     Returns:
         Response from GitHub API
     """
-    url = f"https://api.github.com/repos/{repo_name}/issues/{pr_number}/comments"
+    url = f"{os.environ.get('GITHUB_API_URL', DEFAULT_GITHUB_API_URL)}/repos/{repo_name}/issues/{pr_number}/comments"
     headers = {
         "Authorization": f"token {github_token}",
         "Accept": "application/vnd.github.v3+json"
@@ -52,7 +60,10 @@ def post_pr_comment(repo_name, pr_number, github_token, comment_body):
         "body": comment_body
     }
     
-    response = requests.post(url, headers=headers, json=data)
+    with tracer.span("POST issues/comments", category="http") as span:
+        response = get_session().post(url, headers=headers, json=data)
+        span.args["status"] = response.status_code
+        span.args["bytes_read"] = len(response.content)
     response.raise_for_status()
     
     return response.json() 
\ No newline at end of file
@@ -0,0 +1,552 @@
+"""
+Static analysis of Terraform configuration changes, without the terraform binary.
+
+The base and head versions of the changed `.tf` files are parsed into blocks
+and compared block by block: added, removed and changed `resource` blocks
+become create/delete/update candidates with attribute-level details, and
+changed variable defaults and locals are followed to the resources that
+reference them. Expressions are compared as normalised source text, so
+formatting-only edits are not reported.
+
+Static results cannot see state, provider schemas or computed values. Every
+change a rule in NEEDS_PLAN_RULES matches is listed in "needs_plan", and
+callers run the full `terraform plan` only when that list is not empty.
+"""
+import os
+import re
+
+from src.models import ResourceChange
+
+# Rules that make a static result unconfirmed: the change needs `terraform plan`
+NEEDS_PLAN_RULES = {
+    "resource-deleted": "Deletions are confirmed against state, and their blast radius needs the plan graph",
+    "attribute-may-replace": "Changed attributes may force replacement or depend on provider defaults",
+    "meta-argument": "count, for_each, provider, depends_on or lifecycle changes alter instances or ordering",
+    "module-changed": "Module calls expand to resources that are not visible statically",
+    "data-source-changed": "Data source results are only known at plan time",
+    "configuration-block": "Provider, backend, moved, import or removed blocks changed",
+    "non-hcl-input": "Variable files, JSON configuration or the lock file changed",
+    "parse-error": "A configuration file could not be parsed statically"
+}
+
+# Rules whose changes affect the whole configuration, so a plan cannot be scoped with -target
+UNTARGETABLE_RULES = frozenset(["configuration-block", "non-hcl-input", "parse-error"])
+
+# Attributes that are updated in place by every provider
+SAFE_UPDATE_ATTRIBUTES = frozenset(["tags", "tags_all", "labels"])
+
+_META_ARGUMENTS = frozenset(["count", "for_each", "provider", "depends_on"])
+_META_BLOCKS = frozenset(["lifecycle", "provisioner", "connection"])
+
+_TOKENS = re.compile(r"""
+    (?:[ \t\r\f]+|\\\n|/\*.*?\*/)*
+  (?:
+    (?P<newline>\n)
+  | (?P<comment>\#[^\n]*|//[^\n]*)
+  | (?P<heredoc><<-?[ \t]*(?P<tag>[A-Za-z_][\w-]*)[ \t]*\r?\n)
+  | (?P<string>"(?:[^"\\$%\n]|\\.|\$\$\{|%%\{|\$(?!\{)|%(?!\{))*")
+  | (?P<template>")
+  | (?P<word>[A-Za-z_][\w-]*|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<op>==|!=|<=|>=|&&|\|\||=>|\.\.\.|[-+*/%<>!?:=.,\[\](){}])
+  | (?P<invalid>.)
+  | $
+  )
+""", re.S | re.X)
+_KEPT = frozenset(["word", "string", "op", "newline"])
+
+_OPENERS = frozenset("([{")
+_CLOSERS = frozenset(")]}")
+# No item separator is implied by a newline after or before these tokens
+_CONTINUES = frozenset(["(", "[", "{", ",", "=", ":", "?", "+", "-", "*", "/", "%", "&&", "||",
+                        "==", "!=", "<", ">", "<=", ">=", "=>", "!", ".", "..."])
+
+_REFERENCE = re.compile(r"(?<![\w.-])(var|local|module|data)\.([A-Za-z_][\w-]*)(?:\.([A-Za-z_][\w-]*))?")
+_LITERAL_STRING = re.compile(r'^"((?:[^"\\$%]|\\.|\$(?!\{)|%(?!\{))*)"$')
+
+
+class HCLSyntaxError(ValueError):
+    """A Terraform file could not be parsed"""
+
+
+class Block:
+    """One HCL block: type, labels, attribute expressions (normalised source text) and nested blocks"""
+
+    __slots__ = ("type", "labels", "attributes", "blocks")
+
+    def __init__(self, type, labels, attributes, blocks):
+        self.type = type
+        self.labels = labels
+        self.attributes = attributes
+        self.blocks = blocks
+
+    def canonical(self):
+        """Formatting-independent representation, equal for equivalent blocks"""
+        return (self.type, self.labels, tuple(sorted(self.attributes.items())),
+                tuple(block.canonical() for block in self.blocks))
+
+    def text(self):
+        """Compact one-line rendering, used in change details"""
+        labels = "".join(f' "{label}"' for label in self.labels)
+        body = [f"{name} = {value}" for name, value in self.attributes.items()]
+        body += [block.text() for block in self.blocks]
+        return f"{self.type}{labels} {{ {'; '.join(body)} }}"
+
+
+def _template_end(text, pos):
+    """Return the end of a string literal containing ${...} or %{...} template sequences"""
+    pos += 1
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+        elif char == '"':
+            return pos + 1
+        elif char in "$%" and text.startswith("{", pos + 1) and not text.startswith(char * 2, pos - 1):
+            depth = 1
+            pos += 2
+            while pos < length and depth:
+                char = text[pos]
+                if char == '"':
+                    pos = _template_end(text, pos)
+                    continue
+                if char == "{":
+                    depth += 1
+                elif char == "}":
+                    depth -= 1
+                pos += 1
+        elif char == "\n":
+            break
+        else:
+            pos += 1
+    raise HCLSyntaxError(f"unterminated string at offset {pos}")
+
+
+def tokenize(text):
+    """Return the (kind, value) tokens of HCL source, without whitespace and comments"""
+    tokens = []
+    append = tokens.append
+    pos = 0
+    length = len(text)
+    while pos < length:
+        # finditer is much cheaper per token than match() in a loop; it is only
+        # restarted after templates and heredocs, which are scanned by hand
+        for match in _TOKENS.finditer(text, pos):
+            kind = match.lastgroup
+            if kind in _KEPT:
+                append((kind, match.group(kind)))
+            elif kind == "template":
+                start = match.start(kind)
+                pos = _template_end(text, start)
+                append(("string", text[start:pos]))
+                break
+            elif kind in ("heredoc", "tag"):
+                start = match.start("heredoc")
+                closing = re.compile(r"^[ \t]*" + re.escape(match.group("tag")) + r"[ \t]*$", re.M).search(text, match.end())
+                if closing is None:
+                    raise HCLSyntaxError(f"unterminated heredoc at offset {start}")
+                append(("string", text[start:closing.end()]))
+                pos = closing.end()
+                break
+            elif kind == "invalid":
+                raise HCLSyntaxError(f"unexpected character {match.group(kind)!r} at offset {match.start(kind)}")
+        else:
+            break
+    return tokens
+
+
+def _parse_expression(tokens, i):
+    """Return (normalised expression text, next index); stops at a newline or `}` at depth 0"""
+    parts = []
+    depth = 0
+    previous = None
+    length = len(tokens)
+    while i < length:
+        kind, value = tokens[i]
+        if kind == "newline":
+            if depth == 0:
+                break
+            # Inside brackets a newline separates items like a comma does
+            following = next((v for k, v in tokens[i + 1:i + 2] if k != "newline"), None)
+            if parts and parts[-1] not in _CONTINUES and following not in _CONTINUES and following not in _CLOSERS:
+                parts.append(",")
+                previous = None
+            i += 1
+            continue
+        if kind == "op":
+            if value in _OPENERS:
+                depth += 1
+            elif value in _CLOSERS:
+                if depth == 0:
+                    break
+                depth -= 1
+                if parts and parts[-1] == ",":
+                    parts.pop()
+        elif previous in ("word", "string"):
+            parts.append(" ")
+        parts.append(value)
+        previous = kind
+        i += 1
+    return "".join(parts), i
+
+
+def _parse_body(tokens, i, nested):
+    """Return (attributes, blocks, next index) of a body, consuming its closing `}` when nested"""
+    attributes = {}
+    blocks = []
+    length = len(tokens)
+    while True:
+        while i < length and tokens[i][0] == "newline":
+            i += 1
+        if i == length:
+            if nested:
+                raise HCLSyntaxError("missing closing brace")
+            return attributes, blocks, i
+        kind, value = tokens[i]
+        if value == "}" and kind == "op":
+            if not nested:
+                raise HCLSyntaxError("unexpected closing brace")
+            return attributes, blocks, i + 1
+        if kind != "word":
+            raise HCLSyntaxError(f"expected an attribute or block, found {value!r}")
+        name = value
+        i += 1
+        if i < length and tokens[i] == ("op", "="):
+            attributes[name], i = _parse_expression(tokens, i + 1)
+            continue
+        labels = []
+        while i < length and tokens[i][0] in ("word", "string"):
+            label = tokens[i][1]
+            labels.append(label[1:-1] if tokens[i][0] == "string" else label)
+            i += 1
+        if i == length or tokens[i] != ("op", "{"):
+            raise HCLSyntaxError(f"expected '{{' after block {name}")
+        block_attributes, block_blocks, i = _parse_body(tokens, i + 1, nested=True)
+        blocks.append(Block(name, tuple(labels), block_attributes, block_blocks))
+
+
+def parse_hcl(text):
+    """
+    Parse Terraform HCL into its top-level blocks
+
+    Raises:
+        HCLSyntaxError: The text is not valid HCL (as far as this parser can tell)
+    """
+    _, blocks, _ = _parse_body(tokenize(text), 0, nested=False)
+    return blocks
+
+
+def index_blocks(blocks):
+    """Return {key: Block or local expression} for the top-level blocks of a module"""
+    index = {}
+    for block in blocks:
+        if block.type == "locals":
+            for name, value in block.attributes.items():
+                index[("local", name)] = value
+        elif block.type in ("resource", "data") and len(block.labels) == 2:
+            index[(block.type,) + block.labels] = block
+        elif block.type in ("module", "variable", "output") and len(block.labels) == 1:
+            index[(block.type,) + block.labels] = block
+        elif block.type == "provider":
+            index[("provider",) + block.labels + (block.attributes.get("alias"),)] = block
+        else:
+            # terraform, moved, import, removed, check, ...: identified by their
+            # contents, so the key does not depend on the blocks around them
+            index[(block.type, block.canonical())] = block
+    return index
+
+
+def references(expression):
+    """Return the var/local/module/data symbols an expression refers to"""
+    symbols = set()
+    for kind, first, second in _REFERENCE.findall(expression):
+        if kind == "data":
+            if second:
+                symbols.add(f"data.{first}.{second}")
+        else:
+            symbols.add(f"{kind}.{first}")
+    return symbols
+
+
+def literal(expression):
+    """Return the value of a plain string literal expression, or the expression text itself"""
+    match = _LITERAL_STRING.match(expression)
+    if match:
+        return re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t"}.get(m.group(1), m.group(1)), match.group(1))
+    return expression
+
+
+def _symbol_values(index):
+    """Return {symbol: expression} for variable defaults and locals"""
+    values = {}
+    for key, value in index.items():
+        if key[0] == "variable":
+            values[f"var.{key[1]}"] = value.attributes.get("default")
+        elif key[0] == "local":
+            values[f"local.{key[1]}"] = value
+    return values
+
+
+def _substitute(expression, symbols, values):
+    """Replace references to symbols with known values (variable defaults, locals) in an expression"""
+    for symbol in sorted(symbols):
+        value = values.get(symbol)
+        if value is not None:
+            expression = re.sub(r"(?<![\w.-])" + re.escape(symbol) + r"(?![\w-])", lambda _: value, expression)
+    return expression
+
+
+def _block_changes(before, after):
+    """Return {attribute or nested block type: {"before", "after"}} between two versions of a block"""
+    details = {}
+    for name in before.attributes.keys() | after.attributes.keys():
+        old, new = before.attributes.get(name), after.attributes.get(name)
+        if old != new:
+            details[name] = {"before": None if old is None else literal(old), "after": None if new is None else literal(new)}
+    nested_types = {block.type for block in before.blocks} | {block.type for block in after.blocks}
+    for block_type in nested_types:
+        old = [block for block in before.blocks if block.type == block_type]
+        new = [block for block in after.blocks if block.type == block_type]
+        if [block.canonical() for block in old] != [block.canonical() for block in new]:
+            details[block_type] = {"before": [block.text() for block in old], "after": [block.text() for block in new]}
+    return details
+
+
+def _address(key):
+    """Address of a resource, data source or module call index key, within its module"""
+    if key[0] == "resource":
+        return f"{key[1]}.{key[2]}"
+    return ".".join(key)
+
+
+def _expressions(block):
+    """All attribute expressions of a block and its nested blocks, as one string"""
+    return "\n".join(list(block.attributes.values()) + [_expressions(nested) for nested in block.blocks])
+
+
+def direct_dependents(index, addresses):
+    """
+    Return the resources, data sources and module calls that reference any of the addresses
+
+    References through locals count as direct: a resource using
+    `local.x = aws_instance.web.id` depends on `aws_instance.web`.
+    """
+    if not addresses:
+        return set()
+    names = set(addresses)
+    while True:
+        pattern = re.compile(r"(?<![\w.-])(?:" + "|".join(map(re.escape, sorted(names))) + r")(?![\w-])")
+        locals_ = {f"local.{key[1]}" for key, value in index.items()
+                   if key[0] == "local" and pattern.search(value)}
+        if locals_ <= names:
+            break
+        names |= locals_
+
+    dependents = set()
+    for key, block in index.items():
+        if key[0] in ("resource", "data", "module"):
+            address = _address(key)
+            if address not in addresses and pattern.search(_expressions(block)):
+                dependents.add(address)
+    return dependents
+
+
+def _needs_plan(needs_plan, rule, target, reason):
+    needs_plan.append({"rule": rule, "target": target, "reason": reason})
+
+
+def compare_module(directory, base_index, head_index, results):
+    """
+    Compare one module directory's base and head blocks, adding to results
+
+    Args:
+        directory: Module directory relative to the configuration root ("" for the root)
+        base_index: index_blocks() of the base version of the directory's files
+        head_index: index_blocks() of the head version
+        results: Static results being built (see analyse_configuration())
+
+    Returns:
+        Addresses (within the module) of the changed resources, data sources and module calls
+    """
+    prefix = f"{directory}/" if directory else ""
+    needs_plan = results["needs_plan"]
+    changed_symbols = set()
+    changed = set()
+    updates = {}
+
+    for key in sorted(base_index.keys() | head_index.keys(), key=lambda k: tuple(map(str, k))):
+        before, after = base_index.get(key), head_index.get(key)
+        if before is not None and after is not None:
+            same = before == after if key[0] == "local" else before.canonical() == after.canonical()
+            if same:
+                continue
+        kind = key[0]
+        if kind == "resource":
+            resource_type, name = key[1], key[2]
+            address = f"{resource_type}.{name}" if not directory else None
+            target = prefix + f"{resource_type}.{name}"
+            changed.add(f"{resource_type}.{name}")
+            if before is None:
+                results["create"].append(ResourceChange(resource_type, name, {}, address=address))
+            elif after is None:
+                results["delete"].append(ResourceChange(resource_type, name, {}, address=address))
+                _needs_plan(needs_plan, "resource-deleted", target, "resource block removed")
+            else:
+                updates[key] = ResourceChange(resource_type, name, _block_changes(before, after), address=address)
+        elif kind == "variable":
+            if before is None or after is None or before.attributes.get("default") != after.attributes.get("default"):
+                changed_symbols.add(f"var.{key[1]}")
+        elif kind == "local":
+            changed_symbols.add(f"local.{key[1]}")
+        elif kind == "output":
+            state = "added" if before is None else "removed" if after is None else "modified"
+            results["outputs"][state].append(prefix + key[1])
+        elif kind == "data":
+            changed_symbols.add(f"data.{key[1]}.{key[2]}")
+            changed.add(f"data.{key[1]}.{key[2]}")
+            _needs_plan(needs_plan, "data-source-changed", prefix + f"data.{key[1]}.{key[2]}", "data source changed")
+        elif kind == "module":
+            changed_symbols.add(f"module.{key[1]}")
+            changed.add(f"module.{key[1]}")
+            _needs_plan(needs_plan, "module-changed", prefix + f"module.{key[1]}", "module call changed")
+        elif not any(item["rule"] == "configuration-block" and item["target"] == prefix + kind for item in needs_plan):
+            # A changed block shows up as one removed and one added key
+            _needs_plan(needs_plan, "configuration-block", prefix + kind, f"{kind} block changed")
+
+    # Follow changed variable defaults and locals through locals to their users
+    head_values = _symbol_values(head_index)
+    base_values = _symbol_values(base_index)
+    propagated = True
+    while propagated:
+        propagated = False
+        for symbol, value in head_values.items():
+            if symbol.startswith("local.") and symbol not in changed_symbols and references(value or "") & changed_symbols:
+                changed_symbols.add(symbol)
+                propagated = True
+
+    if changed_symbols:
+        for key, block in head_index.items():
+            if key[0] not in ("resource", "data", "module", "output") or key not in base_index:
+                continue
+            kind = key[0]
+            label = ".".join(key[1:]) if kind == "resource" else f"{kind}.{'.'.join(key[1:])}"
+            for name, expression in block.attributes.items():
+                via = references(expression) & changed_symbols
+                if not via:
+                    continue
+                if kind in ("module", "data"):
+                    changed.add(label)
+                if kind == "module":
+                    _needs_plan(needs_plan, "module-changed", prefix + label, f"input {name} uses {', '.join(sorted(via))}")
+                elif kind == "data":
+                    _needs_plan(needs_plan, "data-source-changed", prefix + label, f"{name} uses {', '.join(sorted(via))}")
+                elif kind == "output":
+                    if prefix + key[1] not in results["outputs"]["modified"]:
+                        results["outputs"]["modified"].append(prefix + key[1])
+                else:
+                    update = updates.get(key)
+                    if update is None:
+                        address = label if not directory else None
+                        update = updates[key] = ResourceChange(key[1], key[2], {}, address=address)
+                    change = {
+                        "before": literal(_substitute(expression, via, base_values)),
+                        "after": literal(_substitute(expression, via, head_values))
+                    }
+                    if change["before"] == change["after"]:
+                        change["via"] = sorted(via)
+                    update.details.setdefault(name, change)
+
+    for key, update in sorted(updates.items(), key=lambda item: tuple(map(str, item[0]))):
+        target = prefix + f"{key[1]}.{key[2]}"
+        changed.add(f"{key[1]}.{key[2]}")
+        results["update"].append(update)
+        meta = sorted(name for name in update.details if name in _META_ARGUMENTS or name in _META_BLOCKS)
+        if meta:
+            _needs_plan(needs_plan, "meta-argument", target, f"{', '.join(meta)} changed")
+        unsafe = sorted(name for name in update.details if name not in SAFE_UPDATE_ATTRIBUTES and name not in meta)
+        if unsafe:
+            _needs_plan(needs_plan, "attribute-may-replace", target, f"{', '.join(unsafe)} changed")
+    return changed
+
+
+def empty_results():
+    return {
+        "create": [],
+        "update": [],
+        "replace": [],
+        "delete": [],
+        "outputs": {"added": [], "modified": [], "removed": []},
+        "needs_plan": [],
+        "targets": [],
+        "files": {},
+        "mode": "static"
+    }
+
+
+def _record_files(files, blocks, path):
+    """Map the addresses of the resource blocks among blocks to path (the first file seen wins)"""
+    for block in blocks:
+        if block.type == "resource" and len(block.labels) == 2:
+            files.setdefault(".".join(block.labels), path)
+
+
+def analyse_configuration(changed_files, base_texts, head_texts, sibling_texts=None):
+    """
+    Derive resource-level changes from the base and head versions of changed `.tf` files
+
+    Args:
+        changed_files: Changed `.tf` paths, relative to the configuration root
+        base_texts: {path: text or None (new file)} at the base revision
+        head_texts: {path: text or None (deleted file)} in the working tree
+        sibling_texts: {path: text} of unchanged `.tf` files in the same
+            directories; they are identical on both sides but their blocks can
+            reference changed variables and locals
+
+    Returns:
+        plan_results-shaped dict with "create", "update", "delete" (and an empty
+        "replace"), plus "outputs" changes, "needs_plan" [{"rule", "target",
+        "reason"}], "mode": "static", "targets": the root-module addresses
+        of the changed blocks and their direct dependents, or None when the
+        changes cannot be scoped to addresses, and "files": {root-module
+        resource address: file declaring it} for the parsed files
+    """
+    results = empty_results()
+    targets = set()
+    directories = {}
+    for path in changed_files:
+        directories.setdefault(os.path.dirname(path), []).append(path)
+    siblings = {}
+    for path, text in (sibling_texts or {}).items():
+        siblings.setdefault(os.path.dirname(path), []).append((path, text))
+
+    for directory in sorted(directories):
+        base_blocks, head_blocks = [], []
+        try:
+            for path in directories[directory]:
+                base_file = parse_hcl(base_texts.get(path) or "")
+                head_file = parse_hcl(head_texts.get(path) or "")
+                base_blocks += base_file
+                head_blocks += head_file
+                if not directory:
+                    _record_files(results["files"], head_file + base_file, path)
+            for path, text in siblings.get(directory, []):
+                blocks = parse_hcl(text)
+                base_blocks += blocks
+                head_blocks += blocks
+                if not directory:
+                    _record_files(results["files"], blocks, path)
+        except HCLSyntaxError as e:
+            _needs_plan(results["needs_plan"], "parse-error", directory or ".", str(e))
+            continue
+        head_index = index_blocks(head_blocks)
+        changed = compare_module(directory, index_blocks(base_blocks), head_index, results)
+        if not directory:
+            targets |= changed | direct_dependents(head_index, changed)
+
+    # Changes outside the root module, and configuration-wide ones, cannot be
+    # mapped to -target addresses
+    untargetable = any(directories) or any(
+        item["rule"] in UNTARGETABLE_RULES for item in results["needs_plan"]
+    )
+    results["targets"] = None if untargetable else sorted(targets)
+    return results
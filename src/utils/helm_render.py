@@ -0,0 +1,152 @@
+"""
+Rendering Helm charts at a git revision, with an on-disk render cache.
+
+Renders are keyed by the chart's contents (the git tree hash at a revision,
+or a hash of the files in the working tree) and the helm version, so the
+base-revision render of a chart is almost always a cache hit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+from collections import OrderedDict
+
+from src.utils.cluster_snapshot import object_key
+from src.utils.git_blobs import blob_reader
+from src.utils.process_runner import hash_paths, require_complete, run_command, tool_version
+
+# Size bound of the in-process render cache; the least recently used renders are dropped beyond it
+DEFAULT_RENDER_CACHE_BYTES = 64 * 1024 * 1024
+
+_renders = OrderedDict()
+_renders_bytes = 0
+_renders_lock = threading.Lock()
+
+
+def _render_key(repo_path, chart, revision):
+    if revision is None:
+        contents = "files:" + hash_paths([chart], repo_path)
+    else:
+        tree = blob_reader(repo_path).object_id(chart, revision)
+        if tree is None:
+            raise subprocess.CalledProcessError(128, ["git", "cat-file", f"{revision}:{chart}"], "", f"{chart} not found at {revision}")
+        contents = "tree:" + tree
+    payload = json.dumps({"contents": contents, "helm": tool_version("helm")}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_path(key):
+    cache_dir = os.environ.get("MIGRATERATOR_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, "helm-renders", key[:2], f"{key}.yaml")
+
+
+def _remember(key, rendered):
+    """Keep a render in process, evicting the least recently used ones"""
+    global _renders_bytes
+    limit = int(os.environ.get("MIGRATERATOR_HELM_CACHE_BYTES", DEFAULT_RENDER_CACHE_BYTES))
+    with _renders_lock:
+        previous = _renders.pop(key, None)
+        if previous is not None:
+            _renders_bytes -= len(previous)
+        _renders[key] = rendered
+        _renders_bytes += len(rendered)
+        while _renders_bytes > limit and len(_renders) > 1:
+            _, evicted = _renders.popitem(last=False)
+            _renders_bytes -= len(evicted)
+
+
+def _load(key):
+    with _renders_lock:
+        if key in _renders:
+            _renders.move_to_end(key)
+            return _renders[key]
+    path = _cache_path(key)
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                rendered = f.read()
+        except OSError:
+            return None
+        _remember(key, rendered)
+        return rendered
+    return None
+
+
+def _store(key, rendered):
+    """Cache a render in process and on disk; a failed disk write only costs a later miss"""
+    _remember(key, rendered)
+    path = _cache_path(key)
+    if not path:
+        return
+    # A unique temporary file per write: jobs rendering the same chart may finish together
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            f.write(rendered)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache Helm render: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def render_chart(repo_path, chart, revision=None):
+    """
+    Return the `helm template` output for a chart, from the cache when possible
+
+    Args:
+        repo_path: Repository containing the chart
+        chart: Chart directory relative to repo_path
+        revision: Git revision to render the chart at (None = the working tree)
+
+    Raises:
+        subprocess.SubprocessError, OSError: git or helm failed
+    """
+    key = _render_key(repo_path, chart, revision)
+    rendered = _load(key)
+    if rendered is not None:
+        return rendered
+
+    if revision is None:
+        rendered = require_complete(run_command(["helm", "template", chart], cwd=repo_path, check=True)).stdout
+    else:
+        export_dir = tempfile.mkdtemp(prefix="migraterator-chart-")
+        try:
+            archive = os.path.join(export_dir, "chart.tar")
+            run_command(["git", "archive", "--format=tar", "-o", archive, revision, "--", chart], cwd=repo_path, check=True)
+            with tarfile.open(archive) as tar:
+                # Archives come from the repository itself; use the safe filter where available
+                tar.extractall(export_dir, **({"filter": "data"} if hasattr(tarfile, "data_filter") else {}))
+            rendered = require_complete(run_command(["helm", "template", chart], cwd=export_dir, check=True)).stdout
+        finally:
+            shutil.rmtree(export_dir, ignore_errors=True)
+
+    _store(key, rendered)
+    return rendered
+
+
+def chart_exists(repo_path, chart, revision):
+    """Return whether the chart directory exists at a git revision"""
+    try:
+        return blob_reader(repo_path).object_id(chart, revision) is not None
+    except (subprocess.SubprocessError, OSError):
+        return False
+
+
+def parse_render(rendered):
+    """Return {(kind, namespace, name): object} for rendered multi-document YAML"""
+    import yaml
+
+    objects = {}
+    for doc in yaml.load_all(rendered, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+        if isinstance(doc, dict):
+            objects[object_key(doc)] = doc
+    return objects
@@ -0,0 +1,36 @@
+import threading
+
+# Connections kept per host; enough for the worker pool plus hedged LLM attempts
+POOL_CONNECTIONS = 32
+
+_session = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide requests.Session
+
+    Sessions keep connections to GitHub and the LLM APIs alive between calls,
+    which matters for long-running processes (the analysis server, batch runs)
+    that talk to the same hosts for every job. Stages and LLM attempts run on
+    short-lived threads, so the session is shared by all threads rather than
+    kept per thread; urllib3's connection pool is thread-safe, and callers
+    pass their headers per request instead of changing the session. requests
+    is imported on first use to keep CLI startup fast.
+    """
+    global _session
+    session = _session
+    if session is None:
+        with _lock:
+            if _session is None:
+                import requests
+
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                                        pool_maxsize=POOL_CONNECTIONS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+            session = _session
+    return session
@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def _peak_rss_kb():
+    """Return (self, children) peak resident set size in KiB, or (None, None)"""
+    if resource is None:
+        return None, None
+    scale = 1024 if sys.platform == "darwin" else 1  # macOS reports bytes
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    return own, children
+
+
+class Span:
+    """A single timed operation; ``args`` can be filled in while the span is open"""
+
+    __slots__ = ("name", "category", "start", "duration", "thread_id", "args")
+
+    def __init__(self, name, category, start, args):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = None
+        self.thread_id = threading.get_ident()
+        self.args = args
+
+
+class Tracer:
+    """
+    Collects spans for pipeline stages, subprocesses, HTTP and LLM calls.
+
+    The trace is written in the Chrome trace event format, so it can be opened
+    in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, max_spans=100000):
+        # Bounded so that long-running processes (the server) don't grow forever
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=max_spans)
+
+    def reset(self):
+        with self._lock:
+            self._origin = time.perf_counter()
+            self.spans = deque(maxlen=self.spans.maxlen)
+
+    @contextmanager
+    def span(self, name, category="stage", **args):
+        """
+        Time the enclosed block
+
+        Args:
+            name: Span name (e.g. "terraform plan")
+            category: One of "stage", "subprocess", "http" or "llm"
+            **args: Extra attributes recorded with the span
+        """
+        record = Span(name, category, time.perf_counter(), args)
+        try:
+            yield record
+        except BaseException as e:
+            record.args.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            record.duration = time.perf_counter() - record.start
+            own, children = _peak_rss_kb()
+            if own is not None:
+                record.args["peak_rss_kb"] = own
+                record.args["children_peak_rss_kb"] = children
+            with self._lock:
+                self.spans.append(record)
+
+    def to_chrome_trace(self):
+        """Return the recorded spans as a Chrome trace JSON object"""
+        pid = os.getpid()
+        events = []
+        for record in sorted(self.spans, key=lambda s: s.start):
+            events.append({
+                "name": record.name,
+                "cat": record.category,
+                "ph": "X",
+                "ts": round((record.start - self._origin) * 1e6),
+                "dur": round(record.duration * 1e6),
+                "pid": pid,
+                "tid": record.thread_id,
+                "args": record.args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """Write the trace to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+    def summary(self):
+        """Return a plain-text table of total wall time per span, slowest first"""
+        totals = {}
+        for record in self.spans:
+            key = (record.category, record.name)
+            count, total, tokens = totals.get(key, (0, 0.0, 0))
+            totals[key] = (
+                count + 1,
+                total + record.duration,
+                tokens + record.args.get("total_tokens", 0)
+            )
+
+        lines = [f"{'category':<12} {'name':<40} {'calls':>5} {'seconds':>9} {'tokens':>8}"]
+        for (category, name), (count, total, tokens) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{category:<12} {name[:40]:<40} {count:>5} {total:>9.3f} {tokens or '':>8}")
+
+        own, children = _peak_rss_kb()
+        if own is not None:
+            lines.append(f"peak RSS: {own / 1024:.1f} MiB (children: {children / 1024:.1f} MiB)")
+        return "\n".join(lines)
+
+
+# Process-wide tracer used by every component
+tracer = Tracer()
+
@@ -1,16 +1,26 @@
 import os
-import requests
 import json
+import hashlib
+import tempfile
+from src.utils.http_session import get_session
+from src.utils.instrumentation import tracer
+
+# Seconds an LLM API request may wait for a connection or for data (LLM_TIMEOUT overrides)
+DEFAULT_TIMEOUT = 120
 
 class LLMClient:
-    def __init__(self, api_key=None, provider=None):
+    def __init__(self, api_key=None, provider=None, model=None, api_url=None, timeout=None):
         """
         Initialize the LLM client
         
         Args:
             api_key: API key for the LLM service (defaults to environment variable)
             provider: LLM provider to use ('openai' or 'gemini', defaults to environment variable)
+            model: Model name (defaults to LLM_MODEL, then the provider's default)
+            api_url: API endpoint (defaults to LLM_API_URL, then the provider's public API)
+            timeout: Request timeout in seconds (defaults to LLM_TIMEOUT, then DEFAULT_TIMEOUT)
         """
+        self.timeout = timeout or float(os.environ.get("LLM_TIMEOUT", DEFAULT_TIMEOUT))
         self.api_key = api_key or os.environ.get("LLM_API_KEY")
         if not self.api_key:
             raise ValueError("LLM API key is required")
@@ -19,33 +29,89 @@ class LLMClient:
         self.provider = provider or os.environ.get("LLM_PROVIDER", "openai").lower()
         
         if self.provider == "openai":
-            self.api_url = os.environ.get("LLM_API_URL", "https://api.openai.com/v1/chat/completions")
-            self.model = os.environ.get("LLM_MODEL", "gpt-4")
+            self.api_url = api_url or os.environ.get("LLM_API_URL", "https://api.openai.com/v1/chat/completions")
+            self.model = model or os.environ.get("LLM_MODEL", "gpt-4")
         elif self.provider == "gemini":
-            self.api_url = os.environ.get("LLM_API_URL", "https://generativelanguage.googleapis.com/v1beta/models")
-            self.model = os.environ.get("LLM_MODEL", "gemini-pro")
+            self.api_url = api_url or os.environ.get("LLM_API_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+            self.model = model or os.environ.get("LLM_MODEL", "gemini-pro")
         else:
             raise ValueError(f"Unsupported LLM provider: {self.provider}. Use 'openai' or 'gemini'.")
     
-    def generate_text(self, prompt, max_tokens=1500):
+    def generate_text(self, prompt, max_tokens=1500, usage=None, timeout=None):
         """
         Generate text using the LLM
         
         Args:
             prompt: The prompt to send to the LLM
             max_tokens: Maximum number of tokens to generate
+            usage: Optional dict that receives the call's token counts
+            timeout: Request timeout in seconds for this call (defaults to the client's)
             
         Returns:
             Generated text
         """
-        if self.provider == "openai":
-            return self._generate_text_openai(prompt, max_tokens)
-        elif self.provider == "gemini":
-            return self._generate_text_gemini(prompt, max_tokens)
-        else:
-            raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        cache_path = self._cache_path(prompt, max_tokens)
+        cached = self._load_cached(cache_path) if cache_path else None
+        if cached is not None:
+            with tracer.span(f"{self.provider}:{self.model}", category="llm", cached=True):
+                if usage is not None:
+                    usage["cached"] = True
+                return cached
+        
+        with tracer.span(f"{self.provider}:{self.model}", category="llm",
+                         provider=self.provider, model=self.model, prompt_chars=len(prompt)) as span:
+            timeout = timeout or self.timeout
+            if self.provider == "openai":
+                text = self._generate_text_openai(prompt, max_tokens, span, timeout)
+            elif self.provider == "gemini":
+                text = self._generate_text_gemini(prompt, max_tokens, span, timeout)
+            else:
+                raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        
+        if usage is not None:
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                usage[key] = span.args.get(key, 0)
+        
+        if cache_path:
+            self._store_cached(cache_path, text)
+        return text
+    
+    @staticmethod
+    def _load_cached(cache_path):
+        """Return the cached response text, or None when there is no readable entry"""
+        try:
+            with open(cache_path) as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _store_cached(self, cache_path, text):
+        """Write a response to the cache; failures only cost a later cache miss"""
+        # A unique temporary file per write: hedged attempts of the same prompt
+        # run on several threads of one process and may finish together
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"model": self.model, "text": text}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache LLM response: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    def _cache_path(self, prompt, max_tokens):
+        """Response cache file for a prompt, when MIGRATERATOR_CACHE_DIR is set"""
+        cache_dir = os.environ.get("MIGRATERATOR_CACHE_DIR")
+        if not cache_dir or os.environ.get("MIGRATERATOR_NO_LLM_CACHE"):
+            return None
+        key = hashlib.sha256(
+            json.dumps([self.provider, self.api_url, self.model, max_tokens, prompt]).encode()
+        ).hexdigest()
+        return os.path.join(cache_dir, "llm", key[:2], f"{key}.json")
     
-    def _generate_text_openai(self, prompt, max_tokens):
+    def _generate_text_openai(self, prompt, max_tokens, span=None, timeout=None):
         """Generate text using OpenAI API"""
         headers = {
             "Content-Type": "application/json",
@@ -62,13 +128,18 @@ class LLMClient:
             "temperature": 0.2  # apparently that gives more factual responses
         }
         
-        response = requests.post(self.api_url, headers=headers, json=data)
+        response = get_session().post(self.api_url, headers=headers, json=data, timeout=timeout or self.timeout)
         response.raise_for_status()
         
         result = response.json()
+        if span is not None:
+            usage = result.get("usage", {})
+            span.args["prompt_tokens"] = usage.get("prompt_tokens", 0)
+            span.args["completion_tokens"] = usage.get("completion_tokens", 0)
+            span.args["total_tokens"] = usage.get("total_tokens", 0)
         return result["choices"][0]["message"]["content"]
     
-    def _generate_text_gemini(self, prompt, max_tokens):
+    def _generate_text_gemini(self, prompt, max_tokens, span=None, timeout=None):
         """Generate text using Google's Gemini API"""
         # Construct the full URL with the model and API key
         full_url = f"{self.api_url}/{self.model}:generateContent?key={self.api_key}"
@@ -96,10 +167,15 @@ class LLMClient:
             }
         }
         
-        response = requests.post(full_url, headers=headers, json=data)
+        response = get_session().post(full_url, headers=headers, json=data, timeout=timeout or self.timeout)
         response.raise_for_status()
         
         result = response.json()
+        if span is not None:
+            usage = result.get("usageMetadata", {})
+            span.args["prompt_tokens"] = usage.get("promptTokenCount", 0)
+            span.args["completion_tokens"] = usage.get("candidatesTokenCount", 0)
+            span.args["total_tokens"] = usage.get("totalTokenCount", 0)
         
         # Extract the generated text from Gemini's response format
         try:
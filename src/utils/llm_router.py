@@ -0,0 +1,351 @@
+"""
+Routing LLM requests to model tiers, with a latency-SLO fallback and hedging.
+
+Routes are configured with MIGRATERATOR_LLM_ROUTES, either a path to a JSON
+file or the JSON itself. Tiers are listed from cheapest to most capable:
+
+    {"tiers": [
+        {"name": "small", "max_prompt_chars": 8000, "max_risk": "medium",
+         "slo_seconds": 15, "hedge_after": 5, "timeout_seconds": 30,
+         "endpoints": [
+             {"provider": "openai", "model": "gpt-4o-mini",
+              "prompt_cost_per_1k": 0.00015, "completion_cost_per_1k": 0.0006},
+             {"provider": "gemini", "model": "gemini-1.5-flash", "api_key_env": "GEMINI_API_KEY"}]},
+        {"name": "large", "slo_seconds": 60,
+         "endpoints": [{"provider": "openai", "model": "gpt-4"},
+                       {"provider": "gemini", "model": "gemini-pro", "api_key_env": "GEMINI_API_KEY"}]}
+    ]}
+
+A prompt goes to the first tier whose size and risk limits it fits (the last
+tier takes everything else). Within a tier the first endpoint is the primary.
+When it has not answered within `slo_seconds`, or fails, the request is also
+sent to the next endpoint; with `hedge_after`, a duplicate of the primary
+request is sent after that many seconds. The first answer wins and slower
+attempts finish in the background.
+
+Each request to an endpoint times out after `timeout_seconds` (default: the
+SLO times the number of endpoints, so the last fallback still gets a full
+SLO), and a tier gives up once its last attempt could have timed out.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from src.models import SEVERITY_RANK
+from src.utils.instrumentation import tracer
+from src.utils.llm_client import LLMClient
+
+# Latencies kept per tier for the percentiles in metrics()
+LATENCY_SAMPLES = 1000
+
+# Extra wait past the last attempt's request timeout, for work outside the
+# HTTP call (e.g. the first request importing requests on a busy machine)
+TIMEOUT_GRACE_SECONDS = 1.0
+
+
+class Endpoint:
+    """
+    One provider/model an LLM request can be sent to
+
+    Args:
+        client: LLMClient for the provider and model
+        prompt_cost_per_1k: Price of 1,000 prompt tokens
+        completion_cost_per_1k: Price of 1,000 completion tokens
+    """
+
+    def __init__(self, client, prompt_cost_per_1k=0.0, completion_cost_per_1k=0.0):
+        self.client = client
+        self.prompt_cost_per_1k = prompt_cost_per_1k
+        self.completion_cost_per_1k = completion_cost_per_1k
+
+    @property
+    def label(self):
+        return f"{self.client.provider}:{self.client.model}"
+
+    def cost(self, usage):
+        return (usage.get("prompt_tokens", 0) * self.prompt_cost_per_1k
+                + usage.get("completion_tokens", 0) * self.completion_cost_per_1k) / 1000
+
+    @classmethod
+    def from_config(cls, config):
+        client = LLMClient(
+            api_key=os.environ.get(config.get("api_key_env", "LLM_API_KEY")),
+            provider=config.get("provider"),
+            model=config.get("model"),
+            api_url=config.get("api_url")
+        )
+        return cls(client, config.get("prompt_cost_per_1k", 0.0), config.get("completion_cost_per_1k", 0.0))
+
+
+class TierMetrics:
+    """Request counts, latency and token/cost totals of one tier"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.wins = {}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self._lock = threading.Lock()
+
+    def record_usage(self, endpoint, usage):
+        with self._lock:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cost += endpoint.cost(usage)
+
+    def record_request(self, latency, winner=None, kind=None, fallbacks=0, hedges=0):
+        with self._lock:
+            self.requests += 1
+            self.fallbacks += fallbacks
+            self.hedges += hedges
+            if winner is None:
+                self.failures += 1
+                return
+            self.latencies.append(latency)
+            self.wins[winner] = self.wins.get(winner, 0) + 1
+            if kind == "hedge":
+                self.hedge_wins += 1
+
+    def to_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "fallbacks": self.fallbacks,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "wins": dict(self.wins),
+                "latency_p50": percentile(0.5),
+                "latency_p95": percentile(0.95),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost": round(self.cost, 6)
+            }
+
+
+class Tier:
+    """
+    A group of interchangeable endpoints, tried in order
+
+    Args:
+        name: Tier name used in metrics and traces
+        endpoints: Endpoints, primary first
+        max_prompt_chars: Largest prompt this tier takes (None = no limit)
+        max_risk: Highest overall risk level this tier takes (None = any)
+        slo_seconds: Wait before also asking the next endpoint (None = only on failure)
+        hedge_after: Wait before sending a duplicate request to the primary (None = never)
+        timeout_seconds: Timeout of each request to an endpoint (defaults to
+            slo_seconds times the number of endpoints, or the clients' own timeout)
+    """
+
+    def __init__(self, name, endpoints, max_prompt_chars=None, max_risk=None, slo_seconds=None, hedge_after=None,
+                 timeout_seconds=None):
+        if not endpoints:
+            raise ValueError(f"LLM tier {name!r} has no endpoints")
+        if max_risk is not None and max_risk not in SEVERITY_RANK:
+            raise ValueError(f"LLM tier {name!r} has unknown max_risk {max_risk!r}")
+        self.name = name
+        self.endpoints = endpoints
+        self.max_prompt_chars = max_prompt_chars
+        self.max_risk = max_risk
+        self.slo_seconds = slo_seconds
+        self.hedge_after = hedge_after
+        if timeout_seconds is None and slo_seconds is not None:
+            timeout_seconds = slo_seconds * len(endpoints)
+        self.timeout_seconds = timeout_seconds
+        self.metrics = TierMetrics()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config["name"],
+            [Endpoint.from_config(endpoint) for endpoint in config.get("endpoints", [])],
+            max_prompt_chars=config.get("max_prompt_chars"),
+            max_risk=config.get("max_risk"),
+            slo_seconds=config.get("slo_seconds"),
+            hedge_after=config.get("hedge_after"),
+            timeout_seconds=config.get("timeout_seconds")
+        )
+
+    def accepts(self, prompt_chars, risk_level):
+        if self.max_prompt_chars is not None and prompt_chars > self.max_prompt_chars:
+            return False
+        if self.max_risk is not None and SEVERITY_RANK.get(risk_level, 0) > SEVERITY_RANK[self.max_risk]:
+            return False
+        return True
+
+    def _schedule(self):
+        """Return the (delay, endpoint index, kind) launches after the primary, earliest first"""
+        schedule = []
+        if self.hedge_after is not None:
+            schedule.append((self.hedge_after, 0, "hedge"))
+        if self.slo_seconds is not None:
+            schedule.extend((self.slo_seconds * i, i, "fallback") for i in range(1, len(self.endpoints)))
+        return sorted(schedule)
+
+    def _attempt(self, endpoint, prompt, max_tokens, attempt, results):
+        usage = {}
+        try:
+            text = endpoint.client.generate_text(prompt, max_tokens, usage=usage, timeout=self.timeout_seconds)
+        except Exception as e:
+            results.put((attempt, None, e))
+            return
+        self.metrics.record_usage(endpoint, usage)
+        results.put((attempt, text, None))
+
+    def generate_text(self, prompt, max_tokens=1500, span=None):
+        """
+        Send a prompt to the tier's endpoints and return the first answer
+
+        Raises:
+            The last attempt's exception when every endpoint failed
+            TimeoutError: No attempt answered before the last one could have timed out
+        """
+        start = time.perf_counter()
+        schedule = self._schedule()
+        # Request timeouts bound each read rather than the whole response, so
+        # the tier also stops waiting once the last attempt should have ended
+        request_timeout = self.timeout_seconds or max(endpoint.client.timeout for endpoint in self.endpoints)
+        give_up_at = (schedule[-1][0] if schedule else 0.0) + request_timeout + TIMEOUT_GRACE_SECONDS
+        results = queue.Queue()
+        attempts = []
+
+        def launch(index, kind):
+            attempts.append((index, kind))
+            threading.Thread(
+                target=self._attempt,
+                args=(self.endpoints[index], prompt, max_tokens, len(attempts) - 1, results),
+                # Losing attempts must not keep the process alive
+                daemon=True
+            ).start()
+
+        def counts():
+            kinds = [kind for _, kind in attempts]
+            return {"fallbacks": kinds.count("fallback"), "hedges": kinds.count("hedge")}
+
+        launch(0, "primary")
+        running = 1
+        error = None
+        while True:
+            elapsed = time.perf_counter() - start
+            timeout = max(0.0, (schedule[0][0] if schedule else give_up_at) - elapsed)
+            try:
+                attempt, text, attempt_error = results.get(timeout=timeout)
+            except queue.Empty:
+                if not schedule:
+                    self.metrics.record_request(time.perf_counter() - start, **counts())
+                    raise TimeoutError(f"LLM tier {self.name!r} got no answer within {give_up_at:.1f}s")
+                _, index, kind = schedule.pop(0)
+                launch(index, kind)
+                running += 1
+                continue
+
+            running -= 1
+            if attempt_error is None:
+                index, kind = attempts[attempt]
+                winner = self.endpoints[index].label
+                self.metrics.record_request(time.perf_counter() - start, winner, kind, **counts())
+                if span is not None:
+                    span.args.update(endpoint=winner, attempt=kind, attempts=len(attempts))
+                return text
+
+            error = attempt_error
+            if running == 0:
+                # Everything sent so far failed: ask the next endpoint now instead of waiting
+                launched = {index for index, _ in attempts}
+                untried = [index for index in range(1, len(self.endpoints)) if index not in launched]
+                if not untried:
+                    self.metrics.record_request(time.perf_counter() - start, **counts())
+                    raise error
+                schedule = [entry for entry in schedule if entry[1:] != (untried[0], "fallback")]
+                launch(untried[0], "fallback")
+                running += 1
+
+
+class LLMRouter:
+    """
+    Sends each prompt to a model tier chosen by prompt size and risk level
+
+    Accepts the same generate_text() calls as LLMClient, plus the risk level.
+
+    Args:
+        tiers: Tiers from cheapest to most capable
+    """
+
+    def __init__(self, tiers):
+        if not tiers:
+            raise ValueError("LLM routes need at least one tier")
+        self.tiers = tiers
+
+    @classmethod
+    def from_config(cls, config):
+        return cls([Tier.from_config(tier) for tier in config.get("tiers", [])])
+
+    @classmethod
+    def from_env(cls):
+        """Build the router from MIGRATERATOR_LLM_ROUTES (a JSON file or inline JSON), or return None"""
+        value = os.environ.get("MIGRATERATOR_LLM_ROUTES")
+        if not value:
+            return None
+        if value.lstrip().startswith("{"):
+            return cls.from_config(json.loads(value))
+        with open(value) as f:
+            return cls.from_config(json.load(f))
+
+    def select_tier(self, prompt_chars, risk_level=None):
+        """Return the first tier that accepts the prompt size and risk level, or the last tier"""
+        for tier in self.tiers:
+            if tier.accepts(prompt_chars, risk_level):
+                return tier
+        return self.tiers[-1]
+
+    def generate_text(self, prompt, max_tokens=1500, risk_level=None):
+        """
+        Generate text on the tier selected for the prompt
+
+        Args:
+            prompt: The prompt to send to the LLM
+            max_tokens: Maximum number of tokens to generate
+            risk_level: Overall risk of the change ("low" ... "critical"), if known
+
+        Returns:
+            Generated text
+        """
+        tier = self.select_tier(len(prompt), risk_level)
+        with tracer.span(f"llm route:{tier.name}", category="llm", tier=tier.name,
+                         risk_level=risk_level, prompt_chars=len(prompt)) as span:
+            return tier.generate_text(prompt, max_tokens, span)
+
+    def metrics(self):
+        """Return per-tier request, latency, token and cost metrics"""
+        return {tier.name: tier.metrics.to_dict() for tier in self.tiers}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_router():
+    """Return the process-wide router for MIGRATERATOR_LLM_ROUTES (None when unset), keeping metrics across jobs"""
+    global _shared
+    value = os.environ.get("MIGRATERATOR_LLM_ROUTES")
+    with _shared_lock:
+        if not value:
+            return None
+        if _shared is None or _shared[0] != value:
+            _shared = (value, LLMRouter.from_env())
+        return _shared[1]
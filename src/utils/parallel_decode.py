@@ -0,0 +1,96 @@
+"""
+Decoding very large command outputs on several cores.
+
+`kubectl diff` outputs (and the diffs of Helm renders and cluster snapshots)
+are classified line by line in pure Python, which keeps one core busy for
+tens of seconds on the largest changes. map_chunks() splits such an output
+on line boundaries and runs a decoder over the chunks on a shared process
+pool; the results come back in the original order, each with the offset of
+its chunk so offsets can be shifted back into the whole output (see
+LineTable.extend_offsets).
+
+Outputs below MIGRATERATOR_PARALLEL_DECODE_BYTES, or with a single worker
+(MIGRATERATOR_DECODE_WORKERS), are decoded in-process as one chunk.
+"""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many characters the pool's start-up and pickling cost more than they save
+DEFAULT_THRESHOLD = 8 * 1024 * 1024
+
+# Chunks per worker, so one slow chunk does not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def decode_workers():
+    """Return the number of decode processes (MIGRATERATOR_DECODE_WORKERS, default: one per core)"""
+    return max(1, int(os.environ.get("MIGRATERATOR_DECODE_WORKERS", os.cpu_count() or 1)))
+
+
+def _executor(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def shutdown():
+    """Stop the decode processes"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def split_lines(text, count):
+    """Return up to `count` (start, end) ranges covering text, each ending after a newline (except the last)"""
+    ranges = []
+    start = 0
+    length = len(text)
+    for i in range(1, count):
+        end = text.find("\n", max(start, length * i // count))
+        if end == -1:
+            break
+        ranges.append((start, end + 1))
+        start = end + 1
+    ranges.append((start, length))
+    return [(start, end) for start, end in ranges if start < end] or [(0, length)]
+
+
+def map_chunks(decode, text, threshold=None):
+    """
+    Run decode(chunk) over line-aligned chunks of text, in parallel for large texts
+
+    Args:
+        decode: Module-level function (it is pickled by name) taking a string
+            of whole lines; offsets in its result are relative to the chunk
+        text: The whole output
+        threshold: Size above which chunks are decoded on the process pool
+            (defaults to MIGRATERATOR_PARALLEL_DECODE_BYTES)
+
+    Returns:
+        [(chunk offset in text, decode(chunk))] in text order
+    """
+    if threshold is None:
+        threshold = int(os.environ.get("MIGRATERATOR_PARALLEL_DECODE_BYTES", DEFAULT_THRESHOLD))
+    workers = decode_workers()
+    if workers == 1 or len(text) <= threshold:
+        return [(0, decode(text))]
+
+    ranges = split_lines(text, workers * CHUNKS_PER_WORKER)
+    if len(ranges) == 1:
+        return [(0, decode(text))]
+    futures = [_executor(workers).submit(decode, text[start:end]) for start, end in ranges]
+    return [(start, future.result()) for (start, _), future in zip(ranges, futures)]
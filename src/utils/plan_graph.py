@@ -0,0 +1,302 @@
+"""
+Resource dependency graph built from `terraform show -json` output.
+
+Nodes are configuration-level resource addresses (`module.db.aws_db_instance.main`);
+every planned or existing instance (`...main[0]`) maps onto its resource node.
+Edges point from a resource to the resources that depend on it, taken from
+configuration references, `depends_on` and the dependencies recorded in state.
+
+Adjacency is stored in compressed sparse row form (an offsets array and a flat
+targets array), so graphs with tens of thousands of nodes stay compact and a
+traversal is linear in the number of nodes and edges reached.
+"""
+import re
+from array import array
+from collections import deque
+
+_INDEX = re.compile(r"\[[^\]]*\]")
+
+# Reference prefixes that never name a resource
+_NON_RESOURCE_REFERENCES = frozenset(["var", "local", "path", "terraform", "count", "each", "self"])
+
+# Cap on dependent addresses listed per blast radius; counts are always exact
+MAX_LISTED_DEPENDENTS = 50
+
+
+def resource_address(instance_address):
+    """Strip instance keys: module.a["x"].aws_instance.web[0] -> module.a.aws_instance.web"""
+    return _INDEX.sub("", instance_address) if "[" in instance_address else instance_address
+
+
+def _join(module_path, address):
+    return f"{module_path}.{address}" if module_path else address
+
+
+def _expression_references(value, found):
+    """Collect every "references" list in a (nested) configuration expression"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "references":
+                if isinstance(item, list):
+                    found.extend(item)
+            elif isinstance(item, (dict, list)):
+                _expression_references(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, (dict, list)):
+                _expression_references(item, found)
+    return found
+
+
+class PlanGraph:
+    """
+    Dependents graph over resource addresses
+
+    Args:
+        addresses: Node addresses, in index order
+        sources: array of dependency node indexes, one per edge
+        targets: array of dependent node indexes, one per edge
+        synthetic: Indexes of helper nodes (module inputs/outputs) that are
+            traversed but never reported
+        instances: Optional {resource address: set of instance addresses}
+    """
+
+    def __init__(self, addresses, sources, targets, synthetic=(), instances=None):
+        self.addresses = addresses
+        self.index = {address: i for i, address in enumerate(addresses)}
+        self.synthetic = bytearray(len(addresses))
+        for i in synthetic:
+            self.synthetic[i] = 1
+        self.instances = instances or {}
+
+        # Counting sort of the edge list into CSR form
+        offsets = array('L', [0]) * (len(addresses) + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for i in range(len(addresses)):
+            offsets[i + 1] += offsets[i]
+        fill = array('L', offsets[:-1])
+        self.offsets = offsets
+        self.targets = array('L', [0]) * len(targets)
+        for source, target in zip(sources, targets):
+            self.targets[fill[source]] = target
+            fill[source] += 1
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def _traverse(self, start, seen):
+        """Breadth-first walk from start, skipping and marking nodes in seen; yields each reached node"""
+        offsets, targets = self.offsets, self.targets
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                if not seen[target]:
+                    seen[target] = 1
+                    queue.append(target)
+                    yield target
+
+    def dependents(self, address):
+        """Return the addresses that transitively depend on a resource, nearest first"""
+        start = self.index.get(resource_address(address))
+        if start is None:
+            return []
+        seen = bytearray(len(self.addresses))
+        seen[start] = 1
+        return [self.addresses[i] for i in self._traverse(start, seen) if not self.synthetic[i]]
+
+    def _covering_sources(self, nodes):
+        """
+        Map each source node reachable from another source node to that source
+
+        One pass with a shared visited set: anything downstream of a visited
+        node has been visited too, so each node is expanded at most once.
+        """
+        seen = bytearray(len(self.addresses))
+        covered = {}
+        for node in nodes:
+            for reached in self._traverse(node, seen):
+                if reached in nodes and reached != node:
+                    covered.setdefault(reached, node)
+        return covered
+
+    def blast_radius(self, addresses):
+        """
+        Return the blast radius of deleting or replacing each address, and their union
+
+        A source that is itself a dependent of another given source lies inside
+        that source's blast radius; it is reported as {"within": <address>}
+        instead of being traversed again. Every other source reports its own
+        full reach, so counts do not depend on the order of addresses; sources
+        whose reach overlaps list each other under "shared_with". The union
+        counts every affected resource once.
+
+        Returns:
+            Tuple of ({address: {"resources": n, "instances": n, "dependents": [nearest addresses],
+                                 "shared_with": [addresses]}
+                       or {"within": address}},
+                      {"resources": n, "instances": n} for the union)
+        """
+        by_node = {}
+        for address in addresses:
+            node = self.index.get(resource_address(address))
+            if node is not None:
+                by_node.setdefault(node, []).append(address)
+        covered = self._covering_sources(by_node)
+
+        offsets, targets = self.offsets, self.targets
+        # seen[node] is the ordinal (1-based) of the last root that visited it,
+        # so the array is reused across roots; first[node] is the first such root
+        seen = array('L', [0]) * len(self.addresses)
+        first = array('L', [0]) * len(self.addresses)
+        roots = []
+        shared = []
+        entries = []
+        radius = {}
+        total = {"resources": 0, "instances": 0}
+        for node, node_addresses in by_node.items():
+            root, chain = node, {node}
+            while root in covered and covered[root] not in chain:
+                root = covered[root]
+                chain.add(root)
+            if root in covered:
+                # Sources on a dependency cycle: report the cycle's entry as its own root
+                root = node
+
+            if root != node:
+                entry = {"within": by_node[root][0]}
+            else:
+                roots.append(node_addresses[0])
+                shared.append(set())
+                ordinal = len(roots)
+                seen[node] = ordinal
+                listed = []
+                resources = instances = 0
+                queue = deque([node])
+                while queue:
+                    current = queue.popleft()
+                    for target in targets[offsets[current]:offsets[current + 1]]:
+                        if seen[target] == ordinal:
+                            continue
+                        seen[target] = ordinal
+                        queue.append(target)
+                        other = first[target]
+                        if not other:
+                            first[target] = ordinal
+                        elif other != ordinal:
+                            shared[ordinal - 1].add(other)
+                            shared[other - 1].add(ordinal)
+                        if self.synthetic[target]:
+                            continue
+                        name = self.addresses[target]
+                        count = len(self.instances.get(name, ())) or 1
+                        resources += 1
+                        instances += count
+                        if not other:
+                            total["resources"] += 1
+                            total["instances"] += count
+                        if len(listed) < MAX_LISTED_DEPENDENTS:
+                            listed.append(name)
+                entry = {"resources": resources, "instances": instances, "dependents": listed}
+                entries.append(entry)
+            for address in node_addresses:
+                radius[address] = entry
+        for entry, others in zip(entries, shared):
+            entry["shared_with"] = [roots[i - 1] for i in sorted(others)]
+        return radius, total
+
+    @classmethod
+    def from_plan(cls, plan):
+        """Build the graph from parsed `terraform show -json` output"""
+        return _GraphBuilder().build(plan)
+
+
+class _GraphBuilder:
+    def __init__(self):
+        self.addresses = []
+        self.index = {}
+        self.synthetic = []
+        self.sources = array('L')
+        self.targets = array('L')
+        self.instances = {}
+
+    def node(self, address, synthetic=False):
+        index = self.index.get(address)
+        if index is None:
+            index = self.index[address] = len(self.addresses)
+            self.addresses.append(address)
+            if synthetic:
+                self.synthetic.append(index)
+        return index
+
+    def edge(self, dependency, dependent):
+        if dependency != dependent:
+            self.sources.append(dependency)
+            self.targets.append(dependent)
+
+    def reference(self, reference, module_path, dependent):
+        """Record that dependent refers to `reference` (e.g. "aws_vpc.main.id", "module.db.endpoint")"""
+        parts = resource_address(reference).split(".")
+        head = parts[0]
+        if head in _NON_RESOURCE_REFERENCES:
+            if head == "var" and module_path:
+                self.edge(self.node(f"{module_path} (inputs)", synthetic=True), dependent)
+            return
+        if head == "data" and len(parts) >= 3:
+            target = ".".join(parts[:3])
+        elif len(parts) >= 2:
+            target = f"{head}.{parts[1]}"
+        else:
+            return
+        self.edge(self.node(_join(module_path, target), synthetic=head == "module"), dependent)
+
+    def walk_module(self, module, module_path):
+        """Add a configuration module's resources; returns the resource node indexes inside it"""
+        nodes = []
+        for resource in module.get("resources", []):
+            node = self.node(_join(module_path, resource["address"]))
+            nodes.append(node)
+            for reference in _expression_references(resource.get("expressions", {}), []):
+                self.reference(reference, module_path, node)
+            for reference in resource.get("depends_on", []):
+                self.reference(reference, module_path, node)
+
+        for name, call in module.get("module_calls", {}).items():
+            child_path = _join(module_path, f"module.{name}")
+            # Module inputs feed the resources reading var.*; every resource in
+            # the module feeds its outputs (module.<name>.<output> references)
+            inputs = self.node(f"{child_path} (inputs)", synthetic=True)
+            for reference in _expression_references(call.get("expressions", {}), []) + call.get("depends_on", []):
+                self.reference(reference, module_path, inputs)
+            child_nodes = self.walk_module(call.get("module", {}), child_path)
+            outputs = self.node(child_path, synthetic=True)
+            for node in child_nodes:
+                self.edge(node, outputs)
+            nodes.extend(child_nodes)
+        return nodes
+
+    def walk_state(self, module):
+        # Dependencies recorded in state cover resources no longer in the configuration
+        for resource in module.get("resources", []):
+            node = self.instance(resource["address"])
+            for dependency in resource.get("depends_on", []):
+                self.edge(self.node(resource_address(dependency)), node)
+        for child in module.get("child_modules", []):
+            self.walk_state(child)
+
+    def instance(self, address):
+        name = resource_address(address)
+        self.instances.setdefault(name, set()).add(address)
+        return self.node(name)
+
+    def build(self, plan):
+        self.walk_module(plan.get("configuration", {}).get("root_module", {}), "")
+        self.walk_state(plan.get("prior_state", {}).get("values", {}).get("root_module", {}))
+        for change in plan.get("resource_changes", []):
+            self.instance(change["address"])
+        return PlanGraph(self.addresses, self.sources, self.targets, self.synthetic, self.instances)
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from src.utils.instrumentation import tracer
+
+# Default per-tool timeouts in seconds; override with MIGRATERATOR_TIMEOUT_<TOOL>
+DEFAULT_TIMEOUTS = {
+    "terraform": 1800,
+    "kubectl": 300,
+    "helm": 300,
+    "git": 120
+}
+FALLBACK_TIMEOUT = 600
+
+# Tools that are CPU/memory/network heavy and share a global concurrency limit
+HEAVY_TOOLS = {"terraform", "kubectl", "helm"}
+
+# Output beyond this many bytes per stream is drained but not kept
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+# Size bound of the in-process memo; the least recently used results are dropped beyond it
+DEFAULT_MEMO_BYTES = 256 * 1024 * 1024
+
+_READ_CHUNK = 64 * 1024
+
+_heavy_slots = threading.BoundedSemaphore(
+    int(os.environ.get("MIGRATERATOR_MAX_PROCS", max(1, (os.cpu_count() or 2) // 2)))
+)
+_memo = OrderedDict()
+_memo_bytes = 0
+_memo_lock = threading.Lock()
+_local = threading.local()
+
+
+class CommandResult:
+    """Outcome of a command run through run_command()"""
+
+    __slots__ = ("args", "returncode", "stdout", "stderr", "truncated", "duration", "cached", "max_output")
+
+    def __init__(self, args, returncode, stdout, stderr, truncated=False, duration=0.0, cached=False, max_output=None):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.truncated = truncated
+        self.duration = duration
+        self.cached = cached
+        self.max_output = max_output
+
+
+class OutputTruncated(subprocess.SubprocessError):
+    """A command produced more output than run_command() keeps, so the output is incomplete"""
+
+    def __init__(self, args, max_output):
+        self.cmd = args
+        self.max_output = max_output
+        # The partial output is not passed on; parsing it would give wrong results
+        self.stdout = ""
+        self.stderr = ""
+
+    def __str__(self):
+        return f"{' '.join(self.cmd[:2])} output truncated at {self.max_output} bytes"
+
+
+def require_complete(result):
+    """
+    Return result, or raise OutputTruncated if its output went past the capture limit
+
+    Callers that parse a command's output use this instead of parsing a cut-off stream.
+    """
+    if result.truncated:
+        raise OutputTruncated(result.args, result.max_output)
+    return result
+
+
+@contextmanager
+def deadline(at):
+    """
+    Kill commands run by this thread once time.monotonic() reaches `at`
+
+    Commands started after the deadline fail at once with
+    subprocess.TimeoutExpired. None removes the deadline.
+    """
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = at
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def tool_timeout(tool):
+    """Return the timeout in seconds for a tool, honouring MIGRATERATOR_TIMEOUT_<TOOL>"""
+    value = os.environ.get(f"MIGRATERATOR_TIMEOUT_{tool.upper()}")
+    if value:
+        return float(value)
+    return DEFAULT_TIMEOUTS.get(tool, FALLBACK_TIMEOUT)
+
+
+def hash_paths(paths, root=None):
+    """
+    Return a content hash over files and (recursively) directories
+
+    Paths are hashed relative to root (default: the current directory), so
+    identical trees in different checkouts hash the same.
+    """
+    root = os.path.abspath(root or ".")
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        full_path = os.path.join(root, path)
+        digest.update(os.path.relpath(full_path, root).encode())
+        if os.path.isdir(full_path):
+            for dir_path, dirs, files in os.walk(full_path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(dir_path, name)
+                    digest.update(os.path.relpath(file_path, full_path).encode())
+                    _hash_file(digest, file_path)
+        elif os.path.exists(full_path):
+            _hash_file(digest, full_path)
+        else:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+def _hash_file(digest, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            digest.update(chunk)
+
+
+@lru_cache(maxsize=None)
+def tool_version(tool):
+    """Return `<tool> version` output, cached for the life of the process"""
+    args = [tool, "version", "--short"] if tool == "helm" else [tool, "version"]
+    try:
+        return run_command(args, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _cache_key(args, cwd, input_paths, extra_key):
+    # With input_paths the key is content-addressed and does not depend on
+    # where the checkout lives, so caches are shared between worktrees
+    payload = json.dumps({
+        "args": list(args),
+        "cwd": None if input_paths else os.path.abspath(cwd or "."),
+        "inputs": hash_paths(input_paths, cwd) if input_paths else None,
+        "extra": extra_key
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _disk_cache_path(key):
+    cache_dir = os.environ.get("MIGRATERATOR_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, "commands", key[:2], f"{key}.json")
+
+
+def _memo_put(key, result):
+    """Keep result in the in-process memo, evicting the least recently used entries"""
+    global _memo_bytes
+    limit = int(os.environ.get("MIGRATERATOR_MEMO_BYTES", DEFAULT_MEMO_BYTES))
+    size = len(result.stdout) + len(result.stderr)
+    with _memo_lock:
+        previous = _memo.pop(key, None)
+        if previous is not None:
+            _memo_bytes -= len(previous.stdout) + len(previous.stderr)
+        _memo[key] = result
+        _memo_bytes += size
+        while _memo_bytes > limit and len(_memo) > 1:
+            _, evicted = _memo.popitem(last=False)
+            _memo_bytes -= len(evicted.stdout) + len(evicted.stderr)
+
+
+def _load_memo(key):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    path = _disk_cache_path(key)
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        result = CommandResult(data["args"], data["returncode"], data["stdout"], data["stderr"], data["truncated"])
+        _memo_put(key, result)
+        return result
+    return None
+
+
+def _store_memo(key, result):
+    """Memoise a result in process and on disk; a failed disk write only costs a later miss"""
+    _memo_put(key, result)
+
+    path = _disk_cache_path(key)
+    if not path:
+        return
+    # A unique temporary file per write: threads and worker processes may
+    # store the same key at the same time
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "args": result.args,
+                "returncode": result.returncode,
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+                "truncated": result.truncated
+            }, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache command result: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def lookup_memo(args, cwd=None, input_paths=(), extra_key=None):
+    """
+    Return the memoised result of an earlier run_command(..., memoize=True) call, or None
+
+    Lets callers skip the commands that would produce a memoised command's inputs.
+    """
+    return _load_memo(_cache_key([str(arg) for arg in args], cwd, input_paths, extra_key))
+
+
+def _drain(stream, chunks, limit, state):
+    """Read a pipe to EOF, keeping at most `limit` bytes"""
+    kept = 0
+    for chunk in iter(lambda: stream.read(_READ_CHUNK), b""):
+        room = limit - kept
+        if room > 0:
+            chunks.append(chunk[:room])
+            kept += min(len(chunk), room)
+        if len(chunk) > room:
+            state["truncated"] = True
+    stream.close()
+
+
+def _kill(process):
+    # Commands run in their own session so that plugins/providers they spawn die too
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def run_command(args, cwd=None, check=False, timeout=None, memoize=False, input_paths=(),
+                extra_key=None, max_output=None, env=None):
+    """
+    Run an external command with a timeout, bounded output capture and optional memoisation
+
+    Args:
+        args: Command and arguments, e.g. ["terraform", "plan", "-json"]
+        cwd: Working directory
+        check: Raise subprocess.CalledProcessError on a non-zero exit code
+        timeout: Seconds before the command is killed (defaults to the tool's timeout)
+        memoize: Reuse the result of an identical earlier call; only for pure commands
+        input_paths: Files/directories (relative to cwd) whose contents are part of the
+            memoisation key; when given, the key no longer depends on cwd itself
+        extra_key: Any other JSON-able value that must be part of the memoisation key
+        max_output: Per-stream byte cap (defaults to MIGRATERATOR_MAX_OUTPUT_BYTES)
+        env: Environment for the command (defaults to the current environment)
+
+    Returns:
+        CommandResult with decoded stdout and stderr
+
+    Raises:
+        subprocess.TimeoutExpired: The command ran longer than its timeout, or
+            past the thread's deadline()
+        subprocess.CalledProcessError: check=True and the command failed
+        OSError: The executable could not be started
+    """
+    args = [str(arg) for arg in args]
+    tool = os.path.basename(args[0])
+    timeout = tool_timeout(tool) if timeout is None else timeout
+    at = getattr(_local, "deadline", None)
+    if at is not None:
+        remaining = at - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(args, 0)
+        timeout = min(timeout, remaining)
+    limit = max_output or int(os.environ.get("MIGRATERATOR_MAX_OUTPUT_BYTES", DEFAULT_MAX_OUTPUT_BYTES))
+
+    with tracer.span(" ".join(args[:2]), category="subprocess", argv=args) as span:
+        key = _cache_key(args, cwd, input_paths, extra_key) if memoize else None
+        result = _load_memo(key) if key else None
+
+        if result is not None:
+            # The memoised object is shared between threads; hand out a copy
+            result = CommandResult(result.args, result.returncode, result.stdout, result.stderr,
+                                   result.truncated, cached=True)
+            span.args["cached"] = True
+        else:
+            slots = _heavy_slots if tool in HEAVY_TOOLS else None
+            if slots is not None:
+                slots.acquire()
+            try:
+                result = _execute(args, cwd, timeout, limit, env)
+            finally:
+                if slots is not None:
+                    slots.release()
+            # Failures may be transient (network, registry, lock), so only successes are kept
+            if key and result.returncode == 0 and not result.truncated:
+                _store_memo(key, result)
+
+        span.args["exit_code"] = result.returncode
+        span.args["bytes_read"] = len(result.stdout) + len(result.stderr)
+        if result.truncated:
+            span.args["truncated"] = True
+
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, args, result.stdout, result.stderr)
+    return result
+
+
+def _execute(args, cwd, timeout, limit, env):
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+    stdout_chunks, stderr_chunks = [], []
+    state = {"truncated": False}
+    readers = [
+        threading.Thread(target=_drain, args=(process.stdout, stdout_chunks, limit, state), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, stderr_chunks, limit, state), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill(process)
+        process.wait()
+        for reader in readers:
+            reader.join(timeout=5)
+        raise subprocess.TimeoutExpired(
+            args, timeout,
+            output=b"".join(stdout_chunks).decode("utf-8", errors="replace"),
+            stderr=b"".join(stderr_chunks).decode("utf-8", errors="replace")
+        )
+
+    for reader in readers:
+        reader.join()
+
+    return CommandResult(
+        args,
+        returncode,
+        b"".join(stdout_chunks).decode("utf-8", errors="replace"),
+        b"".join(stderr_chunks).decode("utf-8", errors="replace"),
+        truncated=state["truncated"],
+        duration=time.perf_counter() - start,
+        max_output=limit
+    )
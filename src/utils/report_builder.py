@@ -0,0 +1,241 @@
+import io
+
+# GitHub rejects issue/PR comments longer than 65,536 characters. We count
+# UTF-8 bytes (never fewer than characters) and keep some headroom.
+GITHUB_COMMENT_LIMIT = 65536
+DEFAULT_REPORT_BUDGET = GITHUB_COMMENT_LIMIT - 1024
+
+# Lists longer than this are collapsed into a <details> block
+DEFAULT_MAX_LIST_ITEMS = 25
+
+SEVERITY_LEVELS = {
+    "critical": "error",
+    "high": "error",
+    "medium": "warning",
+    "low": "note"
+}
+
+
+def _size(text):
+    return len(text.encode("utf-8"))
+
+
+class _Section:
+    __slots__ = ("title", "content", "priority", "raw")
+
+    def __init__(self, title, content, priority, raw):
+        self.title = title
+        self.content = content
+        self.priority = priority
+        self.raw = raw
+
+
+class ReportBuilder:
+    """
+    Assemble a markdown report from sections while staying under a size budget.
+
+    Sections are rendered in the order they were added, but the budget is
+    handed out by priority (lower number first), so risks survive when a huge
+    resource list would otherwise push the comment over GitHub's limit.
+    """
+
+    def __init__(self, title, budget=DEFAULT_REPORT_BUDGET, max_list_items=DEFAULT_MAX_LIST_ITEMS):
+        """
+        Args:
+            title: Top-level report heading, or None to omit it
+            budget: Maximum report size in bytes, or None for no limit
+            max_list_items: List length above which items are collapsed
+        """
+        self.title = title
+        self.budget = budget
+        self.max_list_items = max_list_items
+        self._sections = []
+
+    def add_section(self, title, content, priority=10):
+        """Add a section whose content is a list of markdown paragraphs / list items"""
+        self._sections.append(_Section(title, list(content), priority, raw=False))
+
+    def add_text(self, text, title=None, priority=10):
+        """Add a block of pre-formatted markdown (e.g. an LLM response)"""
+        self._sections.append(_Section(title, text, priority, raw=True))
+
+    def add_summary(self, summary, priorities=None):
+        """Add every section of a ReportGenerator.generate_summary() result"""
+        priorities = priorities or {}
+        for section in summary["sections"]:
+            self.add_section(section["title"], section["content"], priorities.get(section["title"], 10))
+
+    def build(self):
+        """Render the report, collapsing or dropping low-priority content to fit the budget"""
+        header = f"# {self.title}\n\n" if self.title else ""
+        remaining = None if self.budget is None else self.budget - _size(header)
+
+        rendered = [None] * len(self._sections)
+        order = sorted(range(len(self._sections)), key=lambda i: self._sections[i].priority)
+        for index in order:
+            text = self._render(self._sections[index], remaining)
+            rendered[index] = text
+            if remaining is not None:
+                remaining -= _size(text)
+
+        out = io.StringIO()
+        out.write(header)
+        for text in rendered:
+            out.write(text)
+        return out.getvalue()
+
+    def _render(self, section, remaining):
+        heading = f"## {section.title}\n\n" if section.title else ""
+
+        if section.raw:
+            text = heading + section.content.rstrip() + "\n\n"
+            if remaining is None or _size(text) <= remaining:
+                return text
+            return self._truncate_text(heading, section.content, remaining)
+
+        full = heading + self._join(self._collapse(section.content, self.max_list_items))
+        if remaining is None or _size(full) <= remaining:
+            return full
+
+        # Keep only a handful of items per list and replace the rest by counts
+        for keep in sorted({self.max_list_items, 10, 3, 0}, reverse=True):
+            compact = heading + self._join(self._collapse(section.content, keep, details=False))
+            if _size(compact) <= remaining:
+                return compact
+
+        note = heading + f"_Section omitted ({len(section.content)} entries) to fit the comment size limit._\n\n"
+        return note if _size(note) <= remaining else ""
+
+    @staticmethod
+    def _join(paragraphs):
+        out = io.StringIO()
+        for paragraph in paragraphs:
+            out.write(paragraph)
+            out.write("\n\n")
+        return out.getvalue()
+
+    @staticmethod
+    def _collapse(content, max_items, details=True):
+        """
+        Collapse runs of list items ("- ...") longer than max_items.
+
+        Indented paragraphs (e.g. "  - Mitigation: ...") belong to the item above.
+        """
+        result = []
+        run = []
+
+        def flush():
+            if len(run) <= max_items:
+                for item in run:
+                    result.extend(item)
+            else:
+                for item in run[:max_items]:
+                    result.extend(item)
+                hidden = len(run) - max_items
+                if details:
+                    result.append(
+                        f"<details><summary>{hidden} more</summary>\n\n"
+                        + "\n\n".join(paragraph for item in run[max_items:] for paragraph in item)
+                        + "\n\n</details>"
+                    )
+                else:
+                    result.append(f"- _...and {hidden} more_")
+            run.clear()
+
+        for paragraph in content:
+            if paragraph.startswith("- "):
+                run.append([paragraph])
+            elif run and paragraph.startswith(" "):
+                run[-1].append(paragraph)
+            else:
+                flush()
+                result.append(paragraph)
+        flush()
+        return result
+
+    @staticmethod
+    def _truncate_text(heading, text, remaining):
+        notice = "\n\n_Report truncated to fit the comment size limit._\n\n"
+        available = remaining - _size(heading) - _size(notice)
+        if available <= 0:
+            return ""
+
+        out = io.StringIO()
+        out.write(heading)
+        used = 0
+        for line in text.splitlines(keepends=True):
+            used += _size(line)
+            if used > available:
+                break
+            out.write(line)
+        out.write(notice)
+        return out.getvalue()
+
+
+def build_sarif_report(risk_assessment, tool_name="Migraterator"):
+    """
+    Convert a risk assessment into a SARIF 2.1.0 log
+
+    Args:
+        risk_assessment: Output of RiskAssessor.generate_assessment()
+        tool_name: Name reported as the SARIF tool driver
+
+    Returns:
+        Dictionary ready to be serialised as JSON
+    """
+    rules = []
+    rule_ids = set()
+    results = []
+    categories = (
+        ("downtime_risks", "downtime", "mitigation"),
+        ("cost_impacts", "cost", "recommendation"),
+        ("security_risks", "security", "recommendation")
+    )
+
+    for key, category, advice_key in categories:
+        findings = (risk_assessment or {}).get(key, [])
+        if not findings:
+            continue
+        for finding in findings:
+            # One SARIF rule per risk rule, so alerts can be triaged and dismissed individually
+            rule = finding.get("rule") or category
+            rule_id = f"migraterator/{rule}"
+            if rule_id not in rule_ids:
+                rule_ids.add(rule_id)
+                rules.append({
+                    "id": rule_id,
+                    "name": rule,
+                    "shortDescription": {"text": f"Potential {category} impact of an infrastructure change ({rule})"},
+                    "properties": {"category": key}
+                })
+            message = finding.get("description", "")
+            advice = finding.get(advice_key)
+            if advice:
+                message = f"{message}. {advice}"
+            properties = {"severity": finding.get("severity", "low")}
+            for field_name in ("rule", "resource_type", "count", "samples"):
+                if finding.get(field_name) is not None:
+                    properties[field_name] = finding.get(field_name)
+            result = {
+                "ruleId": rule_id,
+                "level": SEVERITY_LEVELS.get(finding.get("severity", "low"), "note"),
+                "message": {"text": message},
+                "properties": properties
+            }
+            # Findings that cannot be tied to a file (e.g. resources in modules) carry no location
+            if finding.get("file"):
+                result["locations"] = [{
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": finding["file"], "uriBaseId": "%SRCROOT%"}
+                    }
+                }]
+            results.append(result)
+
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {"name": tool_name, "rules": rules}},
+            "results": results
+        }]
+    }